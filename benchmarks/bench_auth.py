@@ -0,0 +1,110 @@
+"""
+Request latency through the auth middleware under concurrent load.
+
+Compares the previous BaseHTTPMiddleware implementation with the pure ASGI
+AuthMiddleware on a mix of NiceGUI asset requests and authenticated page
+requests, with the same session and storage middlewares NiceGUI installs.
+
+    python benchmarks/bench_auth.py --requests 5000 --concurrency 50
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault('NICEGUI_STORAGE_PATH', tempfile.mkdtemp())
+
+import httpx  # noqa: E402
+from fastapi import Request  # noqa: E402
+from fastapi.responses import PlainTextResponse, RedirectResponse  # noqa: E402
+from nicegui import Client, app  # noqa: E402
+from nicegui.storage import RequestTrackingMiddleware  # noqa: E402
+from starlette.applications import Starlette  # noqa: E402
+from starlette.middleware import Middleware  # noqa: E402
+from starlette.middleware.base import BaseHTTPMiddleware  # noqa: E402
+from starlette.middleware.sessions import SessionMiddleware  # noqa: E402
+from starlette.routing import Route  # noqa: E402
+
+import fixtures  # noqa: E402,F401  (puts src/app on the path)
+from utils.auth import AuthMiddleware, unrestricted_page_routes  # noqa: E402
+
+PAGES = 20
+
+
+class LegacyAuthMiddleware(BaseHTTPMiddleware):
+    """The BaseHTTPMiddleware implementation AuthMiddleware replaced."""
+    async def dispatch(self, request: Request, call_next):
+        if not app.storage.user.get('authenticated', False):
+            if request.url.path in Client.page_routes.values() and request.url.path not in unrestricted_page_routes:
+                app.storage.user['referrer_path'] = request.url.path
+                return RedirectResponse('/login')
+        return await call_next(request)
+
+
+async def page(request):
+    return PlainTextResponse('page')
+
+
+async def asset(request):
+    return PlainTextResponse('asset')
+
+
+async def login(request):
+    app.storage.user['authenticated'] = True
+    return PlainTextResponse('ok')
+
+
+def build_app(middleware: type) -> Starlette:
+    for i in range(PAGES):
+        Client.page_routes[lambda i=i: i] = f'/page{i}'
+    return Starlette(
+        routes=[Route(f'/page{i}', page) for i in range(PAGES)] + [
+            Route('/_nicegui/1.4/static/app.js', asset),
+            Route('/bench-login', login),
+        ],
+        middleware=[
+            Middleware(SessionMiddleware, secret_key='bench'),
+            Middleware(RequestTrackingMiddleware),
+            Middleware(middleware),
+        ],
+    )
+
+
+async def measure(middleware: type, requests: int, concurrency: int) -> list[float]:
+    transport = httpx.ASGITransport(app=build_app(middleware))
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+        await client.get('/bench-login')
+
+        async def one(i: int) -> None:
+            path = f'/page{i % PAGES}' if i % 4 == 0 else '/_nicegui/1.4/static/app.js'
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.get(path)
+                latencies.append(time.perf_counter() - start)
+            assert response.status_code == 200, response.status_code
+
+        await asyncio.gather(*(one(i) for i in range(requests)))
+    return latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    args = parser.parse_args()
+
+    for name, middleware in [('BaseHTTPMiddleware', LegacyAuthMiddleware), ('pure ASGI', AuthMiddleware)]:
+        start = time.perf_counter()
+        latencies = asyncio.run(measure(middleware, args.requests, args.concurrency))
+        elapsed = time.perf_counter() - start
+        quantiles = statistics.quantiles(latencies, n=100)
+        print(f"{name:<20} p50={quantiles[49] * 1000:6.2f}ms p95={quantiles[94] * 1000:6.2f}ms "
+              f"p99={quantiles[98] * 1000:6.2f}ms {args.requests / elapsed:8.0f} req/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Offline gazetteer lookup latency.
+
+Builds the gazetteer from a place name CSV (--path, e.g. the LINZ NZ Gazetteer
+export) or from synthetic places, and reports the median time of exact, typo,
+macron, prefix and reverse lookups, plus build time and index memory.
+
+    python benchmarks/bench_gazetteer.py --places 20000
+    python benchmarks/bench_gazetteer.py --path gazetteer.csv
+"""
+import argparse
+import random
+import statistics
+import string
+import time
+import tracemalloc
+
+import fixtures  # noqa: F401  (puts src/app on the path)
+from service.gazetteer import Gazetteer, Place, feature_type_rank, normalise
+
+
+def synthetic_places(count: int, seed: int = 1) -> list[Place]:
+    rng = random.Random(seed)
+    syllables = ['ka', 'ta', 'wa', 'ra', 'ma', 'ngā', 'ō', 'hi', 'ko', 'pu', 'whe', 'nui', 'roa', 'tū', 'ke']
+    ranks = list(feature_type_rank.values())
+    places = []
+    for _ in range(count):
+        name = ''.join(rng.choice(syllables) for _ in range(rng.randint(2, 5))).title()
+        if rng.random() < 0.2:
+            name += ' ' + rng.choice(['North', 'South', 'Heights', 'Beach', 'Bay'])
+        places.append(Place(name=name, latitude=rng.uniform(-46.6, -34.4), longitude=rng.uniform(166.4, 178.6),
+                            rank=rng.choice(ranks)))
+    return places
+
+
+def typo(name: str, rng: random.Random) -> str:
+    i = rng.randrange(len(name))
+    return name[:i] + rng.choice(string.ascii_lowercase) + name[i + 1:]
+
+
+def median_us(func, queries: list) -> float:
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        func(query)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--path', help='place name CSV; synthetic places are used if omitted')
+    parser.add_argument('--places', type=int, default=20000, help='number of synthetic places')
+    parser.add_argument('--queries', type=int, default=500)
+    args = parser.parse_args()
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    gazetteer = Gazetteer.from_csv(args.path) if args.path else Gazetteer(synthetic_places(args.places))
+    build_ms = (time.perf_counter() - start) * 1000
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    rng = random.Random(2)
+    sample = rng.sample(gazetteer.places, min(args.queries, len(gazetteer.places)))
+    names = [place.name for place in sample]
+    cases = {
+        'exact': (gazetteer.geocode, names),
+        'macrons stripped': (gazetteer.geocode, [normalise(name) for name in names]),
+        'one typo': (gazetteer.geocode, [typo(normalise(name), rng) for name in names]),
+        'prefix': (gazetteer.geocode, [normalise(name)[:max(5, len(name) - 3)] for name in names]),
+        'reverse': (lambda point: gazetteer.reverse(*point),
+                    [(place.latitude + rng.uniform(-0.02, 0.02), place.longitude + rng.uniform(-0.02, 0.02))
+                     for place in sample]),
+    }
+
+    print(f"{len(gazetteer.places)} places, built in {build_ms:.0f} ms, peak {peak / 1024 / 1024:.1f} MiB")
+    for name, (func, queries) in cases.items():
+        print(f"{name:<18}{median_us(func, queries):10.1f} us")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Logging overhead on a full query.
+
+Runs the in-process part of a weather query (Metservice call answered by an
+in-memory transport, parse, store, fetch, icons, downsample, prompt and
+chat-log formatting) with logging disabled and with a file sink at INFO and
+DEBUG, and reports the overhead each level adds. Compare the output across
+commits to see the cost removed from the hot paths.
+
+    python benchmarks/bench_logging.py --days 3 --repeat 20
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import statistics
+import tempfile
+import time
+import types
+from datetime import timedelta
+
+import httpx
+from loguru import logger
+
+from fixtures import point_time_response
+
+os.environ.setdefault('OPENAI_API_KEY', 'bench')
+os.environ.setdefault('METSERVICE_API_KEY', 'bench')
+
+from models import Message  # noqa: E402
+from service.chat_service import ChatService  # noqa: E402
+from service.weather_service import WeatherService  # noqa: E402
+from service.cache import cache  # noqa: E402
+from bench_weather_service import classification  # noqa: E402
+
+
+def point_time(request: httpx.Request) -> httpx.Response:
+    return httpx.Response(200, json=point_time_response(json.loads(request.content)))
+
+
+# Answer Metservice calls in memory so only in-process work is measured
+httpx.AsyncHTTPTransport = lambda **kwargs: httpx.MockTransport(point_time)
+
+# Every query asks for a different start date so the forecast cache never answers it
+offsets = itertools.count()
+
+
+async def full_query(days: int, chat_messages: int) -> None:
+    weather_service = WeatherService()
+    chat_log = [Message(role='user' if i % 2 == 0 else 'WeatherBot', content=f'message {i} ' * 40, stamp='',
+                        avatar='', sent=i % 2 == 0) for i in range(chat_messages)]
+    chat_service = ChatService(weather_service=weather_service, ui_manager=types.SimpleNamespace(chat_log=chat_log),
+                               user_service=None, user_storage={})
+    query = classification(days, location='Auckland')
+    offset = timedelta(days=next(offsets))
+    query.query_from_date += offset
+    query.query_to_date += offset
+
+    await weather_service.get_weather_data(query)
+    weather_data = await weather_service.fetch_data(query)
+    weather_data = await weather_service.fetch_weather_icons(weather_data)
+    await weather_service.downsample_data(weather_data)
+    await chat_service._format_data_store()
+    await chat_service._format_chat_log(system_prompt='system')
+
+
+async def measure(days: int, chat_messages: int, repeat: int) -> float:
+    await cache.set('geocode:auckland', [-36.8485, 174.7633])
+    await full_query(days, chat_messages)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await full_query(days, chat_messages)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--days', type=int, default=3)
+    parser.add_argument('--chat-messages', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for level in (None, 'INFO', 'DEBUG'):
+            logger.remove()
+            if level:
+                logger.add(os.path.join(directory, f'{level}.log'), level=level)
+            results[level] = asyncio.run(measure(args.days, args.chat_messages, args.repeat))
+        logger.remove()
+
+    disabled = results[None]
+    print(f"logging disabled {disabled:8.2f} ms")
+    for level in ('INFO', 'DEBUG'):
+        print(f"file sink {level:<6} {results[level]:8.2f} ms  (+{results[level] - disabled:.2f} ms)")
+
+
+if __name__ == '__main__':
+    main()
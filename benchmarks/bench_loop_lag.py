@@ -0,0 +1,112 @@
+"""
+Event-loop lag while large queries are parsed, stored and formatted.
+
+A ticker coroutine sleeps for a few milliseconds at a time and records how late
+it wakes up, which is how long every other session's websocket traffic would
+have waited. Meanwhile a batch of concurrent queries runs the CPU-bound stages
+(_clean_metservice_response, _store_weather_data, fetch_weather_icons and
+_format_data_store) on a large multi-day, multi-point response, once per CPU
+executor mode. Start-up objects are frozen out of the garbage collector first,
+as main.py does.
+
+    python benchmarks/bench_loop_lag.py --modes inline thread process
+    python benchmarks/bench_loop_lag.py --days 10 --variables 13 --locations 5 --queries 16
+"""
+import argparse
+import asyncio
+import gc
+import os
+import statistics
+import time
+from datetime import date, timedelta
+
+from loguru import logger
+
+from fixtures import metservice_payload
+
+os.environ.setdefault('OPENAI_API_KEY', 'bench')
+
+from models import QueryClassification  # noqa: E402
+from service.chat_service import ChatService  # noqa: E402
+from service.weather_service import WeatherService  # noqa: E402
+from utils.constants import QueryPeriodsEnum, QueryTypesEnum  # noqa: E402
+from utils.executor import EXECUTOR_MODES, cpu_executor  # noqa: E402
+
+START = date(2024, 5, 1)
+
+
+async def ticker(interval: float, lags: list[float], stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+
+async def query(payload: dict, days: int) -> None:
+    weather_service = WeatherService()
+    chat_service = ChatService(weather_service=weather_service, ui_manager=None, user_service=None, user_storage={})
+    classification = QueryClassification(
+        query_type=[QueryTypesEnum.GENERAL_WEATHER], locations=['loc0'], query_from_date=START,
+        query_to_date=START + timedelta(days=days - 1),
+        query_period=[QueryPeriodsEnum.MULTIPLE_DAYS] if days > 1 else [QueryPeriodsEnum.WHOLE_DAY])
+    summaries = await weather_service._clean_metservice_response(payload)
+    await weather_service._store_weather_data(metservice_response=summaries, classification=classification)
+    weather_data = await weather_service.fetch_data(classification)
+    await weather_service.fetch_weather_icons(weather_data)
+    await chat_service._format_data_store()
+
+
+async def run(mode: str, args: argparse.Namespace) -> dict[str, float]:
+    cpu_executor.shutdown()
+    cpu_executor.mode = mode
+    payload = metservice_payload(days=args.days, variables=args.variables, locations=args.locations)
+    # Warm up the worker pool so start-up is not counted as lag
+    await query(metservice_payload(days=1, variables=args.variables), days=1)
+
+    lags: list[float] = []
+    stop = asyncio.Event()
+    tick = asyncio.create_task(ticker(args.interval / 1000, lags, stop))
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def limited() -> None:
+        async with semaphore:
+            await query(payload, days=args.days)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(limited() for _ in range(args.queries)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await tick
+
+    lags_ms = sorted(lag * 1000 for lag in lags)
+    return {
+        'p50_ms': statistics.median(lags_ms),
+        'p99_ms': lags_ms[min(len(lags_ms) - 1, int(len(lags_ms) * 0.99))],
+        'max_ms': lags_ms[-1],
+        'queries_per_s': args.queries / elapsed,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', nargs='+', choices=EXECUTOR_MODES, default=list(EXECUTOR_MODES[::-1]))
+    parser.add_argument('--days', type=int, default=10)
+    parser.add_argument('--variables', type=int, default=13)
+    parser.add_argument('--locations', type=int, default=5)
+    parser.add_argument('--queries', type=int, default=16)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--interval', type=float, default=5, help='ticker sleep in ms')
+    args = parser.parse_args()
+    logger.remove()
+    # As main.py does once the app is loaded
+    gc.freeze()
+
+    print(f"{'mode':<10}{'lag p50':>10}{'lag p99':>10}{'lag max':>10}{'queries/s':>12}")
+    for mode in args.modes:
+        result = await run(mode, args)
+        print(f"{mode:<10}{result['p50_ms']:8.1f}ms{result['p99_ms']:8.1f}ms{result['max_ms']:8.1f}ms{result['queries_per_s']:12.1f}")
+    cpu_executor.shutdown()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
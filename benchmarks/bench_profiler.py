@@ -0,0 +1,84 @@
+"""
+Overhead of the event-loop lag monitor and the sampling profiler on a full query.
+
+Runs the same batch of concurrent queries as bench_loop_lag.py with neither running, with the
+lag monitor running as it does in production, and with the profiler also sampling every thread
+at each --intervals setting, and reports throughput relative to the first.
+
+    python benchmarks/bench_profiler.py
+    python benchmarks/bench_profiler.py --days 3 --queries 64 --intervals 10 1
+"""
+import argparse
+import asyncio
+import gc
+import os
+import time
+from contextlib import AsyncExitStack
+
+from loguru import logger
+
+from fixtures import metservice_payload
+
+os.environ.setdefault('OPENAI_API_KEY', 'bench')
+
+from bench_loop_lag import query  # noqa: E402
+from utils.profiling import LoopLagMonitor, SamplingProfiler  # noqa: E402
+
+
+async def run(args: argparse.Namespace, payload: dict) -> float:
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def limited() -> None:
+        async with semaphore:
+            await query(payload, days=args.days)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(limited() for _ in range(args.queries)))
+    return args.queries / (time.perf_counter() - start)
+
+
+async def measure(args: argparse.Namespace, payload: dict, monitor: bool, interval_ms: float = 0) -> float:
+    async with AsyncExitStack() as stack:
+        if monitor:
+            lag_monitor = LoopLagMonitor()
+            await lag_monitor.start()
+            stack.push_async_callback(lag_monitor.stop)
+        profile = None
+        if interval_ms:
+            profile = asyncio.create_task(SamplingProfiler(max_seconds=3600).profile(3600, interval_ms / 1000))
+            await asyncio.sleep(0.05)
+        best = max([await run(args, payload) for _ in range(args.repeat)])
+        if profile is not None:
+            profile.cancel()
+            await asyncio.gather(profile, return_exceptions=True)
+        return best
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--days', type=int, default=3)
+    parser.add_argument('--variables', type=int, default=13)
+    parser.add_argument('--locations', type=int, default=1)
+    parser.add_argument('--queries', type=int, default=32)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=5, help='best of this many runs per case')
+    parser.add_argument('--intervals', type=float, nargs='+', default=[10, 1], help='profiler sampling intervals in ms')
+    args = parser.parse_args()
+    logger.remove()
+    gc.freeze()
+
+    payload = metservice_payload(days=args.days, variables=args.variables, locations=args.locations)
+    await run(args, payload)  # warm up
+
+    baseline = await measure(args, payload, monitor=False)
+    cases = [('neither', baseline), ('lag monitor', await measure(args, payload, monitor=True))]
+    for interval_ms in args.intervals:
+        cases.append((f'+ profiler {interval_ms:g}ms', await measure(args, payload, monitor=True, interval_ms=interval_ms)))
+
+    print(f"{'case':<22}{'queries/s':>12}{'overhead':>10}")
+    for name, queries_per_s in cases:
+        print(f"{name:<22}{queries_per_s:12.1f}{(1 - queries_per_s / baseline) * 100:9.1f}%")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,168 @@
+"""
+Benchmarks for the WeatherService and ChatService hot paths.
+
+Each stage runs against synthetic Metservice responses scaled by days,
+variables and locations. Time is the median of several runs, peak memory is
+measured with tracemalloc on a separate run.
+
+    python benchmarks/bench_weather_service.py                 # run and print
+    python benchmarks/bench_weather_service.py --save          # record baseline.json
+    python benchmarks/bench_weather_service.py --compare       # fail on regression against baseline.json
+"""
+import argparse
+import asyncio
+import copy
+import itertools
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from collections.abc import Callable
+from datetime import date, timedelta
+from pathlib import Path
+
+from loguru import logger
+
+from fixtures import metservice_payload
+
+os.environ.setdefault('OPENAI_API_KEY', 'bench')
+
+from models import QueryClassification  # noqa: E402
+from service.chat_service import ChatService  # noqa: E402
+from service.weather_service import WeatherService  # noqa: E402
+from utils.constants import QueryPeriodsEnum, QueryTypesEnum  # noqa: E402
+
+BASELINE_PATH = Path(__file__).parent / 'baseline.json'
+START = date(2024, 5, 1)
+DAYS = (1, 3, 10)
+VARIABLES = (6, 13)
+LOCATIONS = (1, 5)
+
+
+def classification(days: int, location: str = 'loc0') -> QueryClassification:
+    query_types = [QueryTypesEnum.GENERAL_WEATHER]
+    return QueryClassification(
+        query_type=query_types,
+        locations=[location],
+        query_from_date=START,
+        query_to_date=START + timedelta(days=days - 1),
+        query_period=[QueryPeriodsEnum.MULTIPLE_DAYS] if days > 1 else [QueryPeriodsEnum.WHOLE_DAY],
+    )
+
+
+async def populated_service(days: int, variables: int, locations: int) -> WeatherService:
+    weather_service = WeatherService()
+    for i in range(locations):
+        payload = metservice_payload(days=days, variables=variables)
+        summaries = await weather_service._clean_metservice_response(payload)
+        await weather_service._store_weather_data(metservice_response=summaries,
+                                                  classification=classification(days, location=f'loc{i}'))
+    return weather_service
+
+
+async def build_cases(days: int, variables: int, locations: int, repeat: int) -> dict[str, Callable]:
+    """Return stage name -> zero-argument coroutine factory, with all setup done outside the timed call."""
+    payload = metservice_payload(days=days, variables=variables, locations=locations)
+    weather_service = await populated_service(days, variables, locations)
+    chat_service = ChatService(weather_service=weather_service, ui_manager=None, user_service=None, user_storage={})
+    summaries = await weather_service._clean_metservice_response(payload)
+    query = classification(days, location=f'loc{locations - 1}')
+    weather_data = await weather_service.fetch_data(classification(days))
+
+    # _store_weather_data mutates its input, so every run gets its own copy
+    store_inputs = iter([[copy.deepcopy(summaries) for _ in range(locations)] for _ in range(repeat + 1)])
+
+    async def store():
+        fresh_service = WeatherService()
+        for i, location_summaries in enumerate(next(store_inputs)):
+            await fresh_service._store_weather_data(metservice_response=location_summaries,
+                                                    classification=classification(days, location=f'loc{i}'))
+
+    return {
+        '_clean_metservice_response': lambda: weather_service._clean_metservice_response(payload),
+        '_check_data_store': lambda: weather_service._check_data_store(classification=query),
+        '_store_weather_data': store,
+        'fetch_data': lambda: weather_service.fetch_data(query),
+        'fetch_weather_icons': lambda: weather_service.fetch_weather_icons(dict(weather_data)),
+        '_format_data_store': lambda: chat_service._format_data_store(),
+    }
+
+
+async def measure(factory: Callable, repeat: int) -> dict[str, float]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await factory()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    await factory()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'time_ms': statistics.median(timings) * 1000, 'peak_kb': peak / 1024}
+
+
+async def run(repeat: int, selection: str) -> dict[str, dict[str, float]]:
+    results = {}
+    for days, variables, locations in itertools.product(DAYS, VARIABLES, LOCATIONS):
+        cases = await build_cases(days, variables, locations, repeat)
+        for stage, factory in cases.items():
+            name = f'{stage}[days={days},vars={variables},locs={locations}]'
+            if selection and selection not in name:
+                continue
+            results[name] = await measure(factory, repeat)
+            print(f"{name:<70} {results[name]['time_ms']:9.3f} ms {results[name]['peak_kb']:10.1f} KiB")
+    return results
+
+
+def compare(results: dict, baseline: dict, time_tolerance: float, memory_tolerance: float,
+            min_delta_ms: float, min_delta_kb: float) -> list[str]:
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        expected = baseline[name]
+        if result['time_ms'] > max(expected['time_ms'] * (1 + time_tolerance), expected['time_ms'] + min_delta_ms):
+            regressions.append(f"{name}: time {expected['time_ms']:.3f} -> {result['time_ms']:.3f} ms")
+        if result['peak_kb'] > max(expected['peak_kb'] * (1 + memory_tolerance), expected['peak_kb'] + min_delta_kb):
+            regressions.append(f"{name}: peak memory {expected['peak_kb']:.1f} -> {result['peak_kb']:.1f} KiB")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('-k', '--select', default='', help='only run cases whose name contains this string')
+    parser.add_argument('--save', action='store_true', help=f'save results to {BASELINE_PATH.name}')
+    parser.add_argument('--compare', action='store_true', help=f'fail if slower than {BASELINE_PATH.name}')
+    parser.add_argument('--time-tolerance', type=float, default=0.5)
+    parser.add_argument('--memory-tolerance', type=float, default=0.2)
+    parser.add_argument('--min-delta-ms', type=float, default=0.05, help='ignore slowdowns smaller than this')
+    parser.add_argument('--min-delta-kb', type=float, default=8, help='ignore peak memory growth smaller than this')
+    parser.add_argument('--log-level', default='INFO', help='level of the (discarded) loguru sink')
+    args = parser.parse_args()
+
+    # Keep the production log level so formatting costs are measured, but discard the output
+    logger.remove()
+    logger.add(open(os.devnull, 'w'), level=args.log_level)
+
+    results = asyncio.run(run(args.repeat, args.select))
+
+    if args.save:
+        BASELINE_PATH.write_text(json.dumps(results, indent=2))
+        print(f"Baseline saved to {BASELINE_PATH}")
+    if args.compare:
+        if not BASELINE_PATH.exists():
+            sys.exit(f"No baseline at {BASELINE_PATH}, run with --save first")
+        regressions = compare(results, json.loads(BASELINE_PATH.read_text()), args.time_tolerance, args.memory_tolerance,
+                              args.min_delta_ms, args.min_delta_kb)
+        if regressions:
+            print('\nRegressions:\n' + '\n'.join(regressions))
+            sys.exit(1)
+        print('\nNo regressions against baseline.')
+
+
+if __name__ == '__main__':
+    main()
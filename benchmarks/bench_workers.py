@@ -0,0 +1,103 @@
+"""
+Throughput of the multi-worker mode from 1 to N workers.
+
+Each worker serves an endpoint that parses a synthetic 3-day forecast with
+WeatherService._clean_metservice_response, the CPU-bound part of a query.
+Requests are spread over simulated clients (X-Forwarded-For) so the IP-affinity
+proxy distributes them across workers.
+
+    python benchmarks/bench_workers.py --workers 1 2 4 --requests 400 --concurrency 32
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+from fixtures import metservice_payload
+
+BASE_PORT = 18080
+
+
+def run_worker() -> None:
+    import uvicorn
+    from starlette.applications import Starlette
+    from starlette.responses import JSONResponse
+    from starlette.routing import Route
+
+    from service.weather_service import WeatherService
+
+    weather_service = WeatherService()
+    payload = metservice_payload(days=3, variables=9)
+
+    async def parse(request):
+        summaries = await weather_service._clean_metservice_response(payload)
+        return JSONResponse({'days': len(summaries), 'pid': os.getpid()})
+
+    uvicorn.run(Starlette(routes=[Route('/parse', parse)]), host='127.0.0.1',
+                port=int(os.environ['WORKER_PORT']), log_level='warning')
+
+
+def run_proxy(workers: int) -> None:
+    from utils.workers import run_workers
+    run_workers(host='127.0.0.1', port=BASE_PORT, workers=workers, argv=[__file__, '--worker'])
+
+
+def wait_for_port(port: int, timeout: float = 30) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        with socket.socket() as s:
+            if s.connect_ex(('127.0.0.1', port)) == 0:
+                return
+        time.sleep(0.2)
+    raise TimeoutError(f"Port {port} did not open")
+
+
+async def load(requests: int, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(base_url=f'http://127.0.0.1:{BASE_PORT}', timeout=60) as client:
+        async def one(i: int) -> None:
+            async with semaphore:
+                response = await client.get('/parse', headers={'X-Forwarded-For': f'10.0.{i % 256}.{i % 97}'})
+                response.raise_for_status()
+
+        await one(0)
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        return requests / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--proxy', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        return run_worker()
+    if args.proxy:
+        return run_proxy(args.proxy)
+
+    baseline = None
+    for workers in args.workers:
+        process = subprocess.Popen([sys.executable, __file__, '--proxy', str(workers)])
+        try:
+            for port in [BASE_PORT, *range(BASE_PORT + 1, BASE_PORT + workers + 1)]:
+                wait_for_port(port)
+            throughput = asyncio.run(load(args.requests, args.concurrency))
+        finally:
+            process.terminate()
+            process.wait()
+        baseline = baseline or throughput
+        print(f"workers={workers:<3} {throughput:8.1f} req/s  x{throughput / baseline:.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""
+Local stand-ins for the Metoceanapi /point/time endpoint, Nominatim and the
+OpenAI chat-completions API, with configurable latency and error injection.
+
+    python benchmarks/fake_upstreams.py --port 18900 --metservice-latency 150 --error-rate 0.01
+
+Point the app at it with:
+    METSERVICE_API_URL=http://127.0.0.1:18900
+    NOMINATIM_DOMAIN=127.0.0.1:18900 NOMINATIM_SCHEME=http
+    OPENAI_BASE_URL=http://127.0.0.1:18900/v1
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import zlib
+from datetime import date, timedelta
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from fixtures import point_time_response
+
+TOWNS = {
+    'auckland': (-36.8485, 174.7633),
+    'wellington': (-41.2865, 174.7762),
+    'christchurch': (-43.5321, 172.6362),
+    'dunedin': (-45.8788, 170.5028),
+    'hamilton': (-37.7870, 175.2793),
+    'tauranga': (-37.6878, 176.1651),
+    'napier': (-39.4928, 176.9120),
+    'nelson': (-41.2706, 173.2840),
+    'queenstown': (-45.0312, 168.6626),
+    'whangarei': (-35.7251, 174.3237),
+}
+
+
+class Upstream:
+    def __init__(self, latency_ms: float, error_rate: float) -> None:
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+
+    async def delay(self) -> None:
+        if self.latency_ms:
+            # +/- 25% jitter around the configured latency
+            await asyncio.sleep(self.latency_ms * random.uniform(0.75, 1.25) / 1000)
+
+    def should_fail(self) -> bool:
+        return random.random() < self.error_rate
+
+
+def _towns_in(text: str) -> list[str]:
+    text = text.lower()
+    return [town for town in TOWNS if town in text] or ['auckland']
+
+
+def _classification_arguments(query: str) -> dict:
+    tomorrow = date.today() + timedelta(days=1)
+    multi_day = 'week' in query.lower() or 'days' in query.lower()
+    return {
+        'query_type': ['general weather'],
+        'locations': [town.title() for town in _towns_in(query)],
+        'query_from_date': tomorrow.isoformat(),
+        'query_to_date': (tomorrow + timedelta(days=2 if multi_day else 0)).isoformat(),
+        'query_period': ['multi-day'] if multi_day else ['whole day'],
+    }
+
+
+def build_app(metservice: Upstream, nominatim: Upstream, openai: Upstream) -> Starlette:
+    async def point_time(request: Request):
+        await metservice.delay()
+        if metservice.should_fail():
+            return JSONResponse({'error': 'injected'}, status_code=503)
+        return JSONResponse(point_time_response(await request.json()))
+
+    async def search(request: Request):
+        await nominatim.delay()
+        if nominatim.should_fail():
+            return JSONResponse({'error': 'injected'}, status_code=503)
+        town = _towns_in(request.query_params.get('q', ''))[0]
+        latitude, longitude = TOWNS[town]
+        return JSONResponse([{'lat': str(latitude), 'lon': str(longitude), 'display_name': town.title(),
+                              'name': town.title(), 'place_id': zlib.crc32(town.encode())}])
+
+    async def reverse(request: Request):
+        await nominatim.delay()
+        if nominatim.should_fail():
+            return JSONResponse({'error': 'injected'}, status_code=503)
+        latitude, longitude = float(request.query_params['lat']), float(request.query_params['lon'])
+        town = min(TOWNS, key=lambda t: (TOWNS[t][0] - latitude) ** 2 + (TOWNS[t][1] - longitude) ** 2)
+        return JSONResponse({'lat': str(latitude), 'lon': str(longitude), 'display_name': town.title(),
+                             'name': town.title()})
+
+    async def chat_completions(request: Request):
+        await openai.delay()
+        if openai.should_fail():
+            return JSONResponse({'error': {'message': 'injected', 'type': 'server_error'}}, status_code=500)
+        body = await request.json()
+        query = next(m['content'] for m in reversed(body['messages']) if m['role'] == 'user')
+        message: dict = {'role': 'assistant', 'content': None}
+        if 'tools' in body:
+            name = body['tools'][0]['function']['name']
+            message['tool_calls'] = [{'id': 'call_0', 'type': 'function', 'function': {
+                'name': name, 'arguments': json.dumps(_classification_arguments(query))}}]
+        elif 'functions' in body:
+            name = body['functions'][0]['name']
+            message['function_call'] = {'name': name, 'arguments': json.dumps(_classification_arguments(query))}
+        else:
+            message['content'] = f"Tomorrow in {' and '.join(town.title() for town in _towns_in(query))} looks fine with light winds."
+        return JSONResponse({
+            'id': 'chatcmpl-fake', 'object': 'chat.completion', 'created': int(time.time()), 'model': body['model'],
+            'choices': [{'index': 0, 'message': message, 'finish_reason': 'stop'}],
+            'usage': {'prompt_tokens': 100, 'completion_tokens': 20, 'total_tokens': 120},
+        })
+
+    return Starlette(routes=[
+        Route('/point/time', point_time, methods=['POST']),
+        Route('/search', search),
+        Route('/reverse', reverse),
+        Route('/v1/chat/completions', chat_completions, methods=['POST']),
+    ])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=18900)
+    parser.add_argument('--metservice-latency', type=float, default=150, help='ms')
+    parser.add_argument('--nominatim-latency', type=float, default=100, help='ms')
+    parser.add_argument('--openai-latency', type=float, default=600, help='ms')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests that fail')
+    args = parser.parse_args()
+
+    app = build_app(
+        metservice=Upstream(args.metservice_latency, args.error_rate),
+        nominatim=Upstream(args.nominatim_latency, args.error_rate),
+        openai=Upstream(args.openai_latency, args.error_rate),
+    )
+    uvicorn.run(app, host='127.0.0.1', port=args.port, log_level='warning')
+
+
+if __name__ == '__main__':
+    main()
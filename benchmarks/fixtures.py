@@ -0,0 +1,69 @@
+"""Synthetic Metservice /point/time responses for benchmarks."""
+import math
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'src' / 'app'))
+
+from utils.constants import WeatherVarMap  # noqa: E402
+
+variable_units = {
+    WeatherVarMap.humidity: 'percent',
+    WeatherVarMap.temp: 'degreeK',
+    WeatherVarMap.cloud_cover: 'percent',
+    WeatherVarMap.rain: 'millimeterPerHour',
+    WeatherVarMap.wind_direction: 'degree',
+    WeatherVarMap.wind_speed: 'meterPerSecond',
+    WeatherVarMap.sea_temperature: 'degreeK',
+    WeatherVarMap.wave_height: 'meter',
+    WeatherVarMap.wave_height_max: 'meter',
+    WeatherVarMap.wave_direction_mean: 'degree',
+    WeatherVarMap.wave_direction_peak: 'degree',
+    WeatherVarMap.wave_period_peak: 'second',
+    WeatherVarMap.wind_speed_gust: 'meterPerSecond',
+}
+
+
+def metservice_payload(days: int = 1, variables: int = 6, locations: int = 1, interval_hours: int = 1,
+                       start: datetime = datetime(2024, 5, 1)) -> dict:
+    """Build a response shaped like the Metoceanapi /point/time JSON."""
+    steps = days * 24 // interval_hours
+    times = [(start + timedelta(hours=i * interval_hours)).strftime('%Y-%m-%dT%H:%M:%SZ') for i in range(steps)]
+    points = [{'lat': -36.85 - i * 0.1, 'lon': 174.76 + i * 0.1} for i in range(locations)]
+    selected = list(variable_units)[:variables]
+    return {
+        'dimensions': {
+            'point': {'data': points},
+            'time': {'data': times},
+        },
+        'variables': {
+            variable.value: {
+                'units': variable_units[variable],
+                'data': [290 + 5 * math.sin(i / 4 + n) for i in range(steps * locations)],
+            }
+            for n, variable in enumerate(selected)
+        },
+    }
+
+
+def point_time_response(body: dict) -> dict:
+    """Build a response for a /point/time request body, honouring its points, variables and time range."""
+    start = datetime.strptime(body['time']['from'], '%Y-%m-%dT%H:%M:%SZ')
+    interval_hours = int(body['time'].get('interval', '1h').rstrip('h'))
+    steps = body['time'].get('repeat', 0) + 1
+    points = body['points']
+    return {
+        'dimensions': {
+            'point': {'data': points},
+            'time': {'data': [(start + timedelta(hours=i * interval_hours)).strftime('%Y-%m-%dT%H:%M:%SZ')
+                              for i in range(steps)]},
+        },
+        'variables': {
+            name: {
+                'units': variable_units[WeatherVarMap(name)],
+                'data': [290 + 5 * math.sin(i / 4 + n) for i in range(steps * len(points))],
+            }
+            for n, name in enumerate(body['variables'])
+        },
+    }
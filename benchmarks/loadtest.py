@@ -0,0 +1,208 @@
+"""
+Offline end-to-end load test of the chat pipeline.
+
+Starts fake_upstreams.py, points WeatherService and ChatService at it and drives
+N simulated sessions through ChatService.answer_query (the flow behind the chat
+page's send button) with a headless UI. Reports p50/p95/p99 latency per stage,
+throughput and event-loop lag.
+
+    python benchmarks/loadtest.py --sessions 50 --messages 5 --openai-latency 600 --error-rate 0.01
+"""
+import argparse
+import asyncio
+import importlib
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from collections.abc import Callable
+from pathlib import Path
+
+from loguru import logger
+
+import fixtures  # noqa: F401  (puts src/app on the path)
+from fake_upstreams import TOWNS
+
+QUERY_TEMPLATES = [
+    "What's the weather like in {town} tomorrow?",
+    "Will it rain in {town} tomorrow?",
+    "How windy will {town} be over the next few days?",
+    "What's the forecast for {town} this week?",
+    "Compare {town} and {other_town} tomorrow",
+]
+
+stage_timings: dict[str, list[float]] = defaultdict(list)
+
+
+def configure_environment(port: int) -> None:
+    os.environ.update({
+        'METSERVICE_API_URL': f'http://127.0.0.1:{port}',
+        'METSERVICE_API_KEY': 'loadtest',
+        'NOMINATIM_DOMAIN': f'127.0.0.1:{port}',
+        'NOMINATIM_SCHEME': 'http',
+        'OPENAI_BASE_URL': f'http://127.0.0.1:{port}/v1',
+        'OPENAI_API_KEY': 'loadtest',
+    })
+
+
+def timed(stage: str, func: Callable) -> Callable:
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            stage_timings[stage].append(time.perf_counter() - start)
+    return wrapper
+
+
+def import_app() -> None:
+    """
+    Import the app once the environment points it at the fake upstreams. The import takes seconds and would
+    block the event loop, so it happens before the loop lag is measured.
+    """
+    for module in ('presentation.ui_manager', 'service.chat_service', 'service.user_service', 'service.weather_service'):
+        importlib.import_module(module)
+
+
+def build_session():
+    from presentation.ui_manager import UIManager
+    from service.chat_service import ChatService
+    from service.user_service import UserService
+    from service.weather_service import WeatherService
+    from models import Message
+
+    class HeadlessUIManager(UIManager):
+        """Keeps the chat log but renders nothing."""
+        async def add_message(self, role: str, content: str):
+            self.chat_log.append(Message(role=role, content=content, stamp='', avatar='', sent=role == 'user'))
+
+        async def toggle_visual_processing(self, show_spinner: bool):
+            pass
+
+        def update_map(self, lat_lngs: list[tuple[float, float]]) -> None:
+            pass
+
+        def update_chart(self, chart_data: dict[str, dict[str, list]], classification) -> None:
+            pass
+
+    weather_service = WeatherService()
+    chat_service = ChatService(weather_service=weather_service, ui_manager=HeadlessUIManager(),
+                               user_service=UserService(), user_storage={})
+    for stage, owner, name in [
+        ('classify', chat_service, 'classify_query'),
+        ('get_weather_data', weather_service, 'get_weather_data'),
+        ('geocode', weather_service, '_location_to_lat_lon'),
+        ('metservice_call', weather_service, '_metservice_api_call'),
+        ('parse', weather_service, '_clean_metservice_points'),
+        ('store', weather_service, '_store_weather_data'),
+        ('answer', chat_service, 'process_message'),
+        ('fetch_data', weather_service, 'fetch_data'),
+        ('weather_icons', weather_service, 'fetch_weather_icons'),
+        ('downsample', weather_service, 'downsample_data'),
+        ('rollups', weather_service, 'fetch_rollups'),
+    ]:
+        setattr(owner, name, timed(stage, getattr(owner, name)))
+    return chat_service
+
+
+async def run_session(messages: int, think_time: float, errors: list[str]) -> None:
+    chat_service = build_session()
+    await asyncio.sleep(random.uniform(0, think_time))
+    for _ in range(messages):
+        town, other_town = random.sample(list(TOWNS), 2)
+        query = random.choice(QUERY_TEMPLATES).format(town=town.title(), other_town=other_town.title())
+        start = time.perf_counter()
+        try:
+            await chat_service.answer_query(query)
+        except Exception as e:
+            errors.append(f"{type(e).__name__}: {e}")
+        stage_timings['total'].append(time.perf_counter() - start)
+        await asyncio.sleep(random.uniform(0, think_time))
+
+
+async def monitor_loop_lag(lags: list[float], interval: float = 0.01) -> None:
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, time.perf_counter() - start - interval))
+
+
+def percentiles(values: list[float]) -> tuple[float, float, float]:
+    if len(values) < 2:
+        value = values[0] if values else 0.0
+        return value, value, value
+    # Inclusive, so percentiles stay within the observed values rather than extrapolating past the max
+    q = statistics.quantiles(values, n=100, method='inclusive')
+    return q[49], q[94], q[98]
+
+
+async def run(args: argparse.Namespace) -> None:
+    errors: list[str] = []
+    lags: list[float] = []
+    monitor = asyncio.create_task(monitor_loop_lag(lags))
+    start = time.perf_counter()
+    await asyncio.gather(*(run_session(args.messages, args.think_time, errors) for _ in range(args.sessions)))
+    elapsed = time.perf_counter() - start
+    monitor.cancel()
+
+    total = len(stage_timings['total'])
+    print(f"\n{args.sessions} sessions x {args.messages} messages in {elapsed:.1f}s: "
+          f"{total / elapsed:.2f} messages/s, {len(errors)} errors")
+    print(f"\n{'stage':<18}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for stage, values in stage_timings.items():
+        p50, p95, p99 = percentiles(values)
+        print(f"{stage:<18}{len(values):>7}{p50 * 1000:>10.1f}{p95 * 1000:>10.1f}{p99 * 1000:>10.1f}")
+    p50, p95, p99 = percentiles(lags)
+    print(f"\nevent-loop lag: p50={p50 * 1000:.1f}ms p95={p95 * 1000:.1f}ms p99={p99 * 1000:.1f}ms "
+          f"max={max(lags, default=0) * 1000:.1f}ms")
+    for error in sorted(set(errors))[:10]:
+        print(f"  {error}")
+
+
+def wait_for_port(port: int, timeout: float = 30) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        with socket.socket() as s:
+            if s.connect_ex(('127.0.0.1', port)) == 0:
+                return
+        time.sleep(0.2)
+    raise TimeoutError(f"Port {port} did not open")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', type=int, default=20)
+    parser.add_argument('--messages', type=int, default=3, help='messages per session')
+    parser.add_argument('--think-time', type=float, default=1.0, help='max seconds between messages')
+    parser.add_argument('--port', type=int, default=18900)
+    parser.add_argument('--metservice-latency', type=float, default=150, help='ms')
+    parser.add_argument('--nominatim-latency', type=float, default=100, help='ms')
+    parser.add_argument('--openai-latency', type=float, default=600, help='ms')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--log-level', default='WARNING')
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level=args.log_level)
+    configure_environment(args.port)
+    import_app()
+
+    upstreams = subprocess.Popen([
+        sys.executable, str(Path(__file__).parent / 'fake_upstreams.py'), '--port', str(args.port),
+        '--metservice-latency', str(args.metservice_latency), '--nominatim-latency', str(args.nominatim_latency),
+        '--openai-latency', str(args.openai_latency), '--error-rate', str(args.error_rate),
+    ])
+    try:
+        wait_for_port(args.port)
+        asyncio.run(run(args))
+    finally:
+        upstreams.terminate()
+        upstreams.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,34 @@
+import gc
 import os
+import sys
 
 from nicegui import ui
 from loguru import logger
 
 from presentation.overview import load_interface
+from utils.log import configure_logging
+from utils.workers import run_workers
 
 def main():
+    configure_logging()
     port = int(os.environ.get('PORT', 80))
+    workers = int(os.environ.get('WORKERS', 1))
+    if workers > 1 and 'WORKER_PORT' not in os.environ:
+        logger.info(f"Starting WeatherBot with {workers} workers")
+        run_workers(host="0.0.0.0", port=port, workers=workers, argv=sys.argv)
+        return
+
     logger.info("Starting WeatherBot")
     load_interface()
-    ui.run(title="WeatherBot", storage_secret="secret-key", port=port, host="0.0.0.0")
+    # Move everything loaded at start-up out of the garbage collector's view, so full collections
+    # triggered by large forecast parses only walk recent objects instead of stalling the event loop
+    gc.freeze()
+    if 'WORKER_PORT' in os.environ:
+        ui.run(title="WeatherBot", storage_secret="secret-key", port=int(os.environ['WORKER_PORT']),
+               host="127.0.0.1", reload=False, show=False)
+    else:
+        ui.run(title="WeatherBot", storage_secret="secret-key", port=port, host="0.0.0.0")
 
 
 if __name__ in {"__main__", "__mp_main__"}:
-    main()
\ No newline at end of file
+    main()
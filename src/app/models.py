@@ -9,14 +9,20 @@ class QueryClassification(BaseModel):
     """Model for weather queries."""    
     query_type: list[QueryTypesEnum] = Field(..., title='Weather query type',
         description='What type of query has the user sent?')
-    location: Optional[str] = Field(None, title='Location',
-        description='The location the user is asking about.')
+    locations: list[str] = Field(default_factory=list, title='Locations',
+        description='Every location the user is asking about, e.g. ["Auckland", "Wellington"] when comparing places.')
     query_from_date: date = Field(..., title='First Date',
         description='The first day to request data for, formatted as :%Y-%m-%d')
     query_to_date: date = Field(..., title='Last Date',
         description='The last day to request data for, formatted as :%Y-%m-%d. Unless query_period is "multi-day", this should be the same as query_from_date.')
     query_period: list[QueryPeriodsEnum] = Field(..., title='Query period',
         description='The period of time the user is asking about. If they are ask for specific times select a period that includes that time: morning=6-11.59, afternoon=12-17.59, evening=18-23.59, night=0-5.59. If they are asking for multiple days or a week, select "multiple_days".')
+
+    @property
+    def location(self) -> Optional[str]:
+        """The first (or only) location asked about."""
+        return self.locations[0] if self.locations else None
+
 class ModelResponseToWeatherQuery(QueryClassification):
     """Request model for weather queries."""
     response: str = Field(..., title='Response',
@@ -45,6 +51,7 @@ class Message(BaseModel):
     stamp: str
     avatar: str
     sent: bool
+    id: Optional[int] = Field(None, title='Chat history id', description='Set once the message has been stored')
 
 class MetserviceVariable(BaseModel):
     """Model for variable response in Metservice API."""
@@ -66,3 +73,7 @@ class MetservicePeriodSummary(BaseModel):
     longitude: float
     location: Optional[str] = None
     hour_summaries: list[MetserviceTimePointSummary]
+    fetched_at: Optional[float] = Field(None, title='Fetched at',
+        description='Unix time the data was fetched from the Metservice API')
+    rollups: dict[QueryPeriodsEnum, dict[str, dict[str, float]]] = Field(default_factory=dict, title='Rollups',
+        description='Aggregates of each variable per period of the day, e.g. rollups[WHOLE_DAY][variable]["max"]')
@@ -1,4 +1,4 @@
-
+from utils.constants import WeatherVarMap
 
 
 def chart_options() -> dict:
@@ -10,7 +10,8 @@ def chart_options() -> dict:
                 'textOverflow': 'ellipsis'},
             },
     'chart': {'marginBottom': 100, 'marginRight': 60, 'marginTop': 50, 'plotBorderWidth': 1,
-            'height': 400, 'alignTicks': False, 'scrollablePlotArea': {'minWidth': 650}},
+            'height': 400, 'alignTicks': False, 'scrollablePlotArea': {'minWidth': 650},
+            'zooming': {'type': 'x'}},
     'credits': {'text': 'Forecast from <a href="https://metservice.com">Metservice</a>',
                 'href': 'https://metservice.com',
                 'position': {'x': -40}
@@ -130,6 +131,48 @@ def chart_options() -> dict:
             'fillOpacity': 0.3,
             'tooltip': {'valueSuffix': ' %'},
             'visible': False
+        }, {
+            'name': 'Daily range',
+            'data': [],  # Filled for multi-day forecasts
+            'type': 'arearange',
+            'step': 'left',
+            'color': '#FF3333',
+            'fillOpacity': 0.1,
+            'lineWidth': 0,
+            'marker': {'enabled': False},
+            'tooltip': {'pointFormat': '<span style="color:{point.color}">\u25CF</span> ' +
+                        '{series.name}: <b>{point.low}–{point.high}°C</b>{#if point.total}, {point.total} mm rain{/if}<br/>'},
+            'zIndex': 0
         }
     ],
-}
\ No newline at end of file
+}
+
+
+def comparison_series(location: str, chart_data: dict) -> list[dict]:
+    """Temperature and precipitation series for another location shown on the same chart."""
+    temperature = [[point['x'], point['y']] if isinstance(point, dict) else point
+                   for point in chart_data.get(WeatherVarMap.temp, [])]
+    series = []
+    if temperature:
+        series.append({
+            'name': f'Temperature ({location})',
+            'data': temperature,
+            'type': 'spline',
+            'marker': {'enabled': False, 'states': {'hover': {'enabled': True}}},
+            'tooltip': {'valueSuffix': '°C'},
+            'dashStyle': 'shortdash',
+            'zIndex': 1,
+        })
+    if chart_data.get(WeatherVarMap.rain):
+        series.append({
+            'name': f'Precipitation ({location})',
+            'data': chart_data[WeatherVarMap.rain],
+            'type': 'column',
+            'yAxis': 1,
+            'groupPadding': 0,
+            'pointPadding': 0.2,
+            'grouping': False,
+            'opacity': 0.6,
+            'tooltip': {'valueSuffix': ' mm'},
+        })
+    return series
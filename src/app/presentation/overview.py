@@ -1,20 +1,46 @@
 import os
 from typing import Optional
-from fastapi.responses import RedirectResponse
+from fastapi import Request
+from fastapi.responses import PlainTextResponse, RedirectResponse, Response
+from starlette.status import HTTP_409_CONFLICT
 from nicegui import ui, app
+from nicegui.events import GenericEventArguments
 from loguru import logger
 
+from service.admission_service import AdmissionService
+from service.chat_history import chat_history
 from service.chat_service import ChatService
-from models import QueryClassification
 from presentation.ui_manager import UIManager
 from service.user_service import UserService
 from service.weather_service import WeatherService
-from utils.constants import QueryTypesEnum
 from utils.auth import AuthMiddleware
+from utils.icons import icon_sprite
+from utils.metrics import render as render_metrics
+from utils.profiling import ProfilerBusyError, loop_lag_monitor, profiler
 
 
 def load_interface() -> None:
     app.add_middleware(AuthMiddleware)
+    app.on_startup(loop_lag_monitor.start)
+    app.on_shutdown(loop_lag_monitor.stop)
+
+    @app.get('/metrics')
+    def metrics() -> PlainTextResponse:
+        return PlainTextResponse(render_metrics(), media_type='text/plain; version=0.0.4')
+
+    @app.get('/admin/profile')
+    async def profile(seconds: float = 10, interval_ms: float = 10) -> PlainTextResponse:
+        """Sample this process's stacks for `seconds` and return them collapsed, for flamegraph.pl or speedscope."""
+        try:
+            stacks = await profiler.profile(seconds=seconds, interval=interval_ms / 1000)
+        except ProfilerBusyError as e:
+            return PlainTextResponse(str(e), status_code=HTTP_409_CONFLICT)
+        return PlainTextResponse(stacks)
+
+    if icon_sprite is not None:
+        @app.get(icon_sprite.url)
+        def weather_icons(request: Request) -> Response:
+            return icon_sprite.response(request.headers.get('accept-encoding', ''), request.headers.get('if-none-match', ''))
 
     @ui.page('/')
     def home_page() -> RedirectResponse:
@@ -41,39 +67,34 @@ def load_interface() -> None:
     
     @ui.page('/chat')
     async def chat_page() -> None:
-        user_service = UserService()
+        user_service = UserService(user_storage=app.storage.user)
         weather_service = WeatherService()
-        ui_manager = UIManager()
-        chat_service = ChatService(weather_service=weather_service, ui_manager=ui_manager, user_service=user_service)
+        ui_manager = UIManager(chat_history=chat_history, user_id=app.storage.browser['id'])
+        chat_service = ChatService(weather_service=weather_service, ui_manager=ui_manager, user_service=user_service,
+                                   user_storage=app.storage.user)
 
         logger.info(f"loading chat page for user: {app.storage.user}")
+        if icon_sprite is not None:
+            # Fetch the icons alongside the page rather than when the first chart renders
+            ui.add_head_html(f'<link rel="preload" href="{icon_sprite.url}" as="image" type="image/svg+xml">')
         
         async def chat_callback(e: ui.input) -> None:
             query = e.value
             e.set_value(None)
-            classification: QueryClassification = await chat_service.classify_query(query=query)
-
-            if QueryTypesEnum.NON_WEATHER in classification.query_type:
-                logger.info("Query type is not weather related")
-                await chat_service.process_message()
-                return
-            
-            logger.info("Query type is weather related")
-            metservice_response = await chat_service.weather_service.get_weather_data(classification)
-            await chat_service.process_message()
-
-            latitude = metservice_response[0].latitude
-            longitude = metservice_response[0].longitude
-            chat_service.ui_manager.update_map((latitude, longitude))
-            logger.info(f"Map shown for location: {classification.location}")
+            await admission_service.submit(query)
 
-            weather_data = await chat_service.weather_service.fetch_data(classification)
+        async def chart_zoom_callback(e: GenericEventArguments) -> None:
+            window = None
+            if e.args.get('min') is not None and e.args.get('max') is not None:
+                window = (e.args['min'], e.args['max'])
+            logger.info(f"Chart zoomed to window: {window}")
+            await chat_service.zoom_chart(window=window)
 
-            if QueryTypesEnum.GENERAL_WEATHER in classification.query_type:
-                weather_data = await chat_service.weather_service.fetch_weather_icons(weather_data)
-                
-            chat_service.ui_manager.update_chart(weather_data, classification)
+        ui.on('chart_zoom', chart_zoom_callback)
+        user_service.start_location_acquisition(reverse_geocode=weather_service._lat_lon_to_location)
+        admission_service = AdmissionService(pipeline=chat_service.answer_query, on_busy=ui_manager.toggle_visual_processing)
 
+        await chat_service.ui_manager.load_chat_history()
         chat_service.ui_manager.load_ui()
         with ui.row().classes('h-full w-full no-wrap items-stretch max-h-screen'):
             chat_service.ui_manager.load_chat_column(callback=chat_callback)
@@ -1,20 +1,41 @@
+from collections import deque
 from collections.abc import Awaitable, Callable
 import os
 from datetime import datetime
+from typing import Optional
 
 from dotenv import load_dotenv
+from loguru import logger
 from nicegui import ui
 
 from models import Message, QueryClassification
-from presentation.components import chart_options
-from utils.constants import QueryTypesEnum, WeatherVarMap
+from presentation.components import chart_options, comparison_series
+from service.chat_history import ChatHistory
+from utils.constants import QueryPeriodsEnum, QueryTypesEnum, WeatherVarMap, daily_range_series
 
 
 class UIManager:
-    def __init__(self) -> None:
-        self.chat_log: list[Message] = []
+    """
+    Builds and updates the chat page. With a chat history store the page opens on the user's latest page
+    of messages and older pages are loaded as they scroll up. Only the most recent messages are kept
+    in `chat_log` (the context sent with each query) and at most `render_limit` are shown at once,
+    so a long-lived session holds the same amount of memory however long the conversation gets.
+    """
+    def __init__(self, chat_history: Optional[ChatHistory] = None, user_id: Optional[str] = None) -> None:
+        self.chat_history = chat_history if user_id is not None else None
+        self.user_id = user_id
+        self.page_size = int(os.environ.get('CHAT_HISTORY_PAGE_SIZE', 20))
+        self.render_limit = int(os.environ.get('CHAT_RENDER_LIMIT', 100))
+        self.chat_log: deque[Message] = deque(maxlen=int(os.environ.get('CHAT_LOG_WINDOW', 20)))
+        self.chat_panel = None
+        self.chat_container = None
+        # (history id, element) of each message shown, oldest first
+        self._shown_messages: deque[tuple[Optional[int], ui.chat_message]] = deque()
+        self._history_exhausted = self.chat_history is None
+        self._loading_history = False
         self.map = None
         self.chart = None
+        self.chart_classification = None
         self.spinner = None
         self.send_button = None
 
@@ -35,8 +56,21 @@ class UIManager:
         OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY', None)
         METSERVICE_API_KEY = os.environ.get('METSERVICE_API_KEY', None)
         with ui.column().classes('w-1/3 max-w-2xl items-stretch mx-auto h-full max-w-2xl px-4 h-full'):
-            with ui.tab_panel(name='chat').classes('w-full h-5/6 px-4 border rounded-lg border-gray-300 max-w-2xl items-stretch overflow-auto flex-column-reverse overflow-anchor-auto'):
-                self._display_messages()
+            with ui.tab_panel(name='chat').classes('w-full h-5/6 px-4 border rounded-lg border-gray-300 max-w-2xl items-stretch overflow-auto flex-column-reverse overflow-anchor-auto') as self.chat_panel:
+                self.chat_container = ui.column().classes('w-full items-stretch')
+                for message in self.chat_log:
+                    self._show_message(message)
+            # Ask for the previous page once the user scrolls near the top, remembering the height so the view stays put
+            self.chat_panel.on('scroll', js_handler="""(e) => {
+                const panel = e.target;
+                if (panel.scrollTop < 50 && !panel.dataset.loading) {
+                    panel.dataset.loading = '1';
+                    panel.dataset.previousHeight = panel.scrollHeight;
+                    emitEvent('chat_history_top');
+                }
+            }""")
+            ui.on('chat_history_top', self.load_older_messages)
+            self._scroll_to_bottom()
             with ui.row().classes('w-full h-1/6 no-wrap bottom-5 mx-auto'):
                 if OPENAI_API_KEY and METSERVICE_API_KEY:
                     placeholder = 'Message WeatherBot'
@@ -76,6 +110,37 @@ class UIManager:
                                         'w-full h-full')
                 self.chart = chart
 
+    async def load_chat_history(self) -> None:
+        """Start the chat log with the user's latest page of stored messages."""
+        if self.chat_history is None:
+            return
+        messages = await self.chat_history.page(self.user_id, limit=self.page_size)
+        self.chat_log.extend(messages)
+        self._history_exhausted = len(messages) < self.page_size
+        logger.info(f"Loaded {len(messages)} stored chat messages")
+
+    async def load_older_messages(self) -> None:
+        """Show the page of stored messages before the oldest one shown, keeping the user's scroll position."""
+        if self._loading_history:
+            return
+        self._loading_history = True
+        try:
+            oldest_id = next((message_id for message_id, _ in self._shown_messages if message_id is not None), None)
+            messages = []
+            if not self._history_exhausted and oldest_id is not None:
+                messages = await self.chat_history.page(self.user_id, before_id=oldest_id, limit=self.page_size)
+                self._history_exhausted = len(messages) < self.page_size
+            for index, message in enumerate(messages):
+                self._show_message(message, index=index)
+        finally:
+            self._loading_history = False
+            ui.run_javascript(f"""setTimeout(() => {{
+                const panel = document.getElementById('c{self.chat_panel.id}');
+                if (!panel) return;
+                panel.scrollTop += panel.scrollHeight - Number(panel.dataset.previousHeight || panel.scrollHeight);
+                delete panel.dataset.loading;
+            }}, 0)""")
+
     async def add_message(self, role: str, content: str):
         if role == "user":
             avatar = "https://www.gravatar.com/avatar/"
@@ -91,15 +156,70 @@ class UIManager:
             sent=sent
             )
         self.chat_log.append(message)
-        self._display_messages.refresh()
+        if self.chat_history is not None:
+            await self.chat_history.append(self.user_id, message)
+        self._show_message(message)
+        self._trim_shown_messages()
+        self._scroll_to_bottom()
+
+    def _show_message(self, message: Message, index: Optional[int] = None) -> None:
+        """Add a message to the end of the chat, or at `index` (for older messages)."""
+        with self.chat_container:
+            element = ui.chat_message(message.content, name=message.role,
+                                      stamp=message.stamp, avatar=message.avatar, sent=message.sent)
+        if index is None:
+            self._shown_messages.append((message.id, element))
+        else:
+            element.move(target_index=index)
+            self._shown_messages.insert(index, (message.id, element))
+
+    def _trim_shown_messages(self) -> None:
+        """Remove the oldest messages shown beyond render_limit; they are loaded again from the history on scrolling up."""
+        if self.chat_history is None:
+            return
+        while len(self._shown_messages) > self.render_limit:
+            _, element = self._shown_messages.popleft()
+            self.chat_container.remove(element)
+            self._history_exhausted = False
+
+    def _scroll_to_bottom(self) -> None:
+        ui.run_javascript(f"{{const chatContainer = document.getElementById('c{self.chat_panel.id}'); "
+                          "if (chatContainer) {chatContainer.scrollTop = chatContainer.scrollHeight;}}")
 
-    def update_map(self, lat_lng: tuple[float, float]) -> None:
-        self.map.marker(latlng=(lat_lng))
-        self.map.center = (lat_lng)
+    def update_map(self, lat_lngs: list[tuple[float, float]]) -> None:
+        for lat_lng in lat_lngs:
+            self.map.marker(latlng=(lat_lng))
+        if lat_lngs:
+            self.map.center = (lat_lngs[0])
 
-    def update_chart(self, weather_data: dict[str, list], classification: QueryClassification) -> None:
-        self.chart.options['plotOptions']['series']['pointStart'] = weather_data['time_data'][0].timestamp() * 1000
-        self.chart.options['plotOptions']['series']['pointInterval'] = (weather_data['time_data'][1] - weather_data['time_data'][0]).seconds * 1000
+    def update_chart(self, chart_data: dict[str, dict[str, list]], classification: QueryClassification) -> None:
+        self.chart_classification = classification
+        self.update_chart_series(chart_data=chart_data, classification=classification)
+        self.chart.options['title']['text'] = f"Weather Forecast for {
+            ' and '.join(location.title() for location in classification.locations)} on {classification.query_from_date.strftime('%A, %d %B %Y')}"
+        self.chart.update()
+        # Reset any zoom from a previous query and report user zooms back to the server,
+        # which re-sends the visible range at full resolution.
+        ui.run_javascript(f"""{{
+            const chart = getElement({self.chart.id}).chart;
+            if (chart) {{
+                chart.xAxis[0].setExtremes(null, null, true, false);
+                if (!chart.zoomListener) {{
+                    chart.zoomListener = Highcharts.addEvent(chart.xAxis[0], 'afterSetExtremes', (e) => {{
+                        if (e.trigger) emitEvent('chart_zoom', {{min: e.userMin ?? null, max: e.userMax ?? null}});
+                    }});
+                }}
+            }}
+        }}""")
+
+    def update_chart_series(self, chart_data: dict[str, dict[str, list]], classification: QueryClassification) -> None:
+        """
+        Show the full forecast for the first location, banded by each day's temperature range for multi-day
+        forecasts, with temperature and precipitation series added for each other location being compared.
+        """
+        locations = list(chart_data)
+        comparison_data = {location: chart_data[location] for location in locations[1:]}
+        chart_data = chart_data[locations[0]] if locations else {}
         if QueryTypesEnum.GENERAL_WEATHER in classification.query_type:
             self.chart.options['series'][0]['data'] = [
                 {'x': point['x'], 'y': point['y'], 
@@ -107,21 +227,19 @@ class UIManager:
                         'enabled': True, 
                         'useHTML': True, 
                         'format': ('<div style="width: 30px; height: 30px; overflow: hidden; border-radius: 50%">' + f'<img src="{point["iconPath"]}"' + 'style="width: 30px"></div>')
-                    }} for point in weather_data.get(WeatherVarMap.temp, [])]
+                    }} for point in chart_data.get(WeatherVarMap.temp, [])]
         else:
-            self.chart.options['series'][0]['data'] = weather_data.get(WeatherVarMap.temp, [])
-        self.chart.options['series'][1]['data'] = weather_data.get(WeatherVarMap.rain, [])
-        self.chart.options['series'][2]['data'] = weather_data.get(WeatherVarMap.humidity, [])
-        self.chart.options['series'][3]['data'] = weather_data.get(WeatherVarMap.wind_speed, [])
-        self.chart.options['series'][4]['data'] = weather_data.get(WeatherVarMap.cloud_cover, [])
-        self.chart.options['title']['text'] = f"Weather Forecast for {
-            classification.location.title()} on {classification.query_from_date.strftime('%A, %d %B %Y')}"
-        self.chart.update()
+            self.chart.options['series'][0]['data'] = chart_data.get(WeatherVarMap.temp, [])
+        self.chart.options['series'][1]['data'] = chart_data.get(WeatherVarMap.rain, [])
+        self.chart.options['series'][2]['data'] = chart_data.get(WeatherVarMap.humidity, [])
+        self.chart.options['series'][3]['data'] = chart_data.get(WeatherVarMap.wind_speed, [])
+        self.chart.options['series'][4]['data'] = chart_data.get(WeatherVarMap.cloud_cover, [])
+        multiple_days = QueryPeriodsEnum.MULTIPLE_DAYS in classification.query_period
+        self.chart.options['series'][5]['data'] = chart_data.get(daily_range_series, []) if multiple_days else []
 
-    @ui.refreshable
-    def _display_messages(self):
-        for message in self.chat_log:
-            ui.chat_message(message.content, name=message.role,
-                            stamp=message.stamp, avatar=message.avatar, sent=message.sent)
-        ui.run_javascript(
-            "{const chatContainer = document.querySelector('.q-tab-panel.nicegui-tab-panel.overflow-auto'); if (chatContainer) {chatContainer.scrollTop = chatContainer.scrollHeight;}}")
+        del self.chart.options['series'][len(chart_options()['series']):]
+        for location, location_data in comparison_data.items():
+            self.chart.options['series'].extend(comparison_series(location=location.title(), chart_data=location_data))
+        self.chart.options['legend']['enabled'] = bool(comparison_data)
+        if locations:
+            self.chart.options['series'][0]['name'] = f"Temperature ({locations[0].title()})" if comparison_data else 'Temperature'
@@ -0,0 +1,67 @@
+import asyncio
+import os
+from collections.abc import Awaitable, Callable
+from typing import Optional
+
+from loguru import logger
+from nicegui import context, ui
+
+# Process-wide ceiling on concurrent chat pipelines, shared by every session.
+pipeline_slots = asyncio.Semaphore(int(os.environ.get('MAX_ACTIVE_PIPELINES', 8)))
+
+
+class AdmissionService:
+    """
+    Admits chat messages for one session so that at most one classify/fetch/answer pipeline runs at a time.
+    With the 'queue' policy new messages wait for the active one, with 'cancel' they replace it.
+    A message identical to the active or a queued one is dropped.
+    When the process is saturated the spinner is shown until a pipeline slot frees up.
+    """
+    def __init__(self, pipeline: Callable[[str], Awaitable], on_busy: Callable[[bool], Awaitable],
+                 policy: Optional[str] = None) -> None:
+        self.pipeline = pipeline
+        self.on_busy = on_busy
+        self.policy = policy or os.environ.get('CHAT_ADMISSION_POLICY', 'queue')
+        if self.policy not in ('queue', 'cancel'):
+            raise ValueError(f"Unknown admission policy: {self.policy}")
+        self.active_query: Optional[str] = None
+        self.queued_queries: list[str] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def submit(self, query: Optional[str]) -> None:
+        if not query or not query.strip():
+            return
+        if query == self.active_query or query in self.queued_queries:
+            logger.info(f"Dropping duplicate submission: {query}")
+            return
+
+        if self._task is not None and not self._task.done():
+            if self.policy == 'queue':
+                logger.info(f"Queueing message behind active query: {self.active_query}")
+                self.queued_queries.append(query)
+                return
+            logger.info(f"Cancelling active query: {self.active_query}")
+            self._task.cancel()
+
+        self._task = asyncio.create_task(self._run(query=query, slot=context.slot))
+
+    async def _run(self, query: str, slot) -> None:
+        with slot:
+            try:
+                while query is not None:
+                    self.active_query = query
+                    if pipeline_slots.locked():
+                        logger.warning("Maximum active pipelines reached, waiting for a free slot.")
+                        await self.on_busy(True)
+                        ui.notify('WeatherBot is busy, your message will be answered shortly.')
+                    async with pipeline_slots:
+                        try:
+                            await self.pipeline(query)
+                        except Exception as e:
+                            logger.error(f"Error processing query '{query}': {e}")
+                    query = self.queued_queries.pop(0) if self.queued_queries else None
+            finally:
+                # A cancelled pipeline has already been replaced, so leave the new one's state alone
+                if self._task is asyncio.current_task():
+                    self.active_query = None
+                    await self.on_busy(False)
@@ -0,0 +1,128 @@
+import asyncio
+import json
+import os
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Optional
+
+from loguru import logger
+
+
+class CacheBackend(ABC):
+    """Key/value cache for forecasts and geocodes, shared by every session in a process (or across workers)."""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Any]:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ...
+
+
+class MemoryCache(CacheBackend):
+    """
+    Per-process cache. Only suitable for a single worker.
+    Holds at most max_entries, evicting the least recently used, and drops expired entries every sweep_interval seconds.
+    """
+
+    def __init__(self, max_entries: int = 10000, sweep_interval: float = 300) -> None:
+        self.max_entries = max_entries
+        self.sweep_interval = sweep_interval
+        self._store: OrderedDict[str, tuple[Any, Optional[float]]] = OrderedDict()
+        self._last_sweep = time.time()
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self._store.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at < time.time():
+            del self._store[key]
+            return None
+        self._store.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        now = time.time()
+        expires_at = now + ttl if ttl else None
+        self._store[key] = (value, expires_at)
+        self._store.move_to_end(key)
+        if now - self._last_sweep > self.sweep_interval:
+            self._last_sweep = now
+            self._sweep(now)
+        while len(self._store) > self.max_entries:
+            self._store.popitem(last=False)
+
+    def _sweep(self, now: float) -> None:
+        expired = [key for key, (_, expires_at) in self._store.items() if expires_at is not None and expires_at < now]
+        for key in expired:
+            del self._store[key]
+        logger.debug("Swept {} expired cache entries", len(expired))
+
+
+class SQLiteCache(CacheBackend):
+    """
+    Cache in a local SQLite file in WAL mode, so every worker process on the host reads and writes the same entries.
+    Values are stored as JSON. Queries run in a thread to keep them off the event loop.
+    """
+
+    def __init__(self, path: str, compaction_interval: float = 3600) -> None:
+        self.path = path
+        self.compaction_interval = compaction_interval
+        self._last_compaction = 0.0
+        with self._connect() as connection:
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)')
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=10)
+
+    def _get(self, key: str) -> Optional[Any]:
+        with self._connect() as connection:
+            row = connection.execute(
+                'SELECT value FROM cache WHERE key = ? AND (expires_at IS NULL OR expires_at >= ?)',
+                (key, time.time())).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _set(self, key: str, value: Any, ttl: Optional[float]) -> None:
+        now = time.time()
+        expires_at = now + ttl if ttl else None
+        compact = now - self._last_compaction > self.compaction_interval
+        if compact:
+            self._last_compaction = now
+        with self._connect() as connection:
+            connection.execute('INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)',
+                               (key, json.dumps(value), expires_at))
+            if compact:
+                deleted = connection.execute('DELETE FROM cache WHERE expires_at < ?', (now,)).rowcount
+                logger.info(f"Compacted {deleted} expired cache entries")
+
+    async def get(self, key: str) -> Optional[Any]:
+        return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        await asyncio.to_thread(self._set, key, value, ttl)
+
+
+def get_cache_backend() -> CacheBackend:
+    """
+    Select the cache backend from CACHE_BACKEND ('memory' or 'sqlite').
+    Defaults to SQLite when running more than one worker so the workers share their caches.
+    """
+    workers = int(os.environ.get('WORKERS', 1))
+    backend = os.environ.get('CACHE_BACKEND', 'sqlite' if workers > 1 else 'memory')
+    if backend == 'sqlite':
+        path = os.environ.get('CACHE_PATH', 'weatherbot_cache.sqlite3')
+        logger.info(f"Using SQLite cache at {path}")
+        return SQLiteCache(path=path, compaction_interval=float(os.environ.get('CACHE_COMPACTION_INTERVAL', 3600)))
+    if backend == 'memory':
+        return MemoryCache(max_entries=int(os.environ.get('CACHE_MAX_ENTRIES', 10000)),
+                           sweep_interval=float(os.environ.get('CACHE_SWEEP_INTERVAL', 300)))
+    raise ValueError(f"Unknown cache backend: {backend}")
+
+
+cache = get_cache_backend()
@@ -0,0 +1,75 @@
+import asyncio
+import os
+import sqlite3
+import time
+from typing import Optional
+
+from loguru import logger
+
+from models import Message
+
+
+class ChatHistory:
+    """
+    Append-only store of each user's chat messages, so a conversation survives page reloads and restarts.
+    Messages are only ever inserted, and are read back a page at a time, newest first, by message id,
+    so loading the latest page or an older one is a single indexed range scan however long the history is.
+    """
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._created = False
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=10)
+        # Created on first use, so processes that never show a chat page (benchmarks, tools) leave no file behind
+        if not self._created:
+            with connection:
+                connection.execute('PRAGMA journal_mode=WAL')
+                connection.execute(
+                    'CREATE TABLE IF NOT EXISTS messages ('
+                    'id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT NOT NULL, role TEXT NOT NULL, content TEXT NOT NULL, '
+                    'stamp TEXT NOT NULL, avatar TEXT NOT NULL, sent INTEGER NOT NULL, created_at REAL NOT NULL)')
+                connection.execute('CREATE INDEX IF NOT EXISTS messages_user_id ON messages (user_id, id)')
+            self._created = True
+        return connection
+
+    def _append(self, user_id: str, message: Message) -> int:
+        with self._connect() as connection:
+            return connection.execute(
+                'INSERT INTO messages (user_id, role, content, stamp, avatar, sent, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (user_id, message.role, message.content, message.stamp, message.avatar, message.sent, time.time())).lastrowid
+
+    async def append(self, user_id: str, message: Message) -> None:
+        """Store the message and set its id."""
+        try:
+            message.id = await asyncio.to_thread(self._append, user_id, message)
+        except sqlite3.Error as e:
+            logger.error(f"Failed to store chat message: {e}")
+
+    def _page(self, user_id: str, before_id: Optional[int], limit: int) -> list[Message]:
+        with self._connect() as connection:
+            rows = connection.execute(
+                'SELECT id, role, content, stamp, avatar, sent FROM messages WHERE user_id = ? AND id < ? '
+                'ORDER BY id DESC LIMIT ?', (user_id, before_id if before_id is not None else 2 ** 63 - 1, limit)).fetchall()
+        return [Message(id=id, role=role, content=content, stamp=stamp, avatar=avatar, sent=bool(sent))
+                for id, role, content, stamp, avatar, sent in reversed(rows)]
+
+    async def page(self, user_id: str, before_id: Optional[int] = None, limit: int = 20) -> list[Message]:
+        """Up to `limit` of the user's messages sent before `before_id` (default the latest), oldest first."""
+        try:
+            return await asyncio.to_thread(self._page, user_id, before_id, limit)
+        except sqlite3.Error as e:
+            logger.error(f"Failed to read chat history: {e}")
+            return []
+
+
+def get_chat_history() -> Optional[ChatHistory]:
+    """Chat history is kept in CHAT_HISTORY_PATH, and only for the lifetime of the page if it is set empty."""
+    path = os.environ.get('CHAT_HISTORY_PATH', 'weatherbot_chat.sqlite3')
+    if not path:
+        return None
+    logger.info(f"Storing chat history in {path}")
+    return ChatHistory(path=path)
+
+
+chat_history = get_chat_history()
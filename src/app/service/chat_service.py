@@ -1,20 +1,25 @@
+import math
 import os
+from array import array
 from datetime import datetime
-from typing import TypeVar
+from typing import Optional, TypeVar
 from zoneinfo import ZoneInfo
 
 from pydantic import BaseModel
 from loguru import logger
-from nicegui import app
 import instructor
 from dotenv import load_dotenv
 import openai
 
 from models import QueryClassification
-from utils.constants import ClassificationPrompt, QueryResponsePrompt
+from utils.constants import ClassificationPrompt, QueryPeriodsEnum, QueryResponsePrompt, QueryTypesEnum, daily_range_series
 from presentation.ui_manager import UIManager
 from service.weather_service import WeatherService
 from service.user_service import UserService
+from utils.columnar import FormatEntry, format_data_store
+from utils.executor import cpu_executor
+from utils.log import truncate
+from utils.metrics import llm_tokens, new_trace_id, span
 
 load_dotenv()
 
@@ -28,10 +33,92 @@ class ChatService:
     This class is responsible for classifying a query to allow the weather service to fetch the appropriate data.
     It then generates a response to the query with the context of the available data.
     """
-    def __init__(self, weather_service: WeatherService, ui_manager: UIManager, user_service: UserService) -> None:
+    def __init__(self, weather_service: WeatherService, ui_manager: UIManager, user_service: UserService, user_storage: dict) -> None:
         self.weather_service = weather_service
         self.ui_manager = ui_manager
         self.user_service = user_service
+        self.user_storage = user_storage
+
+    async def answer_query(self, query: str) -> None:
+        """
+        Run the full pipeline for a user message: classify it, fetch any weather data it needs,
+        reply, and update the map and chart. Every stage is timed under a trace ID for this message.
+        """
+        with logger.contextualize(trace_id=new_trace_id()), span('total'):
+            with span('classify'):
+                classification: QueryClassification = await self.classify_query(query=query)
+
+            if QueryTypesEnum.NON_WEATHER in classification.query_type:
+                logger.info("Query type is not weather related")
+                with span('answer'):
+                    await self.process_message()
+                return
+
+            logger.info("Query type is weather related")
+            with span('get_weather_data'):
+                metservice_response = await self.weather_service.get_weather_data(classification)
+            with span('answer'):
+                await self.process_message()
+
+            with span('render_map'):
+                points = {}
+                for data in metservice_response:
+                    points.setdefault(data.location, (data.latitude, data.longitude))
+                self.ui_manager.update_map([points[location] for location in classification.locations if location in points])
+            logger.info("Map shown for locations: {}", classification.locations)
+
+            chart_data = await self.chart_data(classifications=[classification])
+            with span('render_chart'):
+                self.ui_manager.update_chart(chart_data, classification)
+
+    async def zoom_chart(self, window: Optional[tuple[float, float]]) -> None:
+        """
+        Re-send the chart for a zoomed-in window of (min, max) millisecond timestamps, or the whole chart if None.
+        A multi-day chart zoomed in to a few days switches to hourly data, fetching any hours not held yet.
+        """
+        classification = self.ui_manager.chart_classification
+        if classification is None:
+            return
+        classifications = [classification]
+        if window is not None:
+            classifications = await self.weather_service.zoom_classifications(classification=classification, window=window)
+            if classifications != [classification]:
+                with logger.contextualize(trace_id=new_trace_id()), span('get_weather_data'):
+                    for day_classification in classifications:
+                        await self.weather_service.get_weather_data(day_classification)
+        chart_data = await self.chart_data(classifications=classifications, window=window)
+        self.ui_manager.update_chart_series(chart_data, classification)
+        self.ui_manager.chart.update()
+
+    async def chart_data(self, classifications: list[QueryClassification],
+                         window: Optional[tuple[float, float]] = None) -> dict[str, dict[str, list]]:
+        """
+        Downsampled chart series for each location, from the data for each classification in turn
+        (e.g. one per day), keeping only points inside the window if one is given,
+        plus each day's temperature range and rain total from the stored rollups.
+        """
+        chart_data = {}
+        for location in classifications[0].locations:
+            weather_data: dict[str, list] = {}
+            for classification in classifications:
+                location_classification = classification.model_copy(update={'locations': [location]})
+                with span('fetch_data'):
+                    for key, values in (await self.weather_service.fetch_data(location_classification)).items():
+                        weather_data.setdefault(key, []).extend(values)
+
+            if QueryTypesEnum.GENERAL_WEATHER in classifications[0].query_type:
+                with span('weather_icons'):
+                    weather_data = await self.weather_service.fetch_weather_icons(weather_data)
+
+            with span('downsample'):
+                chart_data[location] = await self.weather_service.downsample_data(weather_data, window=window)
+
+            with span('rollups'):
+                rollups = {}
+                for classification in classifications:
+                    rollups.update(await self.weather_service.fetch_rollups(classification.model_copy(update={'locations': [location]})))
+                chart_data[location][daily_range_series] = await self.weather_service.daily_range(rollups)
+        return chart_data
 
     async def classify_query(self, query: str) -> QueryClassification:
         """
@@ -50,21 +137,13 @@ class ChatService:
                 content=query,
                 )
         classification: QueryClassification = await self._model_query_classification(response_model=QueryClassification)
-        if classification.location == None and classification.query_type != "non-weather":
-            while 'location' not in app.storage.user or app.storage.user['location'] in [None, "null"]:
-                try:
-                    latitude = await self.user_service.user_latitude()
-                    longitude = await self.user_service.user_longitude()
-                    logger.info(f"User location: {latitude}, {longitude}")
-                    app.storage.user['latitude'] = latitude
-                    app.storage.user['longitude'] = longitude
-
-                    location = await self.weather_service._lat_lon_to_location(latitude=latitude, longitude=longitude)
-                    app.storage.user['location'] = location
-                except Exception as e:
-                    logger.error(
-                        f"No location provided in query and user did not respond to request for location: {e}")
-            classification.location = app.storage.user['location']
+        if not classification.locations and QueryTypesEnum.NON_WEATHER not in classification.query_type:
+            # The user's location is found in the background when the page loads, so never wait for it here
+            location = self.user_service.cached_location()
+            if location is None:
+                location = self.user_service.fallback_location
+                logger.info(f"No location in query and user location unknown, using {location}")
+            classification.locations = [location]
         return classification
 
 
@@ -73,10 +152,7 @@ class ChatService:
         This function takes the user's message, the chat log, the data store, the response model and the app storage as input and returns the response from the GPT model.
         """
         formatted_data = await self._format_data_store()
-        if 'location' in app.storage.user:
-            location = app.storage.user['location']
-        else:
-            location = "unknown location"
+        location = self.user_service.cached_location() or self.user_service.fallback_location
         
         system_prompt = QueryResponsePrompt.format(
             current_datetime=datetime.now(tz=ZoneInfo('Pacific/Auckland')).strftime("%Y-%m-%dT%H:%M:%SZ"),
@@ -90,6 +166,7 @@ class ChatService:
             model="gpt-3.5-turbo",
             messages=messages,
         )
+        await self._count_tokens(call='answer', usage=model_response.usage)
         response = model_response.choices[0].message.content
 
         await self.ui_manager.add_message(
@@ -114,19 +191,48 @@ class ChatService:
         )
 
         assert isinstance(response, QueryClassification)
-        logger.info(f"GPT response: {response}")
+        raw_response = getattr(response, '_raw_response', None)
+        await self._count_tokens(call='classify', usage=getattr(raw_response, 'usage', None))
+        logger.info("GPT response: {}", response)
         return response
     
+    async def _count_tokens(self, call: str, usage) -> None:
+        if usage is None:
+            return
+        llm_tokens.inc(usage.prompt_tokens, call=call, kind='prompt')
+        llm_tokens.inc(usage.completion_tokens, call=call, kind='completion')
+
     async def _format_data_store(self) -> str:
-        data_store = self.weather_service.data_store
-        formatted_data = [
-            f"Date: {data.date}, Query type(s): {data.weather_data_types}, Location: {data.location}, Period(s): {data.period_types}  \n {
-                '\n\n'.join(
-                    f'Time: {time.hour} \n {'\n'.join(f'{variable.name}: {variable.value}{variable.units}' for variable in time.variables)}' for time in data.hour_summaries)}"
-            for data in data_store
-        ]
-        formatted_data = "\n\n".join(formatted_data)
-        return formatted_data
+        """
+        Format the data store for the response prompt. Every entry gets its per-period summary;
+        multi-day entries are described by the summary alone rather than every forecast time.
+        Values are gathered into columns here and the text is built by the CPU executor.
+        """
+        entries = []
+        size = 0
+        for data in self.weather_service.data_store:
+            header = f"Date: {data.date}, Query type(s): {data.weather_data_types}, Location: {data.location}, Period(s): {data.period_types}"
+            if all(period == QueryPeriodsEnum.MULTIPLE_DAYS for period in data.period_types) and data.rollups:
+                # Merged hours may not hold every variable, so units are taken from all of them
+                units = {variable.name: variable.units for hour_summary in data.hour_summaries for variable in hour_summary.variables}
+                entries.append(FormatEntry(header=header, rollups=data.rollups, units=units, hours=None, columns=[]))
+                size += len(units) * len(data.rollups)
+                continue
+            columns: dict[str, tuple[str, array]] = {}
+            for i, hour_summary in enumerate(data.hour_summaries):
+                for variable in hour_summary.variables:
+                    column = columns.get(variable.name)
+                    if column is None:
+                        column = columns[variable.name] = (variable.units, array('d', [math.nan] * i))
+                    column[1].append(variable.value)
+                for _, values in columns.values():
+                    if len(values) <= i:
+                        values.append(math.nan)
+            size += len(data.hour_summaries) * len(columns)
+            entries.append(FormatEntry(header=header, rollups=data.rollups, units={name: units for name, (units, _) in columns.items()},
+                                       hours=[hour_summary.hour for hour_summary in data.hour_summaries],
+                                       columns=[(name, units, values) for name, (units, values) in columns.items()]))
+        return await cpu_executor.run('format_data_store', format_data_store, entries, size=size)
 
     async def _format_chat_log(self, system_prompt: str) -> list[dict[str, str]]:
         messages=[
@@ -144,6 +250,6 @@ class ChatService:
                 messages.append({"role": message.role, "content": message.content})
         while messages[-1].get("role") == "assistant":
             messages.pop()
-        logger.info(f"Messages: {messages}")
+        logger.opt(lazy=True).debug("Messages: {}", lambda: truncate(messages))
         return messages
 
@@ -0,0 +1,108 @@
+import asyncio
+import os
+import sqlite3
+import time
+from typing import Optional
+
+from loguru import logger
+
+
+class ForecastStore:
+    """
+    Persistent store of raw Metservice values keyed by coordinates, valid time and variable,
+    so forecasts fetched before a restart or deploy are not fetched again.
+    Writes are buffered and flushed in batches on a worker thread, and expired rows are compacted
+    away periodically.
+    """
+    def __init__(self, path: str, max_age: float, flush_interval: float = 1.0, compaction_interval: float = 3600) -> None:
+        self.path = path
+        self.max_age = max_age
+        self.flush_interval = flush_interval
+        self.compaction_interval = compaction_interval
+        self._pending: list[tuple] = []
+        self._flush_task: Optional[asyncio.Task] = None
+        self._last_compaction = 0.0
+        with self._connect() as connection:
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS forecasts ('
+                'latitude REAL NOT NULL, longitude REAL NOT NULL, valid_time TEXT NOT NULL, variable TEXT NOT NULL, '
+                'value REAL, units TEXT, fetched_at REAL NOT NULL, '
+                'PRIMARY KEY (latitude, longitude, valid_time, variable))')
+            connection.execute('CREATE INDEX IF NOT EXISTS forecasts_fetched_at ON forecasts (fetched_at)')
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=10)
+
+    @staticmethod
+    def _coordinates(latitude: float, longitude: float) -> tuple[float, float]:
+        return round(latitude, 4), round(longitude, 4)
+
+    def _read(self, latitude: float, longitude: float, times: list[str], variables: list[str]) -> Optional[tuple[dict, float]]:
+        latitude, longitude = self._coordinates(latitude, longitude)
+        time_placeholders = ','.join('?' * len(times))
+        variable_placeholders = ','.join('?' * len(variables))
+        with self._connect() as connection:
+            rows = connection.execute(
+                f'SELECT valid_time, variable, value, units, fetched_at FROM forecasts '
+                f'WHERE latitude = ? AND longitude = ? AND fetched_at >= ? '
+                f'AND valid_time IN ({time_placeholders}) AND variable IN ({variable_placeholders})',
+                (latitude, longitude, time.time() - self.max_age, *times, *variables)).fetchall()
+        if len(rows) < len(set(times)) * len(set(variables)):
+            return None
+
+        time_index = {valid_time: i for i, valid_time in enumerate(times)}
+        variables_data = {variable: {'units': None, 'data': [None] * len(times)} for variable in variables}
+        for valid_time, variable, value, units, _ in rows:
+            variables_data[variable]['units'] = units
+            variables_data[variable]['data'][time_index[valid_time]] = value
+        return variables_data, min(row[4] for row in rows)
+
+    async def read(self, latitude: float, longitude: float, times: list[str], variables: list[str]) -> Optional[tuple[dict, float]]:
+        """
+        Return ({variable: {'units', 'data'}}, oldest fetch time) for every requested time,
+        or None if anything is missing or too old.
+        """
+        return await asyncio.to_thread(self._read, latitude, longitude, times, variables)
+
+    def write(self, latitude: float, longitude: float, times: list[str], variables_data: dict) -> None:
+        """Queue a fetched response for the next batched write."""
+        latitude, longitude = self._coordinates(latitude, longitude)
+        fetched_at = time.time()
+        for variable, data in variables_data.items():
+            for valid_time, value in zip(times, data['data']):
+                self._pending.append((latitude, longitude, valid_time, variable, value, data.get('units'), fetched_at))
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.flush_interval)
+        rows, self._pending = self._pending, []
+        compact = time.time() - self._last_compaction > self.compaction_interval
+        if compact:
+            self._last_compaction = time.time()
+        try:
+            await asyncio.to_thread(self._write, rows, compact)
+        except sqlite3.Error as e:
+            logger.error(f"Failed to write {len(rows)} forecast rows: {e}")
+
+    def _write(self, rows: list[tuple], compact: bool) -> None:
+        with self._connect() as connection:
+            connection.executemany('INSERT OR REPLACE INTO forecasts VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+            if compact:
+                deleted = connection.execute('DELETE FROM forecasts WHERE fetched_at < ?',
+                                             (time.time() - self.max_age,)).rowcount
+                logger.info(f"Compacted {deleted} expired forecast rows")
+        logger.debug("Wrote {} forecast rows", len(rows))
+
+
+def get_forecast_store() -> Optional[ForecastStore]:
+    """The persistent forecast store is enabled by setting FORECAST_STORE_PATH."""
+    path = os.environ.get('FORECAST_STORE_PATH')
+    if not path:
+        return None
+    logger.info(f"Using persistent forecast store at {path}")
+    return ForecastStore(path=path, max_age=float(os.environ.get('FORECAST_STORE_MAX_AGE', 3 * 3600)))
+
+
+forecast_store = get_forecast_store()
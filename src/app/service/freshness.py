@@ -0,0 +1,70 @@
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from enum import Enum
+from typing import Optional
+
+from loguru import logger
+
+
+class Freshness(str, Enum):
+    FRESH = 'fresh'
+    STALE = 'stale'
+    EXPIRED = 'expired'
+
+
+class FreshnessPolicy:
+    """
+    Decides whether stored forecast data can be served as is, served while it is refreshed in the
+    background (stale), or must be fetched again before answering (expired).
+    Data is stale once it is older than `max_age`, or once a forecast model run has been published
+    since it was fetched, and expired once it is older than `max_age + stale_window`.
+    """
+    def __init__(self, max_age: float, stale_window: float, model_run_hours: tuple[int, ...] = (),
+                 model_run_delay: float = 0) -> None:
+        self.max_age = max_age
+        self.stale_window = stale_window
+        self.model_run_hours = model_run_hours
+        self.model_run_delay = model_run_delay
+
+    def latest_model_run(self, now: float) -> Optional[float]:
+        """Time the most recently published model run became available, if model run hours are configured."""
+        if not self.model_run_hours:
+            return None
+        published = datetime.fromtimestamp(now - self.model_run_delay, tz=timezone.utc)
+        for days_back in range(2):
+            day = published.date() - timedelta(days=days_back)
+            runs = [datetime(day.year, day.month, day.day, hour, tzinfo=timezone.utc) for hour in self.model_run_hours]
+            runs = [run for run in runs if run <= published]
+            if runs:
+                return max(runs).timestamp() + self.model_run_delay
+        return None
+
+    def state(self, fetched_at: Optional[float], now: Optional[float] = None) -> Freshness:
+        if fetched_at is None:
+            return Freshness.FRESH
+        now = time.time() if now is None else now
+        age = now - fetched_at
+        if age >= self.max_age + self.stale_window:
+            return Freshness.EXPIRED
+        if age >= self.max_age:
+            return Freshness.STALE
+        latest_run = self.latest_model_run(now)
+        if latest_run is not None and fetched_at < latest_run:
+            return Freshness.STALE
+        return Freshness.FRESH
+
+
+def get_freshness_policy() -> FreshnessPolicy:
+    model_run_hours = tuple(int(hour) for hour in os.environ.get('FORECAST_MODEL_RUN_HOURS', '').split(',') if hour.strip())
+    policy = FreshnessPolicy(
+        max_age=float(os.environ.get('FORECAST_MAX_AGE', 3600)),
+        stale_window=float(os.environ.get('FORECAST_STALE_WINDOW', 6 * 3600)),
+        model_run_hours=model_run_hours,
+        model_run_delay=float(os.environ.get('FORECAST_MODEL_RUN_DELAY', 4 * 3600)),
+    )
+    logger.info(f"Forecast freshness: max age {policy.max_age}s, stale window {policy.stale_window}s, model runs at {model_run_hours or 'unknown'} UTC")
+    return policy
+
+
+freshness_policy = get_freshness_policy()
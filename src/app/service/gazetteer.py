@@ -0,0 +1,181 @@
+import csv
+import os
+import re
+import unicodedata
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+from loguru import logger
+
+from utils.spatial import KDTree, haversine_km
+
+# Feature types preferred when several places share a name, and the only ones used for reverse lookups
+# when the gazetteer has a feature type column (LINZ NZ Gazetteer `feat_type` values, lower-cased)
+feature_type_rank = {'city': 0, 'town': 1, 'suburb': 2, 'locality': 3, 'village': 3}
+UNRANKED = len(set(feature_type_rank.values()))
+
+# Cities, towns and main suburbs, bundled so geocoding common places needs no network call
+DEFAULT_GAZETTEER_PATH = Path(__file__).resolve().parent.parent / 'data' / 'nz_places.csv'
+
+# Places sharing the best match are treated as one when they lie within this distance of each other
+SAME_PLACE_KM = 20.0
+
+_END = ''
+
+
+class Place(NamedTuple):
+    name: str
+    latitude: float
+    longitude: float
+    rank: int
+
+
+def normalise(name: str) -> str:
+    """Lower-case, strip macrons and other diacritics and punctuation, e.g. 'Ōtāhuhu' -> 'otahuhu'."""
+    decomposed = unicodedata.normalize('NFKD', name)
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(re.sub(r"[^a-z0-9]+", ' ', stripped.lower()).split())
+
+
+def _deletion_variants(word: str) -> set[str]:
+    """The word and every string made by deleting one character from it."""
+    return {word} | {word[:i] + word[i + 1:] for i in range(len(word))}
+
+
+def _within_one_edit(a: str, b: str) -> bool:
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) == len(b):
+        differences = [i for i in range(len(a)) if a[i] != b[i]]
+        return len(differences) == 1 or (
+            len(differences) == 2 and differences[1] == differences[0] + 1
+            and a[differences[0]] == b[differences[1]] and a[differences[1]] == b[differences[0]])
+    shorter, longer = (a, b) if len(a) < len(b) else (b, a)
+    i = 0
+    while i < len(shorter) and shorter[i] == longer[i]:
+        i += 1
+    return shorter[i:] == longer[i + 1:]
+
+
+class Gazetteer:
+    """
+    In-memory index of New Zealand place names for geocoding without a network call.
+    Forward lookups walk a character trie of normalised names, with a single-deletion index to allow one typo;
+    reverse lookups find the nearest settlement in a KD-tree. Both return None unless the match
+    is unambiguous, so callers can fall back to Nominatim.
+    """
+    def __init__(self, places: list[Place], reverse_radius_km: float = 10.0) -> None:
+        self.places = places
+        self.reverse_radius_km = reverse_radius_km
+        self._names = [normalise(place.name) for place in places]
+        self._trie: dict = {}
+        self._deletions: dict[str, list[int]] = {}
+        for i, name in enumerate(self._names):
+            node = self._trie
+            for char in name:
+                node = node.setdefault(char, {})
+            node.setdefault(_END, []).append(i)
+            for variant in _deletion_variants(name):
+                self._deletions.setdefault(variant, []).append(i)
+
+        has_ranks = any(place.rank < UNRANKED for place in places)
+        self._settlements = [i for i, place in enumerate(places) if not has_ranks or place.rank < UNRANKED]
+        self._tree = KDTree([(places[i].latitude, places[i].longitude) for i in self._settlements])
+
+    @classmethod
+    def from_csv(cls, path: str, reverse_radius_km: float = 10.0) -> 'Gazetteer':
+        """
+        Load a CSV with name and latitude/longitude columns, and optionally a feature type.
+        Both plain `name,latitude,longitude[,feat_type]` files and the LINZ NZ Gazetteer export
+        (`name,crd_latitude,crd_longitude,feat_type,...`) are accepted.
+        """
+        places = []
+        with open(path, newline='', encoding='utf-8-sig') as file:
+            for row in csv.DictReader(file):
+                try:
+                    latitude = float(row.get('latitude') or row['crd_latitude'])
+                    longitude = float(row.get('longitude') or row['crd_longitude'])
+                except (KeyError, TypeError, ValueError):
+                    continue
+                rank = feature_type_rank.get((row.get('feat_type') or '').strip().lower(), UNRANKED)
+                places.append(Place(name=row['name'].strip(), latitude=latitude, longitude=longitude, rank=rank))
+        return cls(places, reverse_radius_km=reverse_radius_km)
+
+    def _exact(self, word: str) -> list[int]:
+        node = self._trie
+        for char in word:
+            node = node.get(char)
+            if node is None:
+                return []
+        return node.get(_END, [])
+
+    def _fuzzy(self, word: str) -> list[int]:
+        """
+        Places whose names are one edit (insertion, deletion, substitution or swap of neighbours) from word.
+        Candidates share a single-deletion variant with word, so no table walk is needed to find them.
+        """
+        candidates = set()
+        for variant in _deletion_variants(word):
+            candidates.update(self._deletions.get(variant, ()))
+        return [i for i in candidates if _within_one_edit(word, self._names[i])]
+
+    def _prefix(self, word: str, limit: int = 50) -> list[int]:
+        node = self._trie
+        for char in word:
+            node = node.get(char)
+            if node is None:
+                return []
+        matches, stack = [], [node]
+        while stack and len(matches) <= limit:
+            node = stack.pop()
+            matches.extend(node.get(_END, []))
+            stack.extend(child for char, child in node.items() if char != _END)
+        return matches
+
+    def _confident(self, candidates: list[int]) -> Optional[Place]:
+        """The best-ranked candidate, unless other equally ranked candidates are somewhere else entirely."""
+        if not candidates:
+            return None
+        best_rank = min(self.places[i].rank for i in candidates)
+        top = [self.places[i] for i in candidates if self.places[i].rank == best_rank]
+        first = top[0]
+        if any(haversine_km(first.latitude, first.longitude, place.latitude, place.longitude) > SAME_PLACE_KM for place in top[1:]):
+            return None
+        return first
+
+    def geocode(self, query: str) -> Optional[Place]:
+        # 'Ponsonby, Auckland' -> 'ponsonby'
+        word = normalise(query.split(',')[0])
+        if not word:
+            return None
+        exact = self._exact(word)
+        if exact:
+            return self._confident(exact)
+        # Short names are too easily one typo away from another real place
+        if len(word) <= 4:
+            return None
+        candidates = self._fuzzy(word)
+        if candidates:
+            return self._confident(candidates)
+        return self._confident(self._prefix(word))
+
+    def reverse(self, latitude: float, longitude: float) -> Optional[Place]:
+        nearest = self._tree.nearest(latitude, longitude)
+        if nearest is None or nearest[0] > self.reverse_radius_km:
+            return None
+        return self.places[self._settlements[nearest[1]]]
+
+
+def get_gazetteer() -> Optional[Gazetteer]:
+    """The offline gazetteer reads GAZETTEER_PATH (default the bundled places), and is disabled if it is set empty."""
+    path = os.environ.get('GAZETTEER_PATH', str(DEFAULT_GAZETTEER_PATH))
+    if not path:
+        return None
+    gazetteer = Gazetteer.from_csv(path, reverse_radius_km=float(os.environ.get('GAZETTEER_REVERSE_RADIUS_KM', 10)))
+    logger.info(f"Loaded {len(gazetteer.places)} places from gazetteer at {path}")
+    return gazetteer
+
+
+gazetteer = get_gazetteer()
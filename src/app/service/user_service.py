@@ -1,27 +1,96 @@
-from nicegui import ui
+import asyncio
+import os
+import time
+from collections.abc import Awaitable, Callable
+from typing import Optional
+
+from nicegui import context, ui
 from loguru import logger
 
+class LocationPermissionDenied(Exception):
+    """The user told the browser not to share their location, so asking again is pointless."""
+
+
 class UserService:
-    def __init__(self) -> None:
-        self._user_longitude = None
-        self._user_latitude = None
-
-    async def user_longitude(self):
-        if self._user_longitude is None:
-            await self._get_user_location()
-        return self._user_longitude
-    
-    async def user_latitude(self):
-        if self._user_latitude is None:
-            await self._get_user_location()
-        return self._user_latitude
-
-    async def _get_user_location(self):
+    """
+    Looks up the user's location from the browser in the background when the chat page loads,
+    so a query without a location never waits on the browser or the geocoder. The location is kept
+    in the user's storage until it expires; if it cannot be found the fallback location is used.
+    """
+    def __init__(self, user_storage: Optional[dict] = None) -> None:
+        self.user_storage = {} if user_storage is None else user_storage
+        self.location_ttl = float(os.environ.get('USER_LOCATION_TTL', 6 * 3600))
+        self.location_attempts = int(os.environ.get('USER_LOCATION_ATTEMPTS', 3))
+        self.location_retry_delay = float(os.environ.get('USER_LOCATION_RETRY_DELAY', 10))
+        self.fallback_location = os.environ.get('USER_LOCATION_FALLBACK', 'Auckland')
+        self._location_task: Optional[asyncio.Task] = None
+
+    def cached_location(self) -> Optional[str]:
+        """The user's location if it was found within the last `location_ttl` seconds, without waiting for anything."""
+        location = self.user_storage.get('location')
+        if location in (None, "null"):
+            return None
+        if time.time() - self.user_storage.get('location_acquired_at', 0) > self.location_ttl:
+            return None
+        return location
+
+    def start_location_acquisition(self, reverse_geocode: Callable[[float, float], Awaitable[str]]) -> None:
+        """Start finding the user's location in the background, unless it is cached or already being found."""
+        if self.cached_location() is not None:
+            return
+        if self._location_task is not None and not self._location_task.done():
+            return
+        self._location_task = asyncio.create_task(self._acquire_location(reverse_geocode=reverse_geocode, slot=context.slot))
+
+    async def _acquire_location(self, reverse_geocode: Callable[[float, float], Awaitable[str]], slot) -> None:
+        with slot:
+            try:
+                await context.client.connected(timeout=30)
+            except TimeoutError:
+                logger.info("Client did not connect, not requesting location.")
+                return
+
+            for attempt in range(1, self.location_attempts + 1):
+                try:
+                    coordinates = await self._get_user_location()
+                except LocationPermissionDenied:
+                    logger.info(f"User denied the location request, using {self.fallback_location}.")
+                    return
+                if coordinates is not None:
+                    break
+                logger.info(f"Location attempt {attempt} of {self.location_attempts} failed.")
+                if attempt < self.location_attempts:
+                    await asyncio.sleep(self.location_retry_delay)
+            else:
+                logger.info(f"Could not get the user's location, using {self.fallback_location}.")
+                return
+
+            try:
+                latitude, longitude = coordinates
+                location = await reverse_geocode(latitude, longitude)
+            except Exception as e:
+                logger.error(f"Error reverse geocoding user location: {e}")
+                return
+            self.user_storage.update({
+                'latitude': latitude,
+                'longitude': longitude,
+                'location': location,
+                'location_acquired_at': time.time(),
+            })
+            logger.info(f"User location: {location}")
+
+    async def _get_user_location(self) -> Optional[tuple[float, float]]:
+        """
+        Ask the browser for the user's coordinates. The browser reports why it couldn't find them
+        (no geolocation support, permission denied, position unavailable or its own timeout) rather than
+        rejecting, because a rejected script never answers and would only be seen as our timeout.
+        Raises LocationPermissionDenied if the user refused to share their location.
+        """
         try:
             response = await ui.run_javascript('''
-                return await new Promise((resolve, reject) => {
+                return await new Promise((resolve) => {
                     if (!navigator.geolocation) {
-                        reject(new Error('Geolocation is not supported by your browser'));
+                        resolve({error: 'Geolocation is not supported by this browser'});
                     } else {
                         navigator.geolocation.getCurrentPosition(
                             (position) => {
@@ -30,18 +99,36 @@ class UserService:
                                     longitude: position.coords.longitude,
                                 });
                             },
-                            () => {
-                                reject(new Error('Unable to retrieve your location'));
-                            }
+                            (error) => {
+                                resolve({
+                                    error: error.message || `Geolocation error ${error.code}`,
+                                    denied: error.code === error.PERMISSION_DENIED,
+                                });
+                            },
+                            {timeout: 8000}
                         );
                     }
                 });
             ''', timeout=10.0)
-            logger.info(f"User location: {response}")
-            self._user_latitude = response['latitude']
-            self._user_longitude = response['longitude']
+        except TimeoutError:
+            logger.info("Browser did not answer the location request.")
             return None
-        #TODO: Add a more specific error message
         except Exception as e:
-            logger.error(f"Error getting user location: {e}")
+            # e.g. the client disconnected while the request was in flight
+            logger.info(f"Location request failed: {type(e).__name__}: {e}")
+            return None
+        if not isinstance(response, dict):
+            logger.info(f"Unexpected response to the location request: {response!r}")
+            return None
+        if response.get('denied'):
+            raise LocationPermissionDenied(response.get('error'))
+        if response.get('error'):
+            logger.info(f"Browser could not get the user's location: {response['error']}")
+            return None
+        try:
+            coordinates = float(response['latitude']), float(response['longitude'])
+        except (KeyError, TypeError, ValueError):
+            logger.info(f"Unexpected response to the location request: {response!r}")
             return None
+        logger.info(f"User location: {response}")
+        return coordinates
@@ -1,5 +1,12 @@
+import asyncio
+import hashlib
+import json
+import math
 import os
+import time
+from array import array
 from datetime import datetime, timedelta, date
+from typing import Optional
 from zoneinfo import ZoneInfo
 
 from loguru import logger
@@ -9,253 +16,531 @@ from geopy.location import Location
 from geopy.adapters import AioHTTPAdapter
 from geopy.extra.rate_limiter import AsyncRateLimiter
 
-from models import MetservicePointTimeRequest, MetserviceTimePointSummary, MetserviceVariable, MetservicePointTimeRequest, MetservicePeriodSummary, QueryClassification
-from utils.constants import QueryTypesEnum, QueryPeriodsEnum, WeatherIconMap, WeatherVarMap, query_variable_map, period_hours_map, weather_unit_map
+from service.cache import cache
+from service.forecast_store import forecast_store
+from service.freshness import Freshness, freshness_policy
+from service.gazetteer import gazetteer
+from models import MetservicePointTimeRequest, MetservicePeriodSummary, QueryClassification
+from utils.constants import QueryTypesEnum, QueryPeriodsEnum, WeatherIconMap, WeatherVarMap, chart_downsample_map, marine_variables, query_variable_map, period_hours_map, period_resolution_hours, rollup_periods
+from utils.columnar import day_rollups, parse_forecast, weather_categories
+from utils.downsampling import aggregate_buckets, lttb
+from utils.executor import cpu_executor
+from utils.icons import icon_url
+from utils.log import sampled, summarise_metservice_response
+from utils.metrics import cache_requests, span, upstream_bytes
+from utils.spatial import SpatialIndex
+
+NZ_TIMEZONE = ZoneInfo('Pacific/Auckland')
+
+
+async def _call_nominatim(method, *args, **kwargs):
+    return await method(*args, **kwargs)
+
+
+# Nominatim's usage policy allows one request a second from the whole app, so every geocode and reverse geocode,
+# from every location in a query and every session, takes its turn through this one limiter
+nominatim_rate_limiter = AsyncRateLimiter(_call_nominatim, min_delay_seconds=1, max_retries=3)
 
 
 class WeatherService:
     def __init__(self) -> None:
         self.data_store: list[MetservicePeriodSummary] = []
-        self.geolocator = Nominatim(user_agent="weatherbot", adapter_factory=AioHTTPAdapter)
+        self.geolocator = Nominatim(user_agent="weatherbot", adapter_factory=AioHTTPAdapter,
+                                    domain=os.environ.get('NOMINATIM_DOMAIN', 'nominatim.openstreetmap.org'),
+                                    scheme=os.environ.get('NOMINATIM_SCHEME', 'https'))
+        self.metservice_api_url = os.environ.get('METSERVICE_API_URL', 'https://forecast-v2.metoceanapi.com')
+        self.chart_max_points = int(os.environ.get('CHART_MAX_POINTS', 120))
+        # A zoomed-in chart covering at most this many days is drawn from hourly data
+        self.zoom_hourly_max_days = int(os.environ.get('ZOOM_HOURLY_MAX_DAYS', 3))
+        self.forecast_cache_ttl = int(os.environ.get('FORECAST_CACHE_TTL', 1800))
+        # Stored data is reused for other locations within these distances of where it was fetched
+        self.nearby_tolerance_km = float(os.environ.get('NEARBY_TOLERANCE_KM', 5))
+        self.nearby_marine_tolerance_km = float(os.environ.get('NEARBY_MARINE_TOLERANCE_KM', 1))
+        self.location_index = SpatialIndex(cell_km=max(self.nearby_tolerance_km, self.nearby_marine_tolerance_km, 1))
+        # (location, date) keys with a background refresh in flight, and the tasks doing it
+        self._refreshing: set[tuple[str, date]] = set()
+        self._refresh_tasks: set[asyncio.Task] = set()
 
     async def get_weather_data(self, classification: QueryClassification) -> list[MetservicePeriodSummary]:
-        logger.info(f"request.location: {classification.location}")
-        new_data_dates, new_data_query_types = await self._check_data_store(classification=classification)
-        if new_data_dates:
-            logger.info("Conditions not met, fetching new weather data.")
-            metservice_request = await self._create_API_request(request=classification, dates=new_data_dates, query_types=new_data_query_types)
-            metservice_response = await self._metservice_api_call(request=metservice_request)
-            await self._store_weather_data(metservice_response=metservice_response, classification=classification)
-        
-        return metservice_response
-
+        """
+        Make sure the data store has data for every location in the query and return it.
+        Locations missing data are geocoded and fetched concurrently, in a single multi-point
+        request when they need the same variables and times.
+        """
+        logger.info("request.locations: {}", classification.locations)
+        await self._evict_expired_data()
+        location_classifications = await self.split_locations(classification=classification)
+        checks = await asyncio.gather(*(
+            self._check_data_store(classification=location_classification) for location_classification in location_classifications))
+        missing = [(location_classification, new_data_dates, new_data_query_types, new_data_hours)
+                   for location_classification, (new_data_dates, new_data_query_types, new_data_hours) in zip(location_classifications, checks)
+                   if new_data_dates]
+        if missing:
+            logger.info("Conditions not met, fetching new weather data for {} location(s).", len(missing))
+            metservice_requests = await asyncio.gather(*(
+                self._create_API_request(request=location_classification, dates=new_data_dates, query_types=new_data_query_types, hours=new_data_hours)
+                for location_classification, new_data_dates, new_data_query_types, new_data_hours in missing))
+            metservice_responses = await self._metservice_api_calls(requests=list(metservice_requests))
+            with span('store'):
+                for (location_classification, _, _, _), metservice_response in zip(missing, metservice_responses):
+                    await self._store_weather_data(metservice_response=metservice_response, classification=location_classification)
+        for location_classification in location_classifications:
+            await self._schedule_refresh(classification=location_classification)
+
+        return [data for data in self.data_store if data.location in classification.locations]
+
+    async def split_locations(self, classification: QueryClassification) -> list[QueryClassification]:
+        """One copy of the classification per location, for the steps that work on a single location."""
+        return [classification.model_copy(update={'locations': [location]}) for location in classification.locations]
+
+    async def zoom_classifications(self, classification: QueryClassification, window: tuple[float, float]) -> list[QueryClassification]:
+        """
+        The queries a chart zoomed to a window of (min, max) millisecond timestamps is drawn from: a whole-day
+        (hourly) query for each visible day when a multi-day chart is zoomed in to at most zoom_hourly_max_days,
+        otherwise the chart's own query.
+        """
+        if QueryPeriodsEnum.MULTIPLE_DAYS not in classification.query_period:
+            return [classification]
+        first_date = max(datetime.fromtimestamp(window[0] / 1000, tz=NZ_TIMEZONE).date(), classification.query_from_date)
+        last_date = min(datetime.fromtimestamp(window[1] / 1000, tz=NZ_TIMEZONE).date(),
+                        classification.query_to_date or classification.query_from_date)
+        if last_date < first_date or (last_date - first_date).days >= self.zoom_hourly_max_days:
+            return [classification]
+        return [classification.model_copy(update={'query_period': [QueryPeriodsEnum.WHOLE_DAY],
+                                                  'query_from_date': first_date + timedelta(days=i),
+                                                  'query_to_date': first_date + timedelta(days=i)})
+                for i in range((last_date - first_date).days + 1)]
 
     async def fetch_data(self, classification: QueryClassification) -> dict[str, list]:
         if QueryPeriodsEnum.MULTIPLE_DAYS in classification.query_period and classification.query_to_date:
             classification_dates = await self._classify_dates(classification=classification)
         else:
             classification_dates = [classification.query_from_date]
-        
-        weather_data = await self._initialise_weather_data(classification=classification)
+        return self._query_weather_data(location=classification.location, dates=classification_dates,
+                                        query_types=classification.query_type, query_periods=classification.query_period)
+
+    def _query_weather_data(self, location: str, dates: list[date], query_types: list[QueryTypesEnum],
+                            query_periods: list[QueryPeriodsEnum]) -> dict[str, list]:
+        """
+        Collect the time column and every requested variable column for the location, dates and periods
+        in one pass over the data store. Synchronous because it is pure CPU work: periods are matched with
+        a single hour mask and variables are looked up by name, so the inner loop does no awaits or enum lookups.
+        The mask holds the query's hours at its resolution, so finer stored data is sampled down to it.
+        """
+        hour_mask = 0
+        for hour in self._query_hours(query_periods):
+            hour_mask |= 1 << hour
+
+        weather_data = {'time_data': []}  # Always include time_data
+        columns: dict[str, list] = {}
+        for query_type in query_types:
+            for variable in query_variable_map[query_type]:
+                if variable not in weather_data:
+                    weather_data[variable] = columns[variable.value] = []
+
+        time_data = weather_data['time_data']
+        dates = set(dates)
         for data in self.data_store:
-            if data.location != classification.location or data.date not in classification_dates:
+            if data.location != location or data.date not in dates:
                 continue
-            logger.info(f"Data found for location: {classification.location}, date: {data.date} and type: {classification.query_type}")
-            
-            for hour_summary in data.hour_summaries:
-                if await self._matches_query_period(hour_summary=hour_summary, query_periods=classification.query_period):
-                    weather_data['time_data'].append(datetime.combine(data.date, hour_summary.hour, tzinfo=ZoneInfo('Pacific/Auckland')))
-                    for variable in hour_summary.variables:
-                        await self._update_weather_data(weather_data=weather_data, variable=variable)
+            hour_summaries = [hour_summary for hour_summary in data.hour_summaries if hour_mask >> hour_summary.hour.hour & 1]
+            day_start = datetime(data.date.year, data.date.month, data.date.day, tzinfo=NZ_TIMEZONE)
+            time_data.extend([day_start.replace(hour=hour_summary.hour.hour, minute=hour_summary.hour.minute)
+                              for hour_summary in hour_summaries])
+            for hour_summary in hour_summaries:
+                for variable in hour_summary.variables:
+                    column = columns.get(variable.name)
+                    if column is not None:
+                        column.append(variable.value)
         return weather_data
-    
-    async def fetch_weather_icons(self, weather_data: dict[str, list]) -> dict[str, list]:
+
+    async def fetch_rollups(self, classification: QueryClassification, period: QueryPeriodsEnum = QueryPeriodsEnum.WHOLE_DAY) -> dict[date, dict[str, dict[str, float]]]:
         """
-        Fetch weather icons based on the updated weather_data structure for a general weather query,
-        processing the data directly from the dictionary.
+        Aggregates for each date in the query for the classification's location and the given period,
+        as {date: {variable: {aggregate: value}}}, without reading the hourly values.
         """
-        temp_icon_data = []
-
-        for idx, time in enumerate(weather_data['time_data']):
-            prec_mm = weather_data.get(WeatherVarMap.rain, [None])[idx]
-            wind_km_h = weather_data.get(WeatherVarMap.wind_speed, [None])[idx]
-            cloud_pct = weather_data.get(WeatherVarMap.cloud_cover, [None])[idx]
-            temp_c = weather_data.get(WeatherVarMap.temp, [None])[idx]
+        if QueryPeriodsEnum.MULTIPLE_DAYS in classification.query_period and classification.query_to_date:
+            classification_dates = await self._classify_dates(classification=classification)
+        else:
+            classification_dates = [classification.query_from_date]
 
-            if None in (prec_mm, wind_km_h, cloud_pct, temp_c):
-                logger.warning(f"Missing weather data at index {idx}; skipping classification.")
+        rollups: dict[date, dict[str, dict[str, float]]] = {}
+        for data in self.data_store:
+            if data.location != classification.location or data.date not in classification_dates:
                 continue
+            for name, aggregates in data.rollups.get(period, {}).items():
+                rollups.setdefault(data.date, {}).setdefault(name, {}).update(aggregates)
+        return dict(sorted(rollups.items()))
 
-            weather_category = await self._categorise_weather(prec_mm=prec_mm, wind_km_h=wind_km_h, cloud_pct=cloud_pct, temp_c=temp_c)
+    async def daily_range(self, rollups: dict[date, dict[str, dict[str, float]]]) -> list[dict]:
+        """
+        Chart points for each day's minimum and maximum temperature and total rain, from whole-day rollups
+        as returned by fetch_rollups. Each point starts its day, and a copy of the last one closes the final day.
+        """
+        points = []
+        for day, variables in sorted(rollups.items()):
+            temperature = variables.get(WeatherVarMap.temp.value)
+            if not temperature:
+                continue
+            point = {'x': datetime(day.year, day.month, day.day, tzinfo=NZ_TIMEZONE).timestamp() * 1000,
+                     'low': temperature['min'], 'high': temperature['max']}
+            if 'total' in variables.get(WeatherVarMap.rain.value, {}):
+                point['total'] = variables[WeatherVarMap.rain.value]['total']
+            points.append(point)
+        if points:
+            last_day = datetime.fromtimestamp(points[-1]['x'] / 1000, tz=NZ_TIMEZONE).date() + timedelta(days=1)
+            points.append({**points[-1], 'x': datetime(last_day.year, last_day.month, last_day.day, tzinfo=NZ_TIMEZONE).timestamp() * 1000})
+        return points
 
-            if time.time() <= datetime.strptime('06:00:00', '%H:%M:%S').time() or time.time() > datetime.strptime('18:00:00', '%H:%M:%S').time():
-                weather_category += '_night'
-            else:
-                weather_category += '_day'
+    async def fetch_weather_icons(self, weather_data: dict[str, list]) -> dict[str, list]:
+        """
+        Replace the temperature series with points carrying a weather icon for each time,
+        categorised from rain, wind, cloud cover and temperature.
+        """
+        time_data = weather_data['time_data']
+        minutes = array('i', [point_time.hour * 60 + point_time.minute for point_time in time_data])
+        columns = [array('d', weather_data[variable]) if variable in weather_data else None
+                   for variable in (WeatherVarMap.rain, WeatherVarMap.wind_speed, WeatherVarMap.cloud_cover, WeatherVarMap.temp)]
+        categories = await cpu_executor.run('weather_icons', weather_categories, minutes, *columns, size=len(time_data) * len(columns))
 
-            weather_icon = WeatherIconMap[weather_category].value
-            temp_dict = {'x': time.timestamp() * 1000, 'y': temp_c, 'iconPath': weather_icon}
-            temp_icon_data.append(temp_dict)
+        temp_icon_data = []
+        temps = weather_data.get(WeatherVarMap.temp, [])
+        for idx, (point_time, category) in enumerate(zip(time_data, categories)):
+            if category is None:
+                if sampled('missing_weather_data'):
+                    logger.warning("Missing weather data at index {}; skipping classification.", idx)
+                continue
+            temp_icon_data.append({'x': point_time.timestamp() * 1000, 'y': temps[idx], 'iconPath': icon_url(WeatherIconMap[category])})
         weather_data[WeatherVarMap.temp] = temp_icon_data
 
         return weather_data
 
-    async def _categorise_weather(self, prec_mm: float, wind_km_h: float, cloud_pct: float, temp_c: float) -> str:
-        try:
-            if temp_c < 0 and 0 <= prec_mm <= 0.2 and wind_km_h < 40:
-                return 'frost'
-            elif 0 <= prec_mm <= 0.2 and wind_km_h < 40:
-                if cloud_pct < 10:
-                    return 'fine'
-                elif cloud_pct <= 70:
-                    return 'partly_cloudy'
-                else:
-                    return 'cloudy'
-            elif 0.2 < prec_mm < 2 and wind_km_h < 40:
-                return 'few_showers'
-            elif 2 <= prec_mm <= 6 and wind_km_h < 40:
-                return 'showers'
-            elif prec_mm > 6 and wind_km_h < 40:
-                return 'rain'
-            elif wind_km_h >= 40:
-                return 'wind'
-            else:
-                return 'Unspecified'
-        except Exception as e:
-            logger.error(f"An error occurred: {e}")
-            return 'Error'
-    
-    async def _matches_query_period(self, hour_summary: MetserviceTimePointSummary, query_periods: list[QueryPeriodsEnum]) -> bool:
+    async def downsample_data(self, weather_data: dict[str, list], window: Optional[tuple[float, float]] = None) -> dict[str, list]:
         """
-        Check if the hour summary matches any of the hours specified in the query periods.
+        Reduce each chart series to at most `chart_max_points` points using the method in chart_downsample_map.
+        Points are returned with explicit x values ([x, y], [x, speed, direction] for wind barbs, or the
+        icon point dicts for temperature) because downsampled series are no longer evenly spaced.
+        If a window of (min, max) millisecond timestamps is given only points inside it are kept,
+        so a zoomed-in chart gets full resolution for the visible range.
         """
-        hour = hour_summary.hour.hour  # Assuming hour_summary.hour is a datetime.time object
-        for period in query_periods:
-            if hour in period_hours_map.get(period, []):
-                return True
-        return False
+        x_values = [time.timestamp() * 1000 for time in weather_data['time_data']]
+        directions = weather_data.get(WeatherVarMap.wind_direction)
+        chart_data = {}
 
-    async def _initialise_weather_data(self, classification: QueryClassification) -> dict[str, list]:
-        """
-        Initialize the weather data dictionary with lists based on the query_variable_map
-        and the current classification.query_types.
-        """
-        weather_data = {'time_data': []}  # Always include time_data
-        for query_type in classification.query_type:
-            for variable in query_variable_map[query_type]:
-                if variable not in weather_data:
-                    weather_data[variable] = []
-        return weather_data
-    
-    async def _update_weather_data(self, weather_data: dict[str, list], variable: MetserviceVariable) -> None:
+        for variable, method in chart_downsample_map.items():
+            values = weather_data.get(variable)
+            if not values:
+                continue
+            if isinstance(values[0], dict):
+                points = values
+            else:
+                points = [{'x': x, 'y': y} for x, y in zip(x_values, values)]
+                if variable == WeatherVarMap.wind_speed and directions:
+                    for point, direction in zip(points, directions):
+                        point['direction'] = direction
+            if window:
+                points = [point for point in points if window[0] <= point['x'] <= window[1]]
+            if not points:
+                continue
+
+            y_values = [point['y'] for point in points]
+            if method == 'lttb':
+                x_points = [point['x'] for point in points]
+                selection = [(i, y_values[i]) for i in lttb(x_values=x_points, y_values=y_values, threshold=self.chart_max_points)]
+            else:
+                selection = aggregate_buckets(y_values=y_values, threshold=self.chart_max_points, method=method)
+
+            series = []
+            for i, value in selection:
+                point = points[i]
+                if 'iconPath' in point:
+                    series.append({**point, 'y': value})
+                elif 'direction' in point:
+                    series.append([point['x'], value, point['direction']])
+                else:
+                    series.append([point['x'], value])
+            chart_data[variable] = series
+
+        logger.debug("Downsampled {} time points to at most {} per series.", len(x_values), self.chart_max_points)
+        return chart_data
+
+    async def _check_data_store(self, classification: QueryClassification) -> tuple[list[date], set[QueryTypesEnum], list[int]]:
         """
-        Update the weather data dictionary with the variable value.
+        Find which cells (hour and variable of each date) the query needs that are not held yet.
+        A query needs the hours of its periods at its resolution (see period_resolution_hours), so hourly data
+        answers a multi-day query and only the missing hours of 6-hourly data are fetched for a finer one.
+        Returns the dates, query types and hours with missing cells.
         """
-
-        if WeatherVarMap(variable.name) in weather_data:
-            weather_data[WeatherVarMap(variable.name)].append(variable.value)
-    
-    async def _check_data_store(self, classification: QueryClassification) -> tuple[list[date], set[str]]:
         if QueryPeriodsEnum.MULTIPLE_DAYS in classification.query_period and classification.query_to_date:
             classification_dates = await self._classify_dates(classification=classification)
         else:
             classification_dates = [classification.query_from_date]
+        await self._copy_nearby_data(classification=classification, classification_dates=classification_dates)
+
+        needed_hours = self._query_hours(classification.query_period)
+        needed_variables = {query_type: {variable.value for variable in query_variable_map.get(query_type, [])}
+                            for query_type in classification.query_type}
+        held: dict[date, dict[int, set[str]]] = {}
+        for stored_data in self.data_store:
+            if stored_data.location == classification.location and stored_data.date in classification_dates:
+                date_held = held.setdefault(stored_data.date, {})
+                for hour_summary in stored_data.hour_summaries:
+                    date_held.setdefault(hour_summary.hour.hour, set()).update(variable.name for variable in hour_summary.variables)
 
         dates_missing_data = []
         unique_missing_query_types = set()
-
-        # Check data availability
-        for date in classification_dates:
-            date_has_all_data = True
-            for query_type in classification.query_type:
-                query_type_present = False
-
-                for stored_data in self.data_store:
-                    if stored_data.location == classification.location and stored_data.date == date and (
-                        stored_data.period_types == classification.query_period or 
-                        QueryPeriodsEnum.WHOLE_DAY in stored_data.period_types):
-                        if query_type in stored_data.weather_data_types or \
-                                (query_type not in [QueryTypesEnum.GENERAL_WEATHER, QueryTypesEnum.SEA_BOAT_SURF_FISHING] and 
-                                QueryTypesEnum.GENERAL_WEATHER in stored_data.weather_data_types):
-                            query_type_present = True
-                            break
-
-                if not query_type_present:
-                    date_has_all_data = False
+        missing_hours = set()
+        for day in classification_dates:
+            date_held = held.get(day, {})
+            date_missing = False
+            for query_type, variables in needed_variables.items():
+                query_type_missing_hours = [hour for hour in needed_hours if not variables <= date_held.get(hour, set())]
+                if query_type_missing_hours:
+                    date_missing = True
                     unique_missing_query_types.add(query_type)
+                    missing_hours.update(query_type_missing_hours)
+            if date_missing:
+                dates_missing_data.append(day)
+
+        if dates_missing_data and held:
+            logger.debug("Fetching {} missing hour(s) on {} date(s) for {}.", len(missing_hours), len(dates_missing_data), classification.location)
+        return dates_missing_data, unique_missing_query_types, sorted(missing_hours)
+
+    def _query_hours(self, query_periods: list[QueryPeriodsEnum]) -> list[int]:
+        """The hours of the day a query is answered with: its periods' hours, sampled at its resolution."""
+        resolution = max((period_resolution_hours.get(period, 1) for period in query_periods), default=1)
+        hours = set()
+        for period in query_periods:
+            hours.update(hour for hour in period_hours_map.get(period, []) if hour % resolution == 0)
+        return sorted(hours)
 
-            if not date_has_all_data:
-                dates_missing_data.append(date)
-
-        return dates_missing_data, unique_missing_query_types
-        
     async def _classify_dates(self, classification: QueryClassification) -> list[date]:
         delta = classification.query_to_date - classification.query_from_date
         classification_dates = [classification.query_from_date +
                                 timedelta(days=i) for i in range(delta.days + 1)]
         return classification_dates
 
+    async def _copy_nearby_data(self, classification: QueryClassification, classification_dates: list[date]) -> None:
+        """
+        Reuse data fetched for a nearby location (e.g. Auckland for Ponsonby) by copying it to the requested
+        location, so it is not fetched again. Only dates with no data for the requested location are copied,
+        from the nearest location within nearby_tolerance_km. Marine variables are only copied from within
+        nearby_marine_tolerance_km, so from further away they are left missing and fetched for the location.
+        """
+        if not len(self.location_index) or not classification.location:
+            return
+        dates_without_data = set(classification_dates) - {
+            data.date for data in self.data_store if data.location == classification.location}
+        if not dates_without_data:
+            return
+
+        latitude, longitude = await self._location_to_lat_lon(location=classification.location)
+        for distance, location in self.location_index.nearby(latitude, longitude, self.nearby_tolerance_km):
+            if location == classification.location:
+                continue
+            nearby_data = [data for data in self.data_store if data.location == location and data.date in dates_without_data]
+            if not nearby_data:
+                continue
+            logger.info("Reusing data for {} from {} ({:.1f}km away) for {} date(s).",
+                        classification.location, location, distance, len(nearby_data))
+            cache_requests.inc(len(nearby_data), cache='nearby', result='hit')
+            for data in nearby_data:
+                data = data.model_copy(deep=True, update={'location': classification.location})
+                if distance > self.nearby_marine_tolerance_km:
+                    self._drop_marine_data(data)
+                self.data_store.append(data)
+            return
+        cache_requests.inc(cache='nearby', result='miss')
+
+    @staticmethod
+    def _drop_marine_data(data: MetservicePeriodSummary) -> None:
+        """Remove marine values, their rollups and the query types that need them from a stored entry."""
+        names = {variable.value for variable in marine_variables}
+        for hour_summary in data.hour_summaries:
+            hour_summary.variables = [variable for variable in hour_summary.variables if variable.name not in names]
+        for period_rollups in data.rollups.values():
+            for name in names & period_rollups.keys():
+                del period_rollups[name]
+        data.weather_data_types = [query_type for query_type in data.weather_data_types
+                                   if not set(query_variable_map.get(query_type, [])) & marine_variables]
+
+    async def _evict_expired_data(self) -> None:
+        """Drop stored data too old to serve even while refreshing, so it is fetched again before answering."""
+        now = time.time()
+        kept = [data for data in self.data_store if freshness_policy.state(data.fetched_at, now) != Freshness.EXPIRED]
+        if len(kept) < len(self.data_store):
+            logger.info("Evicting {} expired data store entries.", len(self.data_store) - len(kept))
+            self.data_store[:] = kept
+
+    async def _schedule_refresh(self, classification: QueryClassification) -> None:
+        """
+        Start a background refresh of any stale data this query is answered from. Stale data is still served
+        straight away; only one refresh runs at a time for each location and date.
+        """
+        if QueryPeriodsEnum.MULTIPLE_DAYS in classification.query_period and classification.query_to_date:
+            classification_dates = await self._classify_dates(classification=classification)
+        else:
+            classification_dates = [classification.query_from_date]
+
+        now = time.time()
+        stale_by_hours: dict[tuple[int, ...], list[MetservicePeriodSummary]] = {}
+        for data in self.data_store:
+            if data.location != classification.location or data.date not in classification_dates \
+                    or (data.location, data.date) in self._refreshing:
+                continue
+            if freshness_policy.state(data.fetched_at, now) == Freshness.STALE:
+                stale_by_hours.setdefault(tuple(hour_summary.hour.hour for hour_summary in data.hour_summaries), []).append(data)
+
+        # Entries holding the same hours are refreshed with one request for just those hours
+        for hours, stale_data in stale_by_hours.items():
+            if not hours:
+                continue
+            dates = sorted({data.date for data in stale_data})
+            query_types = {query_type for data in stale_data for query_type in data.weather_data_types}
+            period_types = list(dict.fromkeys(period for data in stale_data for period in data.period_types))
+            keys = {(classification.location, data_date) for data_date in dates}
+            self._refreshing.update(keys)
+            refresh_classification = classification.model_copy(update={
+                'query_type': list(query_types), 'query_period': period_types,
+                'query_from_date': dates[0], 'query_to_date': dates[-1]})
+            task = asyncio.create_task(self._refresh_data(classification=refresh_classification, dates=dates, hours=list(hours), keys=keys))
+            self._refresh_tasks.add(task)
+            task.add_done_callback(self._refresh_tasks.discard)
+
+    async def _refresh_data(self, classification: QueryClassification, dates: list[date], hours: list[int], keys: set[tuple[str, date]]) -> None:
+        logger.info("Refreshing stale data for {} on {} date(s).", classification.location, len(dates))
+        try:
+            metservice_request = await self._create_API_request(request=classification, dates=dates, query_types=set(classification.query_type), hours=hours)
+            metservice_response = (await self._metservice_api_call(requests=[metservice_request], refresh=True))[0]
+            await self._update_stored_data(metservice_response=metservice_response, location=classification.location)
+        except Exception as e:
+            logger.error(f"Background refresh for {classification.location} failed: {e}")
+        finally:
+            self._refreshing.difference_update(keys)
+
+    async def _update_stored_data(self, metservice_response: list[MetservicePeriodSummary], location: str) -> None:
+        """Overwrite stored values with refreshed ones in place, keeping each entry's query and period types."""
+        for data in metservice_response:
+            for stored_data in self.data_store:
+                if stored_data.location == location and stored_data.date == data.date:
+                    await self._merge_weather_data(stored_data=stored_data, data=data, refresh=True)
+                    logger.debug("Refreshed data for date: {} and location: {}.", data.date, location)
+
     async def _store_weather_data(self, metservice_response: list[MetservicePeriodSummary], classification: QueryClassification) -> None:
+        """
+        Keep one entry per location and date. New data for a date already held is merged into its entry
+        hour by hour, so data fetched at different resolutions and for different query types builds up
+        into one set of cells that later queries are answered from.
+        """
         for data in metservice_response:
             data.location = classification.location
-            data.weather_data_types = classification.query_type
-            data.period_types = classification.query_period
-            logger.info(f"Processing data for date: {data.date}, location: {data.location} and periods: {data.period_types}.")
-
-            entries_to_remove = []
-            data_matched = False
-            for i, stored_data in enumerate(self.data_store):
-                if stored_data.date == data.date and stored_data.location == data.location:
-                    logger.info(f"Found existing data for date: { \
-                                data.date} and location: {data.location}.")
-                    # Conditions to replace the data
-                    if (
-                        (QueryTypesEnum.GENERAL_WEATHER in data.weather_data_types and
-                        QueryTypesEnum.SEA_BOAT_SURF_FISHING not in stored_data.weather_data_types and
-                            (data.period_types == stored_data.period_types or
-                            QueryPeriodsEnum.WHOLE_DAY in data.period_types)) 
-                            or
-                        (((QueryTypesEnum.GENERAL_WEATHER in data.weather_data_types and
-                            QueryTypesEnum.SEA_BOAT_SURF_FISHING not in stored_data.weather_data_types) or
-                            data.weather_data_types == stored_data.weather_data_types) and
-                            QueryPeriodsEnum.WHOLE_DAY in data.period_types)):
-                        logger.info(f"Replacing existing data with data for date: { \
-                                    data.date} and location: {data.location}.")
-                        entries_to_remove.append(i)
-
-                    if entries_to_remove:
-                        # Reverse indices_to_remove to avoid altering list during removal
-                        for i in sorted(entries_to_remove, reverse=True):
-                            del self.data_store[i]
-                        logger.info(f"Replacing existing data with 'whole day' data for date: { \
-                                    data.date} and location: {data.location}.")
-                        self.data_store.append(data)
-                        continue  
-
-                    # Conditions for combining the data
-                    else:
-                        for period in data.period_types:
-                            if period in stored_data.period_types \
-                            and (
-                                QueryTypesEnum.GENERAL_WEATHER not in data.weather_data_types \
-                                or QueryTypesEnum.SEA_BOAT_SURF_FISHING in stored_data.weather_data_types
-                                ):
-                                logger.info(f"Combining data entries for date: { \
-                                            data.date}, location: {data.location} and period(s): {data.period_types}.")
-                                stored_data.weather_data_types = list(
-                                    set(data.weather_data_types + stored_data.weather_data_types))
-                                for new_hour_summary, stored_hour_summary in zip(data.hour_summaries, stored_data.hour_summaries):
-                                    for variable in new_hour_summary.variables:
-                                        if variable.name not in [var.name for var in stored_hour_summary.variables]:
-                                            stored_hour_summary.variables.append(variable)
-                                data_matched = True
-                                break
-            # Data is only requested if needed so if not replacing or combining, append new data
-            if not data_matched:
-                logger.info(f"Appending new data for date: { \
-                            data.date} and location: {data.location}.")
-                self.data_store.append(data)
+            data.weather_data_types = list(classification.query_type)
+            data.period_types = list(classification.query_period)
+            logger.debug("Processing data for date: {}, location: {} and periods: {}.", data.date, data.location, data.period_types)
+            self.location_index.add(data.latitude, data.longitude, data.location)
+
+            stored_data = next((stored_data for stored_data in self.data_store
+                                if stored_data.location == data.location and stored_data.date == data.date), None)
+            if stored_data is not None:
+                logger.debug("Merging data into existing entry for date: {} and location: {}.", data.date, data.location)
+                await self._merge_weather_data(stored_data=stored_data, data=data)
+                continue
+            logger.debug("Appending new data for date: {} and location: {}.", data.date, data.location)
+            parsed_rollups, data.rollups = data.rollups, {}
+            await self._apply_rollups(data=data, rollups=parsed_rollups)
+            self.data_store.append(data)
 
-    async def _create_API_request(self, request: QueryClassification, dates: list[date], query_types: set[str]) -> MetservicePointTimeRequest:
-        logger.info(f"Request: {request}")
-        start_time = min(min(time) for period, time in period_hours_map.items() if period in request.query_period)
+    async def _merge_weather_data(self, stored_data: MetservicePeriodSummary, data: MetservicePeriodSummary, refresh: bool = False) -> None:
+        """
+        Add the hours and variables in data to a stored entry for the same location and date, overwriting
+        values it already holds. A refresh only overwrites values and marks the entry as freshly fetched;
+        otherwise the entry keeps the older fetch time, since some of its values are that old.
+        """
+        hour_summaries = {hour_summary.hour: hour_summary for hour_summary in stored_data.hour_summaries}
+        stored_cells = sum(len(hour_summary.variables) for hour_summary in stored_data.hour_summaries)
+        overwritten_cells = 0
+        dropped_cells = False
+        for hour_summary in data.hour_summaries:
+            stored_hour_summary = hour_summaries.get(hour_summary.hour)
+            if stored_hour_summary is None:
+                if refresh:
+                    dropped_cells = True
+                else:
+                    hour_summaries[hour_summary.hour] = hour_summary
+                continue
+            # Variables are swapped in the list rather than assigned, which skips pydantic's __setattr__
+            stored_variables = {variable.name: i for i, variable in enumerate(stored_hour_summary.variables)}
+            for variable in hour_summary.variables:
+                if variable.name in stored_variables:
+                    stored_hour_summary.variables[stored_variables[variable.name]] = variable
+                    overwritten_cells += 1
+                elif refresh:
+                    dropped_cells = True
+                else:
+                    stored_hour_summary.variables.append(variable)
+
+        if refresh:
+            stored_data.fetched_at = data.fetched_at
+        else:
+            stored_data.hour_summaries = [hour_summaries[hour] for hour in sorted(hour_summaries)]
+            stored_data.weather_data_types += [query_type for query_type in data.weather_data_types if query_type not in stored_data.weather_data_types]
+            stored_data.period_types += [period for period in data.period_types if period not in stored_data.period_types]
+            if stored_data.fetched_at is None or (data.fetched_at is not None and data.fetched_at < stored_data.fetched_at):
+                stored_data.fetched_at = data.fetched_at
+
+        if overwritten_cells == stored_cells and not dropped_cells:
+            # The entry now holds exactly the new data's cells, so the rollups parsed with it still apply
+            stored_data.rollups = {}
+            await self._apply_rollups(data=stored_data, rollups=data.rollups)
+        else:
+            await self._update_rollups(data=stored_data)
+
+    async def _update_rollups(self, data: MetservicePeriodSummary) -> None:
+        """Recompute an entry's rollups from all of its hours, after data has been merged into it."""
+        hours = [hour_summary.hour for hour_summary in data.hour_summaries]
+        columns: dict[str, array] = {}
+        for i, hour_summary in enumerate(data.hour_summaries):
+            for variable in hour_summary.variables:
+                column = columns.get(variable.name)
+                if column is None:
+                    column = columns[variable.name] = array('d', [math.nan] * len(hours))
+                column[i] = variable.value
+        rollups = await cpu_executor.run('rollups', day_rollups, hours, columns, size=len(hours) * len(columns))
+        data.rollups = {}
+        await self._apply_rollups(data=data, rollups=rollups)
+
+    async def _apply_rollups(self, data: MetservicePeriodSummary, rollups: dict[QueryPeriodsEnum, dict[str, dict[str, float]]]) -> None:
+        """Set the entry's aggregates, computed per period of the day, for each period the entry was fetched for."""
+        if QueryPeriodsEnum.WHOLE_DAY in data.period_types or QueryPeriodsEnum.MULTIPLE_DAYS in data.period_types or not data.period_types:
+            periods = rollup_periods
+        else:
+            periods = [period for period in rollup_periods if period in data.period_types]
+        for period in periods:
+            if period in rollups:
+                data.rollups[period] = rollups[period]
+
+    async def _create_API_request(self, request: QueryClassification, dates: list[date], query_types: set[str],
+                                  hours: Optional[list[int]] = None) -> MetservicePointTimeRequest:
+        """
+        Request the given hours of each date, by default every hour the query is answered with.
+        The API takes a start, interval and repeat count, so the request spans the first to the last hour
+        at the largest interval that hits all of them, and across days when there are several dates.
+        """
+        logger.info("Request: {}", request)
+        hours = sorted(hours or self._query_hours(request.query_period))
         first_date = dates[0]
         last_date = dates[-1]
-        from_datetime = datetime(year=first_date.year, month=first_date.month,day=first_date.day,hour=start_time).strftime("%Y-%m-%dT%H:00:00Z")
-        if request.query_period == [QueryPeriodsEnum.MULTIPLE_DAYS]:
-            days = (last_date-first_date).days + 1
-            repeat = days * 4 - 1
-            interval = "6h"
-        elif request.query_period == [QueryPeriodsEnum.WHOLE_DAY]:
-            repeat = 23
-            interval = "1h"
-        else:
-            repeat = len(request.query_period)*5
-            interval = "1h"
-        logger.info(f"From datetime: {from_datetime}, interval: {interval}, repeat: {repeat}")
-        variables = []
-        for query_type in query_types:
-            variables.extend(query_variable_map[query_type])
+        gaps = [later - earlier for earlier, later in zip(hours, hours[1:])]
+        if len(dates) > 1:
+            gaps.append(24 - hours[-1] + hours[0])
+        interval_hours = math.gcd(*gaps) if gaps else 1
+        span_hours = (last_date - first_date).days * 24 + hours[-1] - hours[0]
+        from_datetime = datetime(year=first_date.year, month=first_date.month, day=first_date.day, hour=hours[0]).strftime("%Y-%m-%dT%H:00:00Z")
+        repeat = span_hours // interval_hours
+        interval = f"{interval_hours}h"
+        logger.info("From datetime: {}, interval: {}, repeat: {}", from_datetime, interval, repeat)
+        # Query types share variables (e.g. temperature is in general weather), so each is requested once
+        variables = list(dict.fromkeys(variable for query_type in query_types for variable in query_variable_map[query_type]))
         latitude, longitude = await self._location_to_lat_lon(location=request.location)
 
         metservice_request = MetservicePointTimeRequest(
@@ -270,109 +555,217 @@ class WeatherService:
         return metservice_request
 
     async def _location_to_lat_lon(self, location: str) -> tuple[float, float]:
-        logger.info(f"Location: {location}")
-        
-        geocode = AsyncRateLimiter(self.geolocator.geocode, min_delay_seconds=1,max_retries=3)
-        geocode_response = await geocode(location, featuretype=["settlement", "town", "city"], timeout=10)
+        logger.info("Location: {}", location)
+        cache_key = f"geocode:{location.lower()}"
+        cached = await cache.get(cache_key)
+        cache_requests.inc(cache='geocode', result='hit' if cached is not None else 'miss')
+        if cached is not None:
+            return cached[0], cached[1]
+
+        place = gazetteer.geocode(location) if gazetteer is not None else None
+        if gazetteer is not None:
+            cache_requests.inc(cache='gazetteer', result='hit' if place is not None else 'miss')
+        if place is not None:
+            logger.debug("Gazetteer match for {}: {}", location, place.name)
+            await cache.set(cache_key, [place.latitude, place.longitude])
+            return place.latitude, place.longitude
+
+        with span('geocode'):
+            geocode_response = await nominatim_rate_limiter(self.geolocator.geocode, location,
+                                                            featuretype=["settlement", "town", "city"], timeout=10)
         latitude=geocode_response.latitude
         longitude=geocode_response.longitude
+        await cache.set(cache_key, [latitude, longitude])
 
         return latitude, longitude
 
     
     async def _lat_lon_to_location(self, latitude: float, longitude: float) -> str:
-        response: Location = await self.geolocator.reverse((latitude, longitude), zoom=12)
+        cache_key = f"reverse:{latitude:.3f},{longitude:.3f}"
+        cached = await cache.get(cache_key)
+        cache_requests.inc(cache='reverse_geocode', result='hit' if cached is not None else 'miss')
+        if cached is not None:
+            return cached
+
+        place = gazetteer.reverse(latitude, longitude) if gazetteer is not None else None
+        if gazetteer is not None:
+            cache_requests.inc(cache='reverse_gazetteer', result='hit' if place is not None else 'miss')
+        if place is not None:
+            await cache.set(cache_key, place.name)
+            return place.name
+
+        with span('reverse_geocode'):
+            response: Location = await nominatim_rate_limiter(self.geolocator.reverse, (latitude, longitude), zoom=12)
         location = response.raw['name']
+        await cache.set(cache_key, location)
 
         return location
 
-    async def _metservice_api_call(self, request: MetservicePointTimeRequest) -> list[MetservicePeriodSummary]:
-        logger.info(f"Request: {request}")
-        transport = httpx.AsyncHTTPTransport(retries=3)
-        async with httpx.AsyncClient(transport=transport) as request_client:
-            response = await request_client.post(
-                "https://forecast-v2.metoceanapi.com/point/time",
-                headers={"x-api-key": os.environ["METSERVICE_API_KEY"]},
-                json={
-                    "points": [{
-                        "lon": request.longitude,
-                        "lat": request.latitude,
-                    }],
-                    "variables": request.variables,
-                    "time": {
-                        "from": request.from_datetime,
-                        "interval": request.interval,
-                        "repeat": request.repeat
-                    }
-                }
-            )
-
-        if response.status_code != 200:
-            raise ValueError(f"Request failed with status code {response.status_code}")
-        logger.info(f"API response: {response.json()}")
-
-        metservice_response = await self._clean_metservice_response(response)
-        return metservice_response
-
-    async def _clean_metservice_response(self, metservice_api_response: httpx.Response) -> list[MetservicePeriodSummary]:
-        response_json = metservice_api_response.json()
-        metservice_response: list[MetservicePeriodSummary] = []
-
+    async def _metservice_api_calls(self, requests: list[MetservicePointTimeRequest]) -> list[list[MetservicePeriodSummary]]:
+        """
+        Fetch several forecasts concurrently, returning the data for each request in order.
+        Requests for the same variables and time range are combined into one multi-point request.
+        """
+        groups: dict[tuple, list[int]] = {}
+        for i, request in enumerate(requests):
+            key = (tuple(sorted(str(variable) for variable in request.variables)), request.from_datetime, request.interval, request.repeat)
+            groups.setdefault(key, []).append(i)
+
+        group_responses = await asyncio.gather(*(
+            self._metservice_api_call(requests=[requests[i] for i in indices]) for indices in groups.values()))
+        responses: list[list[MetservicePeriodSummary]] = [[] for _ in requests]
+        for indices, group_response in zip(groups.values(), group_responses):
+            for i, metservice_response in zip(indices, group_response):
+                responses[i] = metservice_response
+        return responses
+
+    async def _metservice_api_call(self, requests: list[MetservicePointTimeRequest], refresh: bool = False) -> list[list[MetservicePeriodSummary]]:
+        """
+        Fetch a forecast for one or more points sharing the variables and time range of the first request,
+        answering from the forecast cache or persistent store when possible. Returns the data for each request in order.
+        `refresh` skips the cache and store and always asks the API, for background refreshes of stale data.
+        """
+        request = requests[0]
+        logger.info("Request: {} for {} point(s)", request, len(requests))
+        points = list(dict.fromkeys((point_request.latitude, point_request.longitude) for point_request in requests))
+        request_body = {
+            "points": [{
+                "lon": longitude,
+                "lat": latitude,
+            } for latitude, longitude in points],
+            "variables": request.variables,
+            "time": {
+                "from": request.from_datetime,
+                "interval": request.interval,
+                "repeat": request.repeat
+            }
+        }
+        cache_key = "forecast:" + hashlib.sha1(json.dumps(request_body, sort_keys=True).encode()).hexdigest()
+        response_json = None if refresh else await cache.get(cache_key)
+        if not refresh:
+            cache_requests.inc(cache='forecast', result='hit' if response_json is not None else 'miss')
+
+        if response_json is None and forecast_store is not None and not refresh:
+            response_json = await self._read_forecast_store(request=request, points=points)
+            cache_requests.inc(cache='forecast_store', result='hit' if response_json is not None else 'miss')
+            if response_json is not None:
+                await cache.set(cache_key, response_json, ttl=self.forecast_cache_ttl)
+
+        if response_json is None:
+            with span('metservice_call'):
+                transport = httpx.AsyncHTTPTransport(retries=3)
+                async with httpx.AsyncClient(transport=transport) as request_client:
+                    response = await request_client.post(
+                        f"{self.metservice_api_url}/point/time",
+                        headers={"x-api-key": os.environ["METSERVICE_API_KEY"]},
+                        json=request_body
+                    )
+            upstream_bytes.inc(len(response.content), upstream='metservice')
+
+            if response.status_code != 200:
+                raise ValueError(f"Request failed with status code {response.status_code}")
+            response_json = response.json()
+            response_json['fetched_at'] = time.time()
+            logger.opt(lazy=True).debug("API response: {}", lambda: summarise_metservice_response(response_json))
+            await cache.set(cache_key, response_json, ttl=self.forecast_cache_ttl)
+            if forecast_store is not None:
+                await self._write_forecast_store(points=points, response_json=response_json)
+        else:
+            logger.info("Forecast cache hit for request: {}", cache_key)
+
+        with span('parse'):
+            points_response = await self._clean_metservice_points(response_json)
+
+        # The response lists points in the order they were requested. Hand each request the data for its point,
+        # copying it when several requests share a point because storing the data labels it with the request's location
+        point_indexes = {point: i for i, point in enumerate(points)}
+        responses = []
+        handed_out = set()
+        for point_request in requests:
+            point_index = point_indexes[(point_request.latitude, point_request.longitude)]
+            point_data = points_response[point_index] if point_index < len(points_response) else []
+            responses.append([data.model_copy(deep=True) for data in point_data] if point_index in handed_out else point_data)
+            handed_out.add(point_index)
+        return responses
+
+    async def _request_times(self, request: MetservicePointTimeRequest) -> list[str]:
+        start = datetime.strptime(request.from_datetime, "%Y-%m-%dT%H:%M:%SZ")
+        interval = timedelta(hours=int((request.interval or "1h").rstrip("h")))
+        return [(start + i * interval).strftime("%Y-%m-%dT%H:%M:%SZ") for i in range((request.repeat or 0) + 1)]
+
+    async def _read_forecast_store(self, request: MetservicePointTimeRequest, points: list[tuple[float, float]]) -> Optional[dict]:
+        """
+        Rebuild a /point/time response for the points from the persistent forecast store,
+        or return None if any requested point, time or variable is missing or expired.
+        """
+        times = await self._request_times(request)
+        stored_points = await asyncio.gather(*(
+            forecast_store.read(latitude=latitude, longitude=longitude, times=times, variables=request.variables)
+            for latitude, longitude in points))
+        if any(stored is None for stored in stored_points):
+            return None
+        logger.info("Forecast store hit for {} time(s) at {} point(s)", len(times), len(points))
+
+        # Variable data is laid out point by point, as in the API response
+        variables_data = {}
+        for stored_variables, _ in stored_points:
+            for variable, data in stored_variables.items():
+                variables_data.setdefault(variable, {'units': data['units'], 'data': []})['data'].extend(data['data'])
+        return {
+            'dimensions': {
+                'point': {'data': [{'lat': latitude, 'lon': longitude} for latitude, longitude in points]},
+                'time': {'data': times},
+            },
+            'variables': variables_data,
+            'fetched_at': min(fetched_at for _, fetched_at in stored_points),
+        }
+
+    async def _write_forecast_store(self, points: list[tuple[float, float]], response_json: dict) -> None:
+        try:
+            times = response_json['dimensions']['time']['data']
+            variables_data = response_json['variables']
+        except KeyError as e:
+            logger.info("Not storing response with missing key: {}", e)
+            return
+        for i, (latitude, longitude) in enumerate(points):
+            point_variables_data = {
+                variable: {'units': data.get('units'), 'data': data['data'][i * len(times):(i + 1) * len(times)]}
+                for variable, data in variables_data.items()}
+            forecast_store.write(latitude=latitude, longitude=longitude, times=times, variables_data=point_variables_data)
+
+    async def _clean_metservice_response(self, response_json: dict) -> list[MetservicePeriodSummary]:
+        return [data for point_data in await self._clean_metservice_points(response_json) for data in point_data]
+
+    async def _clean_metservice_points(self, response_json: dict) -> list[list[MetservicePeriodSummary]]:
+        """The data for each point in the response, in the order the points were requested."""
         try:
             points_data: list[dict] = response_json['dimensions']['point']['data']
             times_data: list[str] = response_json['dimensions']['time']['data']
             variables_data: dict = response_json['variables']
         except KeyError as e:
-            logger.info(f"Missing key in response: {e}")
+            logger.info("Missing key in response: {}", e)
             return []
+        fetched_at: Optional[float] = response_json.get('fetched_at')
 
-        for point in points_data:
-            latitude = point.get('lat')
-            longitude = point.get('lon')
-
-            # Group times by day
-            times_by_day: dict[str, list[str]] = {}
-            for time in times_data:
-                day = time.split('T')[0]
-                if day not in times_by_day:
-                    times_by_day[day] = []
-                times_by_day[day].append(time)
-
-            for day, day_times in times_by_day.items():
-                hour_summaries = []
-
-                for time in day_times:
-                    hour_str = time.split('T')[1][:5]
-                    hour = datetime.strptime(f"{day} {hour_str}", "%Y-%m-%d %H:%M").time()
-                    variables = []
-
-                    for var_name, var_data in variables_data.items():
-                        index = times_data.index(time)
-                        var_value = var_data['data'][index]
-                        var_units = var_data.get('units')
-
-                        # Apply transformations based on units
-                        if var_units in weather_unit_map:
-                            transform_func, var_units = weather_unit_map[var_units]
-                            if var_value is not None:
-                                var_value = transform_func(var_value)
-                        if var_value is not None:
-                            var_value = round(var_value, 2)
-                            if var_value < 0:
-                                var_value = 0.0
-                        else:
-                            var_value = 0.0
-                        variables.append(MetserviceVariable(name=var_name, value=var_value, units=var_units))
-
-                    hour_summaries.append(MetserviceTimePointSummary(hour=hour, variables=variables))
-
-                if hour_summaries:
-                    metservice_response.append(MetservicePeriodSummary(
-                        weather_data_types=[],
-                        period_types=[],
-                        date=datetime.strptime(day, "%Y-%m-%d"),
-                        latitude=latitude,
-                        longitude=longitude,
-                        hour_summaries=hour_summaries
-                    ))
-        return metservice_response
\ No newline at end of file
+        forecast_days = await cpu_executor.run('parse', parse_forecast, points_data, times_data, variables_data,
+                                               size=len(points_data) * len(times_data) * len(variables_data))
+        points_response: list[list[MetservicePeriodSummary]] = [[] for _ in points_data]
+        for day in forecast_days:
+            if not day.hours:
+                continue
+            points_response[day.point_index].append(MetservicePeriodSummary.model_validate({
+                'weather_data_types': [],
+                'period_types': [],
+                'date': day.date,
+                'latitude': day.latitude,
+                'longitude': day.longitude,
+                'hour_summaries': [{
+                    'hour': hour,
+                    'variables': [{'name': name, 'value': values[i], 'units': day.units[name]} for name, values in day.columns.items()],
+                } for i, hour in enumerate(day.hours)],
+                'fetched_at': fetched_at,
+                'rollups': day.rollups,
+            }))
+            # Building the models has to happen on the loop, so let other sessions run between days
+            await asyncio.sleep(0)
+        return points_response
@@ -1,15 +1,37 @@
-
-from fastapi import Request
 from fastapi.responses import RedirectResponse
 from nicegui import app, Client
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.types import ASGIApp, Receive, Scope, Send
 
 unrestricted_page_routes = {'/login'}
+unprotected_path_prefixes = ('/_nicegui',)  # NiceGUI static assets and socket.io
+restricted_path_prefixes = ('/admin',)  # Non-page routes for operators, e.g. the profiler
+
+class AuthMiddleware:
+    """
+    Pure ASGI middleware redirecting unauthenticated users from page routes and admin endpoints to the login page.
+    Websocket, static and NiceGUI internal requests are passed straight through, and the set of
+    restricted routes is only rebuilt when a new page has been registered.
+    """
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self._registered_pages = -1
+        self._restricted_routes: frozenset[str] = frozenset()
+
+    @property
+    def restricted_routes(self) -> frozenset[str]:
+        if len(Client.page_routes) != self._registered_pages:
+            self._registered_pages = len(Client.page_routes)
+            self._restricted_routes = frozenset(Client.page_routes.values()) - unrestricted_page_routes
+        return self._restricted_routes
 
-class AuthMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        path = scope['path']
+        if path.startswith(unprotected_path_prefixes) or (
+                path not in self.restricted_routes and not path.startswith(restricted_path_prefixes)):
+            return await self.app(scope, receive, send)
         if not app.storage.user.get('authenticated', False):
-            if request.url.path in Client.page_routes.values() and request.url.path not in unrestricted_page_routes:
-                app.storage.user['referrer_path'] = request.url.path
-                return RedirectResponse('/login')
-        return await call_next(request)
+            app.storage.user['referrer_path'] = path
+            return await RedirectResponse('/login')(scope, receive, send)
+        return await self.app(scope, receive, send)
@@ -0,0 +1,169 @@
+"""
+Pure, column-at-a-time versions of the CPU-bound pipeline stages, run through utils.executor.
+They take and return plain lists and arrays so they can run in a worker thread or process,
+and the caller builds or reads the pydantic models on the event loop.
+"""
+import math
+from array import array
+from datetime import date, time
+from typing import NamedTuple, Optional
+
+from utils.constants import QueryPeriodsEnum, WeatherVarMap, period_hours_map, rollup_aggregates_map, rollup_periods, weather_unit_map
+from utils.rollups import aggregate, format_aggregate
+
+NIGHT_BEFORE_MINUTES = 6 * 60
+NIGHT_AFTER_MINUTES = 18 * 60
+
+
+class ForecastDay(NamedTuple):
+    # Position of the point in the request, which the response keeps
+    point_index: int
+    latitude: float
+    longitude: float
+    date: date
+    hours: list[time]
+    units: dict[str, Optional[str]]
+    # Variable name -> value at each hour
+    columns: dict[str, array]
+    rollups: dict[QueryPeriodsEnum, dict[str, dict[str, float]]]
+
+
+def _clean_values(values: list, units: Optional[str]) -> tuple[list[float], Optional[str]]:
+    """Convert to display units, round to 2dp and replace missing and negative values with 0."""
+    if units in weather_unit_map:
+        transform, units = weather_unit_map[units]
+        values = [None if value is None else transform(value) for value in values]
+    cleaned = []
+    for value in values:
+        if value is None:
+            cleaned.append(0.0)
+        else:
+            value = round(value, 2)
+            cleaned.append(0.0 if value < 0 else value)
+    return cleaned, units
+
+
+def day_rollups(hours: list[time], columns: dict[str, array]) -> dict[QueryPeriodsEnum, dict[str, dict[str, float]]]:
+    """
+    The rollup_aggregates_map aggregates of each variable for every period in rollup_periods the hours fall in.
+    Each value stands for the hours until the next one, so days mixing hourly and 6-hourly values still
+    total correctly. NaN values, for hours a variable was not fetched for, are skipped.
+    """
+    gaps = [later.hour - earlier.hour for earlier, later in zip(hours, hours[1:])]
+    gaps.append(gaps[-1] if gaps else 1)
+    interval_hours = gaps[0] if len(set(gaps)) == 1 else None
+    rollups = {}
+    for period in rollup_periods:
+        period_hours = set(period_hours_map[period])
+        positions = [i for i, hour in enumerate(hours) if hour.hour in period_hours]
+        if not positions or not columns:
+            continue
+        period_rollups = {}
+        for name, values in columns.items():
+            present = [i for i in positions if not math.isnan(values[i])]
+            if not present:
+                continue
+            period_values = [values[i] for i in present]
+            period_rollups[name] = {method: aggregate(period_values, method, interval_hours or [gaps[i] for i in present])
+                                    for method in rollup_aggregates_map.get(WeatherVarMap(name), ())}
+        if period_rollups:
+            rollups[period] = period_rollups
+    return rollups
+
+
+def parse_forecast(points: list[dict], times: list[str], variables_data: dict) -> list[ForecastDay]:
+    """
+    Split a /point/time response into a day of cleaned columns per point, with each day's rollups.
+    Variable data is laid out point by point, each point covering every time in order.
+    """
+    days: dict[str, list[int]] = {}
+    for i, timestamp in enumerate(times):
+        days.setdefault(timestamp[:10], []).append(i)
+    hours = [time(int(timestamp[11:13]), int(timestamp[14:16])) for timestamp in times]
+
+    forecast_days = []
+    for point_index, point in enumerate(points):
+        offset = point_index * len(times)
+        cleaned = {}
+        units = {}
+        for name, data in variables_data.items():
+            cleaned[name], units[name] = _clean_values(data['data'][offset:offset + len(times)], data.get('units'))
+
+        for day, positions in days.items():
+            day_hours = [hours[i] for i in positions]
+            columns = {name: array('d', [values[i] for i in positions]) for name, values in cleaned.items()}
+            forecast_days.append(ForecastDay(
+                point_index=point_index, latitude=float(point.get('lat')), longitude=float(point.get('lon')), date=date.fromisoformat(day),
+                hours=day_hours, units=units, columns=columns, rollups=day_rollups(day_hours, columns)))
+    return forecast_days
+
+
+def categorise_weather(prec_mm: float, wind_km_h: float, cloud_pct: float, temp_c: float) -> str:
+    if temp_c < 0 and 0 <= prec_mm <= 0.2 and wind_km_h < 40:
+        return 'frost'
+    elif 0 <= prec_mm <= 0.2 and wind_km_h < 40:
+        if cloud_pct < 10:
+            return 'fine'
+        elif cloud_pct <= 70:
+            return 'partly_cloudy'
+        else:
+            return 'cloudy'
+    elif 0.2 < prec_mm < 2 and wind_km_h < 40:
+        return 'few_showers'
+    elif 2 <= prec_mm <= 6 and wind_km_h < 40:
+        return 'showers'
+    elif prec_mm > 6 and wind_km_h < 40:
+        return 'rain'
+    elif wind_km_h >= 40:
+        return 'wind'
+    else:
+        return 'Unspecified'
+
+
+def weather_categories(minutes: array, rain: Optional[array], wind: Optional[array], cloud: Optional[array],
+                       temp: Optional[array]) -> list[Optional[str]]:
+    """
+    Icon category, e.g. 'showers_night', for each time given as minutes past midnight,
+    or None where a variable is missing.
+    """
+    categories = []
+    for i, minute in enumerate(minutes):
+        values = [column[i] if column is not None and i < len(column) else None for column in (rain, wind, cloud, temp)]
+        if None in values:
+            categories.append(None)
+            continue
+        suffix = '_night' if minute <= NIGHT_BEFORE_MINUTES or minute > NIGHT_AFTER_MINUTES else '_day'
+        categories.append(categorise_weather(*values) + suffix)
+    return categories
+
+
+class FormatEntry(NamedTuple):
+    header: str
+    rollups: dict[QueryPeriodsEnum, dict[str, dict[str, float]]]
+    units: dict[str, str]
+    # None when the entry is described by its rollups alone
+    hours: Optional[list[time]]
+    # (name, units, value at each hour, NaN where the hour has no value)
+    columns: list[tuple[str, str, array]]
+
+
+def format_rollups(rollups: dict[QueryPeriodsEnum, dict[str, dict[str, float]]], units: dict[str, str]) -> str:
+    return '\n'.join(
+        f"{period.value}: {'; '.join(
+            f'{name} {', '.join(format_aggregate(method, value, units.get(name, '')) for method, value in aggregates.items())}'
+            for name, aggregates in variables.items())}"
+        for period, variables in rollups.items())
+
+
+def format_data_store(entries: list[FormatEntry]) -> str:
+    formatted_data = []
+    for entry in entries:
+        summary = format_rollups(entry.rollups, entry.units)
+        if entry.hours is None:
+            formatted_data.append(f"{entry.header}  \n Summary: \n {summary}")
+            continue
+        hourly = '\n\n'.join(
+            f'Time: {hour} \n {'\n'.join(f'{name}: {values[i]}{units}' for name, units, values in entry.columns if not math.isnan(values[i]))}'
+            for i, hour in enumerate(entry.hours))
+        formatted_data.append(f"{entry.header}  \n Summary: \n {summary}\n\n {hourly}" if summary else f"{entry.header}  \n {hourly}")
+    return "\n\n".join(formatted_data)
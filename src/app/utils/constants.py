@@ -6,8 +6,9 @@ ClassificationPrompt = (
 
     "GUIDELINES:\n"
     "- You can only request data ten days in the future and seven days in the past.\n"
-    "- Leave `location` empty if one is not specified in the query and the user is not referring to a previously stated location, we'll get the user's location.\n"
-    "- Consider the context of the conversation when classifying the query, especially when it comes to query_from_date and location because the user's query may relate to something they've said previously.\n"
+    "- Leave `locations` empty if none are specified in the query and the user is not referring to a previously stated location, we'll get the user's location.\n"
+    "- List every location when the user asks about or compares several places, e.g. \"Compare Auckland and Wellington this weekend\".\n"
+    "- Consider the context of the conversation when classifying the query, especially when it comes to query_from_date and locations because the user's query may relate to something they've said previously.\n"
 )
 
 QueryResponsePrompt = (
@@ -96,6 +97,17 @@ query_variable_map = {
     ],
 }
 
+# Marine conditions vary over much shorter distances near the coast than air temperature or rain,
+# so forecasts for these are only reused for nearby locations within a tighter tolerance.
+marine_variables = {
+    WeatherVarMap.sea_temperature,
+    WeatherVarMap.wave_height,
+    WeatherVarMap.wave_height_max,
+    WeatherVarMap.wave_direction_mean,
+    WeatherVarMap.wave_direction_peak,
+    WeatherVarMap.wave_period_peak,
+}
+
 
 period_hours_map = {
     QueryPeriodsEnum.MORNING: list(range(6, 12)),  # 6AM to 11AM
@@ -106,21 +118,70 @@ period_hours_map = {
     QueryPeriodsEnum.MULTIPLE_DAYS: list(range(0, 24)),  # Multiple days
 }
 
+# Hours between the forecast times a query is answered with. Finer data already held for a day
+# is sampled down to this rather than fetched again; anything not listed is hourly.
+period_resolution_hours = {
+    QueryPeriodsEnum.MULTIPLE_DAYS: 6,
+}
+
+# How each chart series is reduced when there are more points than the chart can usefully show.
+# Line series keep their shape with LTTB, rain is summed and wind keeps its peaks.
+chart_downsample_map = {
+    WeatherVarMap.temp: 'lttb',
+    WeatherVarMap.humidity: 'lttb',
+    WeatherVarMap.cloud_cover: 'lttb',
+    WeatherVarMap.rain: 'sum',
+    WeatherVarMap.wind_speed: 'max',
+}
+
+# Chart series, alongside the variables, banding each day between its low and high temperature from the rollups
+daily_range_series = 'daily_range'
+
+# Aggregates computed for each variable when data is stored, per day and per period of the day,
+# so daily highs and lows, rain totals and peak gusts don't need every hourly value.
+rollup_aggregates_map = {
+    WeatherVarMap.temp: ('min', 'max', 'mean'),
+    WeatherVarMap.humidity: ('mean',),
+    WeatherVarMap.cloud_cover: ('mean',),
+    WeatherVarMap.rain: ('total', 'max'),
+    WeatherVarMap.wind_speed: ('mean', 'max'),
+    WeatherVarMap.wind_speed_gust: ('max',),
+    WeatherVarMap.wind_direction: ('dominant',),
+    WeatherVarMap.sea_temperature: ('min', 'max'),
+    WeatherVarMap.wave_height: ('mean', 'max'),
+    WeatherVarMap.wave_height_max: ('max',),
+    WeatherVarMap.wave_direction_mean: ('dominant',),
+    WeatherVarMap.wave_direction_peak: ('dominant',),
+    WeatherVarMap.wave_period_peak: ('mean',),
+}
+
+rollup_periods = [
+    QueryPeriodsEnum.WHOLE_DAY,
+    QueryPeriodsEnum.NIGHT,
+    QueryPeriodsEnum.MORNING,
+    QueryPeriodsEnum.AFTERNOON,
+    QueryPeriodsEnum.EVENING,
+]
+
+
+# Icons are entries in the bundled sprite built from this set, see utils/icons.py
+WEATHER_ICON_SOURCE = 'https://cdn.jsdelivr.net/gh/Makin-Things/weather-icons/animated'
+
 
 class WeatherIconMap(Enum):
-    frost_day = 'https://cdn.jsdelivr.net/gh/Makin-Things/weather-icons/animated/frost-day.svg'
-    frost_night = 'https://cdn.jsdelivr.net/gh/Makin-Things/weather-icons/animated/frost-night.svg'
-    fine_day = 'https://cdn.jsdelivr.net/gh/Makin-Things/weather-icons/animated/clear-day.svg'
-    fine_night = 'https://cdn.jsdelivr.net/gh/Makin-Things/weather-icons/animated/clear-night.svg'
-    partly_cloudy_day = 'https://cdn.jsdelivr.net/gh/Makin-Things/weather-icons/animated/cloudy-1-day.svg'
-    partly_cloudy_night = 'https://cdn.jsdelivr.net/gh/Makin-Things/weather-icons/animated/cloudy-1-night.svg'
-    cloudy_day = 'https://cdn.jsdelivr.net/gh/Makin-Things/weather-icons/animated/cloudy.svg'
-    cloudy_night = 'https://cdn.jsdelivr.net/gh/Makin-Things/weather-icons/animated/cloudy.svg'
-    few_showers_day = 'https://cdn.jsdelivr.net/gh/Makin-Things/weather-icons/animated/rainy-1-day.svg'
-    few_showers_night = 'https://cdn.jsdelivr.net/gh/Makin-Things/weather-icons/animated/rainy-1-night.svg'
-    showers_day = 'https://cdn.jsdelivr.net/gh/Makin-Things/weather-icons/animated/rainy-2-day.svg'
-    showers_night = 'https://cdn.jsdelivr.net/gh/Makin-Things/weather-icons/animated/rainy-2-night.svg'
-    rain_day = 'https://cdn.jsdelivr.net/gh/Makin-Things/weather-icons/animated/rainy-3-day.svg'
-    rain_night = 'https://cdn.jsdelivr.net/gh/Makin-Things/weather-icons/animated/rainy-3-night.svg'
-    wind_day = 'https://cdn.jsdelivr.net/gh/Makin-Things/weather-icons/animated/wind.svg'
-    wind_night = 'https://cdn.jsdelivr.net/gh/Makin-Things/weather-icons/animated/wind.svg'
\ No newline at end of file
+    frost_day = 'frost-day'
+    frost_night = 'frost-night'
+    fine_day = 'clear-day'
+    fine_night = 'clear-night'
+    partly_cloudy_day = 'cloudy-1-day'
+    partly_cloudy_night = 'cloudy-1-night'
+    cloudy_day = 'cloudy'
+    cloudy_night = 'cloudy'
+    few_showers_day = 'rainy-1-day'
+    few_showers_night = 'rainy-1-night'
+    showers_day = 'rainy-2-day'
+    showers_night = 'rainy-2-night'
+    rain_day = 'rainy-3-day'
+    rain_night = 'rainy-3-night'
+    wind_day = 'wind'
+    wind_night = 'wind'
\ No newline at end of file
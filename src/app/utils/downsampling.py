@@ -0,0 +1,66 @@
+from collections.abc import Sequence
+
+
+def lttb(x_values: Sequence[float], y_values: Sequence[float], threshold: int) -> list[int]:
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+    Returns the indices of the points to keep, always including the first and last point,
+    so the caller can carry any extra per-point data (e.g. icons) along with the selection.
+    """
+    n = len(y_values)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+
+    bucket_size = (n - 2) / (threshold - 2)
+    selected = [0]
+    a = 0
+    for i in range(threshold - 2):
+        bucket_start = int(i * bucket_size) + 1
+        bucket_end = int((i + 1) * bucket_size) + 1
+
+        # Average point of the next bucket is the third corner of the triangle
+        next_start = bucket_end
+        next_end = min(int((i + 2) * bucket_size) + 1, n)
+        next_count = next_end - next_start
+        avg_x = sum(x_values[next_start:next_end]) / next_count
+        avg_y = sum(y_values[next_start:next_end]) / next_count
+
+        ax, ay = x_values[a], y_values[a]
+        max_area = -1.0
+        max_index = bucket_start
+        for j in range(bucket_start, bucket_end):
+            area = abs((ax - avg_x) * (y_values[j] - ay) - (ax - x_values[j]) * (avg_y - ay))
+            if area > max_area:
+                max_area = area
+                max_index = j
+        selected.append(max_index)
+        a = max_index
+
+    selected.append(n - 1)
+    return selected
+
+
+def aggregate_buckets(y_values: Sequence[float], threshold: int, method: str) -> list[tuple[int, float]]:
+    """
+    Split the series into `threshold` contiguous buckets and reduce each one.
+    'max' keeps the index of the peak value, 'sum' keeps the index of the first point in the bucket.
+    Returns (index, value) pairs.
+    """
+    n = len(y_values)
+    if threshold >= n or threshold < 1:
+        return [(i, y) for i, y in enumerate(y_values)]
+
+    bucket_size = n / threshold
+    aggregated = []
+    for i in range(threshold):
+        start = int(i * bucket_size)
+        end = int((i + 1) * bucket_size)
+        bucket = y_values[start:end]
+        if method == 'max':
+            offset = max(range(len(bucket)), key=bucket.__getitem__)
+            aggregated.append((start + offset, bucket[offset]))
+        elif method == 'sum':
+            aggregated.append((start, round(sum(bucket), 2)))
+        else:
+            raise ValueError(f"Unknown aggregation method: {method}")
+    return aggregated
@@ -0,0 +1,70 @@
+import asyncio
+import functools
+import multiprocessing
+import os
+from collections.abc import Callable
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional, TypeVar
+
+from loguru import logger
+
+from utils.metrics import offloaded_stages
+
+Result = TypeVar('Result')
+
+EXECUTOR_MODES = ('thread', 'process', 'inline')
+
+
+class CPUExecutor:
+    """
+    Runs CPU-bound pipeline stages off the event loop shared by every session, so one large parse
+    does not stall everyone else's websocket traffic. Stages smaller than `min_values` run inline,
+    where handing them to a worker would cost more than it saves.
+
+    `thread` workers share memory, so arguments are passed as they are; they still hold the GIL but
+    the loop gets it back every switch interval (5ms) rather than when the stage finishes.
+    `process` workers run stages in parallel with the loop, and arguments are pickled, so stages
+    take and return plain columns (lists and arrays) rather than pydantic models.
+    Functions submitted must be module-level and pure.
+    """
+    def __init__(self, mode: str = 'thread', workers: int = 2, min_values: int = 2000) -> None:
+        if mode not in EXECUTOR_MODES:
+            raise ValueError(f"Unknown CPU executor mode: {mode}, expected one of {EXECUTOR_MODES}")
+        self.mode = mode
+        self.workers = workers
+        self.min_values = min_values
+        self._executor: Optional[Executor] = None
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            if self.mode == 'process':
+                # Forked rather than spawned: spawned children re-run main.py as __mp_main__, which starts NiceGUI
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('fork'))
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='cpu')
+        return self._executor
+
+    async def run(self, stage: str, func: Callable[..., Result], *args, size: int = 0) -> Result:
+        """Run func(*args), in a worker if the executor is enabled and size (number of values handled) is at least min_values."""
+        if self.mode == 'inline' or size < self.min_values:
+            offloaded_stages.inc(stage=stage, mode='inline')
+            return func(*args)
+        offloaded_stages.inc(stage=stage, mode=self.mode)
+        return await asyncio.get_running_loop().run_in_executor(self.executor, functools.partial(func, *args))
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+def get_cpu_executor() -> CPUExecutor:
+    cpu_executor = CPUExecutor(mode=os.environ.get('CPU_EXECUTOR', 'thread'),
+                               workers=int(os.environ.get('CPU_EXECUTOR_WORKERS', 2)),
+                               min_values=int(os.environ.get('CPU_OFFLOAD_MIN_VALUES', 2000)))
+    logger.info(f"CPU stages run in {cpu_executor.mode} mode above {cpu_executor.min_values} values")
+    return cpu_executor
+
+
+cpu_executor = get_cpu_executor()
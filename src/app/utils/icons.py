@@ -0,0 +1,140 @@
+"""
+Weather icons served by the app from a single SVG sprite instead of one CDN request per icon.
+
+The sprite lays the icons out side by side with a <view> per icon, so `weather-icons.<hash>.svg#clear-day`
+shows just that icon in an <img>. The URL carries a hash of the sprite, so it is served with an immutable,
+year-long Cache-Control header and precompressed with gzip. Build or refresh the sprite with
+
+    python -m utils.icons build            (from src/app, downloads the icon set)
+    python -m utils.icons build --source ~/weather-icons/animated
+"""
+import argparse
+import gzip
+import hashlib
+import os
+import re
+from pathlib import Path
+from typing import Optional
+
+from loguru import logger
+from starlette.responses import Response
+
+from utils.constants import WEATHER_ICON_SOURCE, WeatherIconMap
+
+DEFAULT_SPRITE_PATH = Path(__file__).resolve().parent.parent / 'static' / 'weather-icons.svg'
+SPRITE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+ICON_SIZE = 64
+
+_SVG_ROOT = re.compile(r'<svg\b([^>]*)>(.*)</svg>', re.DOTALL)
+_VIEW_BOX = re.compile(r'viewBox="([^"]+)"')
+_ID = re.compile(r'\bid="([^"]+)"')
+_ID_REFERENCE = re.compile(r'(url\(#|href="#)([^)"]+)')
+_ANIMATION_TIMING = re.compile(r'\b(begin|end)="([^"]+)"')
+
+
+class IconSprite:
+    def __init__(self, content: bytes) -> None:
+        self.content = content
+        self.compressed = gzip.compress(content, compresslevel=9)
+        self.version = hashlib.sha256(content).hexdigest()[:12]
+        self.url = f'/static/weather-icons.{self.version}.svg'
+        self.ids = {view_id.decode() for view_id in re.findall(rb'<view id="([^"]+)"', content)}
+
+    def response(self, accept_encoding: str = '', if_none_match: str = '') -> Response:
+        """
+        The sprite, gzipped if the client accepts it, or 304 Not Modified if the client's If-None-Match
+        already names the representation it would get. Each encoding has its own ETag.
+        """
+        compressed = 'gzip' in accept_encoding
+        etag = f'"{self.version}-gzip"' if compressed else f'"{self.version}"'
+        headers = {'Cache-Control': SPRITE_CACHE_CONTROL, 'ETag': etag, 'Vary': 'Accept-Encoding'}
+        if if_none_match.strip() == '*' or etag in (tag.strip().removeprefix('W/') for tag in if_none_match.split(',')):
+            return Response(status_code=304, headers=headers)
+        if compressed:
+            headers['Content-Encoding'] = 'gzip'
+            return Response(self.compressed, media_type='image/svg+xml', headers=headers)
+        return Response(self.content, media_type='image/svg+xml', headers=headers)
+
+
+def load_icon_sprite() -> Optional[IconSprite]:
+    """The sprite at WEATHER_ICON_SPRITE_PATH (default src/app/static/weather-icons.svg), or None if it has not been built."""
+    path = Path(os.environ.get('WEATHER_ICON_SPRITE_PATH', DEFAULT_SPRITE_PATH))
+    if not path.exists():
+        logger.warning(f"No weather icon sprite at {path}, icons will be loaded from {WEATHER_ICON_SOURCE}. "
+                       f"Run `python -m utils.icons build` to bundle them.")
+        return None
+    sprite = IconSprite(path.read_bytes())
+    missing = {icon.value for icon in WeatherIconMap} - sprite.ids
+    if missing:
+        logger.warning(f"Weather icon sprite at {path} is missing {sorted(missing)}, rebuild it with `python -m utils.icons build`")
+    return sprite
+
+
+icon_sprite = load_icon_sprite()
+
+
+def icon_url(icon: WeatherIconMap) -> str:
+    if icon_sprite is not None and icon.value in icon_sprite.ids:
+        return f'{icon_sprite.url}#{icon.value}'
+    return f'{WEATHER_ICON_SOURCE}/{icon.value}.svg'
+
+
+def _prefix_ids(svg: str, prefix: str) -> str:
+    """Prefix every id and reference to one, so ids repeated across icons stay unique in the sprite."""
+    ids = set(_ID.findall(svg))
+    svg = _ID.sub(lambda match: f'id="{prefix}-{match.group(1)}"', svg)
+    svg = _ID_REFERENCE.sub(lambda match: f'{match.group(1)}{prefix}-{match.group(2)}', svg)
+
+    # SMIL timings chain animations by id, e.g. begin="0s; a.end+1s"
+    def prefix_timing(match: re.Match) -> str:
+        timing = re.sub(r'\b([A-Za-z_][\w-]*)(?=\.(?:begin|end|click)\b)',
+                        lambda ref: f'{prefix}-{ref.group(1)}' if ref.group(1) in ids else ref.group(1), match.group(2))
+        return f'{match.group(1)}="{timing}"'
+    return _ANIMATION_TIMING.sub(prefix_timing, svg)
+
+
+def build_sprite(icons: dict[str, str]) -> str:
+    """Lay out icon SVGs, by sprite id, in a row with a <view> per icon."""
+    symbols, views = [], []
+    for i, (name, svg) in enumerate(sorted(icons.items())):
+        root = _SVG_ROOT.search(svg)
+        if root is None:
+            raise ValueError(f"{name} is not an SVG")
+        attributes, body = root.groups()
+        view_box = _VIEW_BOX.search(attributes)
+        view_box = view_box.group(1) if view_box else f'0 0 {ICON_SIZE} {ICON_SIZE}'
+        x = i * ICON_SIZE
+        symbols.append(f'<svg x="{x}" y="0" width="{ICON_SIZE}" height="{ICON_SIZE}" viewBox="{view_box}">'
+                       f'{_prefix_ids(body.strip(), name)}</svg>')
+        views.append(f'<view id="{name}" viewBox="{x} 0 {ICON_SIZE} {ICON_SIZE}"/>')
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" '
+            f'width="{ICON_SIZE}" height="{ICON_SIZE}" viewBox="0 0 {len(icons) * ICON_SIZE} {ICON_SIZE}">'
+            + ''.join(views) + ''.join(symbols) + '</svg>\n')
+
+
+def _read_icons(source: str) -> dict[str, str]:
+    names = sorted({icon.value for icon in WeatherIconMap})
+    if source.startswith('http'):
+        import httpx
+        with httpx.Client(timeout=30) as client:
+            return {name: client.get(f'{source}/{name}.svg').raise_for_status().text for name in names}
+    return {name: (Path(source) / f'{name}.svg').read_text(encoding='utf-8') for name in names}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['build'])
+    parser.add_argument('--source', default=WEATHER_ICON_SOURCE, help='icon set URL or local directory of <name>.svg files')
+    parser.add_argument('--output', default=os.environ.get('WEATHER_ICON_SPRITE_PATH', str(DEFAULT_SPRITE_PATH)))
+    args = parser.parse_args()
+
+    sprite = build_sprite(_read_icons(args.source))
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(sprite, encoding='utf-8')
+    built = IconSprite(sprite.encode())
+    print(f"Wrote {len(built.ids)} icons to {output}: {len(built.content)} bytes, {len(built.compressed)} gzipped")
+
+
+if __name__ == '__main__':
+    main()
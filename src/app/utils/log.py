@@ -0,0 +1,51 @@
+import os
+import sys
+
+from loguru import logger
+
+LOG_FORMAT = (
+    "<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</green> | <level>{level: <8}</level> | "
+    "<magenta>{extra[trace_id]}</magenta> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - "
+    "<level>{message}</level>"
+)
+payload_log_limit = int(os.environ.get('LOG_PAYLOAD_LIMIT', 500))
+log_sample_rate = int(os.environ.get('LOG_SAMPLE_RATE', 100))
+
+_sample_counts: dict[str, int] = {}
+
+
+def configure_logging() -> None:
+    """
+    Log through a queued stderr sink so writing never blocks the event loop.
+    Service-layer hot paths log at DEBUG with deferred formatting, so at the default
+    INFO level (LOG_LEVEL) they cost no more than a level check.
+    """
+    logger.remove()
+    logger.configure(extra={'trace_id': '-'})
+    logger.add(sys.stderr, level=os.environ.get('LOG_LEVEL', 'INFO'), format=LOG_FORMAT, enqueue=True)
+
+
+def truncate(value: object, limit: int = payload_log_limit) -> str:
+    """String form of a (potentially large) payload, cut to `limit` characters."""
+    text = str(value)
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}... ({len(text)} chars)"
+
+
+def sampled(key: str, rate: int = log_sample_rate) -> bool:
+    """True for the first and then every `rate`th call with this key, for high-frequency log lines."""
+    count = _sample_counts.get(key, 0)
+    _sample_counts[key] = count + 1
+    return count % rate == 0
+
+
+def summarise_metservice_response(response_json: dict) -> str:
+    try:
+        points = len(response_json['dimensions']['point']['data'])
+        times = response_json['dimensions']['time']['data']
+        variables = list(response_json['variables'])
+    except (KeyError, TypeError):
+        return truncate(response_json)
+    time_range = f"{times[0]} to {times[-1]}" if times else "no times"
+    return f"{points} point(s), {len(times)} time(s) from {time_range}, variables: {variables}"
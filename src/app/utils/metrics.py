@@ -0,0 +1,130 @@
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Iterator
+
+from loguru import logger
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+registry: list['_Metric'] = []
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        registry.append(self)
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _format_labels(self, key: tuple[str, ...], extra: str = '') -> str:
+        pairs = [f'{name}="{value}"' for name, value in zip(self.labelnames, key)]
+        if extra:
+            pairs.append(extra)
+        return '{' + ','.join(pairs) + '}' if pairs else ''
+
+    def render(self) -> list[str]:
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        with self._lock:
+            for key, value in self._values.items():
+                lines.append(f'{self.name}{self._format_labels(key)} {value}')
+        return lines
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+        self._counts: dict[tuple[str, ...], list[int]] = {}
+        self._sums: dict[tuple[str, ...], float] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * (len(self.buckets) + 1))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            self._sums[key] = self._sums.get(key, 0.0) + value
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        with self._lock:
+            for key, counts in self._counts.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    lines.append(f'{self.name}_bucket{self._format_labels(key, f'le="{bound}"')} {cumulative}')
+                cumulative += counts[-1]
+                lines.append(f'{self.name}_bucket{self._format_labels(key, 'le="+Inf"')} {cumulative}')
+                lines.append(f'{self.name}_sum{self._format_labels(key)} {self._sums[key]}')
+                lines.append(f'{self.name}_count{self._format_labels(key)} {cumulative}')
+        return lines
+
+
+stage_duration = Histogram('weatherbot_stage_duration_seconds', 'Time spent in each stage of the chat pipeline.',
+                           ('stage',))
+stage_errors = Counter('weatherbot_stage_errors_total', 'Stages that raised an exception.', ('stage',))
+cache_requests = Counter('weatherbot_cache_requests_total', 'Cache lookups by cache and result.',
+                         ('cache', 'result'))
+upstream_bytes = Counter('weatherbot_upstream_bytes_total', 'Response bytes received from upstream APIs.',
+                         ('upstream',))
+offloaded_stages = Counter('weatherbot_offloaded_stages_total', 'CPU-bound stages by where they ran (inline or executor mode).',
+                           ('stage', 'mode'))
+llm_tokens = Counter('weatherbot_llm_tokens_total', 'OpenAI tokens used by call and token type.', ('call', 'kind'))
+loop_lag = Histogram('weatherbot_event_loop_lag_seconds', 'How late the event loop ran a timer, sampled continuously.',
+                     buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+slow_callbacks = Counter('weatherbot_slow_callbacks_total', 'Times the event loop was blocked for longer than the slow callback threshold.')
+
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Time a pipeline stage into weatherbot_stage_duration_seconds."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        stage_errors.inc(stage=stage)
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        stage_duration.observe(duration, stage=stage)
+        logger.debug("{} took {:.1f}ms", stage, duration * 1000)
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    return '\n'.join(line for metric in registry for line in metric.render()) + '\n'
@@ -0,0 +1,179 @@
+"""
+Production-safe views into where the process spends its time.
+
+SamplingProfiler reads every thread's stack from a background thread at a fixed interval, so the code being
+profiled runs untouched (no tracing hooks) and the cost is one short stack walk per sample. The report is in the
+collapsed-stack format read by flamegraph.pl, speedscope and inferno: one `frame;frame;frame count` line per stack.
+
+LoopLagMonitor keeps a heartbeat on the event loop and a watchdog thread beside it. When the heartbeat falls
+behind by more than the threshold, the watchdog captures the loop thread's stack while it is still blocked, and
+logs it once the loop recovers, with how long it was blocked.
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter as StackCounter
+from types import CodeType, FrameType
+from typing import Optional
+
+from loguru import logger
+
+from utils.metrics import loop_lag, slow_callbacks
+
+
+def _frame_label(code: CodeType, labels: dict[CodeType, str]) -> str:
+    label = labels.get(code)
+    if label is None:
+        path = code.co_filename.replace('\\', '/').rsplit('/', 2)
+        label = labels[code] = f"{code.co_qualname} ({'/'.join(path[-2:])}:{code.co_firstlineno})"
+    return label
+
+
+def collapse_stack(frame: Optional[FrameType], labels: dict[CodeType, str]) -> list[str]:
+    """Frame labels from the outermost call to the innermost, labels being cached per code object."""
+    stack = []
+    while frame is not None:
+        stack.append(_frame_label(frame.f_code, labels))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+class ProfilerBusyError(RuntimeError):
+    pass
+
+
+class SamplingProfiler:
+    """Samples every thread's stack, one profile at a time per process."""
+    def __init__(self, max_seconds: float = 60, min_interval: float = 0.001) -> None:
+        self.max_seconds = max_seconds
+        self.min_interval = min_interval
+        self._lock = asyncio.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    async def profile(self, seconds: float, interval: float = 0.01) -> str:
+        """
+        Sample for `seconds` (at most max_seconds) every `interval` seconds and return the collapsed stacks,
+        each prefixed with its thread's name. Raises ProfilerBusyError if a profile is already running.
+        """
+        if self.running:
+            raise ProfilerBusyError("A profile is already running")
+        seconds = min(max(seconds, 0), self.max_seconds)
+        interval = max(interval, self.min_interval)
+        async with self._lock:
+            stop = threading.Event()
+            stacks: StackCounter[str] = StackCounter()
+            sampler = threading.Thread(target=self._sample, args=(interval, stop, stacks), name='profiler', daemon=True)
+            logger.info(f"Profiling for {seconds}s every {interval * 1000:.1f}ms")
+            sampler.start()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                stop.set()
+                await asyncio.to_thread(sampler.join)
+            logger.info(f"Profile finished with {sum(stacks.values())} stack samples")
+            return ''.join(f'{stack} {count}\n' for stack, count in stacks.most_common())
+
+    @staticmethod
+    def _sample(interval: float, stop: threading.Event, stacks: StackCounter[str]) -> None:
+        labels: dict[CodeType, str] = {}
+        own_id = threading.get_ident()
+        next_sample = time.perf_counter()
+        while not stop.is_set():
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            frames = sys._current_frames()
+            for thread_id, frame in frames.items():
+                if thread_id != own_id:
+                    stacks[';'.join([names.get(thread_id, str(thread_id)), *collapse_stack(frame, labels)])] += 1
+            # Don't keep the sampled threads' frames, and everything they reference, alive until the next sample
+            frames = frame = None
+            # Keep to the schedule rather than drifting by the time each sample takes
+            next_sample += interval
+            stop.wait(max(next_sample - time.perf_counter(), 0))
+
+
+class LoopLagMonitor:
+    """
+    Records event-loop lag into weatherbot_event_loop_lag_seconds every `interval` seconds and logs the stack of
+    anything blocking the loop for longer than `threshold` seconds, at most one stack every `report_interval`.
+    """
+    def __init__(self, interval: float = 0.1, threshold: float = 0.25, report_interval: float = 10) -> None:
+        self.interval = interval
+        self.threshold = threshold
+        self.report_interval = report_interval
+        self._last_beat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._heartbeat: Optional[asyncio.Task] = None
+        self._stop = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold > 0
+
+    async def start(self) -> None:
+        if not self.enabled or self._heartbeat is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self._heartbeat = asyncio.create_task(self._beat())
+        self._watchdog = threading.Thread(target=self._watch, name='loop-watchdog', daemon=True)
+        self._watchdog.start()
+        logger.info(f"Monitoring event-loop lag every {self.interval * 1000:.0f}ms, "
+                    f"logging callbacks blocking it for over {self.threshold * 1000:.0f}ms")
+
+    async def stop(self) -> None:
+        if self._heartbeat is None:
+            return
+        self._stop.set()
+        self._heartbeat.cancel()
+        self._heartbeat = None
+        await asyncio.to_thread(self._watchdog.join)
+        self._watchdog = None
+
+    async def _beat(self) -> None:
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(self.interval)
+            self._last_beat = time.monotonic()
+            loop_lag.observe(max(self._last_beat - start - self.interval, 0))
+
+    def _watch(self) -> None:
+        blocked_for = 0.0
+        stack: Optional[list[str]] = None
+        last_report = 0.0
+        while not self._stop.wait(self.interval):
+            behind = time.monotonic() - self._last_beat - self.interval
+            if behind >= self.threshold:
+                if stack is None:
+                    # Captured while the loop is still blocked, so it shows the callback responsible
+                    frame = sys._current_frames().get(self._loop_thread_id)
+                    stack = traceback.format_stack(frame) if frame is not None else []
+                    del frame
+                blocked_for = behind
+                continue
+            if stack is None:
+                continue
+            slow_callbacks.inc()
+            now = time.monotonic()
+            if now - last_report >= self.report_interval:
+                last_report = now
+                logger.warning("Event loop blocked for at least {:.0f}ms in:\n{}", blocked_for * 1000, ''.join(stack).rstrip())
+            stack = None
+
+
+def get_loop_lag_monitor() -> LoopLagMonitor:
+    return LoopLagMonitor(interval=float(os.environ.get('LOOP_MONITOR_INTERVAL', 0.1)),
+                          threshold=float(os.environ.get('LOOP_SLOW_CALLBACK_THRESHOLD', 0.25)),
+                          report_interval=float(os.environ.get('LOOP_SLOW_CALLBACK_REPORT_INTERVAL', 10)))
+
+
+profiler = SamplingProfiler(max_seconds=float(os.environ.get('PROFILE_MAX_SECONDS', 60)))
+loop_lag_monitor = get_loop_lag_monitor()
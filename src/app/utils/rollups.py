@@ -0,0 +1,45 @@
+import math
+from collections import Counter
+from collections.abc import Sequence
+
+COMPASS_POINTS = ('N', 'NE', 'E', 'SE', 'S', 'SW', 'W', 'NW')
+
+
+def dominant_direction(directions: Sequence[float]) -> float:
+    """Centre, in degrees, of the compass point (N, NE, ...) the directions fall in most often."""
+    sectors = Counter(round(direction % 360 / 45) % len(COMPASS_POINTS) for direction in directions)
+    return sectors.most_common(1)[0][0] * 45.0
+
+
+def compass_point(direction: float) -> str:
+    return COMPASS_POINTS[round(direction % 360 / 45) % len(COMPASS_POINTS)]
+
+
+def aggregate(values: Sequence[float], method: str, interval_hours: float | Sequence[float] = 1) -> float:
+    """
+    Reduce a variable's values over a day or period with one of:
+    'min', 'max', 'mean', 'total' (a rate summed over time, e.g. mm/h to mm) or 'dominant' (direction).
+    interval_hours is the time each value stands for, or a list of them when values are unevenly spaced.
+    """
+    if method == 'min':
+        return min(values)
+    if method == 'max':
+        return max(values)
+    if method == 'mean':
+        return round(math.fsum(values) / len(values), 2)
+    if method == 'total':
+        if isinstance(interval_hours, Sequence):
+            return round(math.fsum(value * hours for value, hours in zip(values, interval_hours)), 2)
+        return round(math.fsum(values) * interval_hours, 2)
+    if method == 'dominant':
+        return dominant_direction(values)
+    raise ValueError(f"Unknown rollup method: {method}")
+
+
+def format_aggregate(method: str, value: float, units: str) -> str:
+    """Human-readable aggregate for the LLM prompt, e.g. 'max 18.2C', 'total 4.5mm', 'dominant SW'."""
+    if method == 'dominant':
+        return f"dominant {compass_point(value)}"
+    if method == 'total' and units.endswith('/h'):
+        return f"total {value}{units[:-2]}"
+    return f"{method} {value}{units}"
@@ -0,0 +1,100 @@
+import math
+from collections import defaultdict
+from collections.abc import Hashable
+from typing import Optional
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE_LATITUDE = 111.32
+
+
+def haversine_km(latitude_1: float, longitude_1: float, latitude_2: float, longitude_2: float) -> float:
+    phi_1, phi_2 = math.radians(latitude_1), math.radians(latitude_2)
+    d_phi = phi_2 - phi_1
+    d_lambda = math.radians(longitude_2 - longitude_1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi_1) * math.cos(phi_2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+class SpatialIndex:
+    """
+    Points bucketed into a grid of roughly `cell_km` square cells, so a radius search only looks at
+    the cells around the query point instead of every point.
+    """
+    def __init__(self, cell_km: float = 10.0) -> None:
+        self.cell_degrees = cell_km / KM_PER_DEGREE_LATITUDE
+        self._cells: dict[tuple[int, int], dict[Hashable, tuple[float, float]]] = defaultdict(dict)
+
+    def _cell(self, latitude: float, longitude: float) -> tuple[int, int]:
+        return math.floor(latitude / self.cell_degrees), math.floor(longitude / self.cell_degrees)
+
+    def add(self, latitude: float, longitude: float, item: Hashable) -> None:
+        self._cells[self._cell(latitude, longitude)][item] = (latitude, longitude)
+
+    def nearby(self, latitude: float, longitude: float, radius_km: float) -> list[tuple[float, Hashable]]:
+        """(distance in km, item) for every item within radius_km, nearest first."""
+        # Longitude degrees shrink towards the poles, so search proportionally more cells east-west
+        lat_cells = math.ceil(radius_km / KM_PER_DEGREE_LATITUDE / self.cell_degrees)
+        lon_scale = max(math.cos(math.radians(latitude)), 0.01)
+        lon_cells = math.ceil(radius_km / (KM_PER_DEGREE_LATITUDE * lon_scale) / self.cell_degrees)
+        cell_lat, cell_lon = self._cell(latitude, longitude)
+
+        matches = []
+        for i in range(cell_lat - lat_cells, cell_lat + lat_cells + 1):
+            for j in range(cell_lon - lon_cells, cell_lon + lon_cells + 1):
+                for item, (item_latitude, item_longitude) in self._cells.get((i, j), {}).items():
+                    distance = haversine_km(latitude, longitude, item_latitude, item_longitude)
+                    if distance <= radius_km:
+                        matches.append((distance, item))
+        return sorted(matches, key=lambda match: match[0])
+
+    def __len__(self) -> int:
+        return sum(len(cell) for cell in self._cells.values())
+
+
+class KDTree:
+    """
+    Static 2-d tree over (latitude, longitude) points for nearest-neighbour lookups.
+    Points are projected onto a flat plane around their mean latitude, which is accurate enough
+    to find the nearest point across a country the size of New Zealand.
+    """
+    def __init__(self, points: list[tuple[float, float]]) -> None:
+        self.points = points
+        self._reference_scale = math.cos(math.radians(sum(latitude for latitude, _ in points) / len(points))) if points else 1.0
+        self._projected = [self._project(latitude, longitude) for latitude, longitude in points]
+        self._root = self._build(list(range(len(points))), depth=0)
+
+    def _project(self, latitude: float, longitude: float) -> tuple[float, float]:
+        return latitude * KM_PER_DEGREE_LATITUDE, longitude * KM_PER_DEGREE_LATITUDE * self._reference_scale
+
+    def _build(self, indices: list[int], depth: int) -> Optional[tuple]:
+        if not indices:
+            return None
+        axis = depth % 2
+        indices.sort(key=lambda i: self._projected[i][axis])
+        median = len(indices) // 2
+        return (indices[median], axis,
+                self._build(indices[:median], depth + 1), self._build(indices[median + 1:], depth + 1))
+
+    def nearest(self, latitude: float, longitude: float) -> Optional[tuple[float, int]]:
+        """(distance in km, index into points) of the nearest point, or None if the tree is empty."""
+        if self._root is None:
+            return None
+        target = self._project(latitude, longitude)
+        best_squared, best_index = math.inf, -1
+        # Each entry carries the squared distance to its splitting plane, the least any point in it can be away
+        stack = [(self._root, 0.0)]
+        while stack:
+            node, bound = stack.pop()
+            if node is None or bound >= best_squared:
+                continue
+            index, axis, left, right = node
+            point = self._projected[index]
+            squared = (point[0] - target[0]) ** 2 + (point[1] - target[1]) ** 2
+            if squared < best_squared:
+                best_squared, best_index = squared, index
+            difference = target[axis] - point[axis]
+            near, far = (left, right) if difference < 0 else (right, left)
+            # Push the far side first so the near side is searched first
+            stack.append((far, difference ** 2))
+            stack.append((near, bound))
+        return haversine_km(latitude, longitude, *self.points[best_index]), best_index
@@ -0,0 +1,111 @@
+"""
+Runs the app as several worker processes behind a small TCP proxy.
+
+NiceGUI keeps each page's client (and its websocket) in the process that rendered the page,
+so every request from a browser has to reach the same worker. Connections are pinned by
+client IP: the first address in X-Forwarded-For when behind a router, else the peer address.
+
+The worker is chosen from the first request on each TCP connection, and every later request on
+that keep-alive connection goes to the same worker. Behind a router that pools upstream
+connections across clients, a client's requests can therefore reach the wrong worker; configure
+the router to open a connection per client (e.g. nginx's default, without upstream keepalive).
+"""
+import asyncio
+import hashlib
+import os
+import signal
+import subprocess
+import sys
+from typing import Optional
+
+from loguru import logger
+
+HEADER_LIMIT = 64 * 1024
+
+
+def worker_ports(port: int, workers: int) -> list[int]:
+    return [port + i + 1 for i in range(workers)]
+
+
+def _affinity_key(head: bytes, peer: Optional[tuple]) -> str:
+    for line in head.split(b'\r\n')[1:]:
+        name, _, value = line.partition(b':')
+        if name.strip().lower() == b'x-forwarded-for':
+            return value.split(b',')[0].strip().decode(errors='ignore')
+    return peer[0] if peer else ''
+
+
+def _pick_worker(key: str, ports: list[int]) -> int:
+    digest = hashlib.sha1(key.encode()).digest()
+    return ports[int.from_bytes(digest[:4], 'big') % len(ports)]
+
+
+async def _pipe(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        while data := await reader.read(65536):
+            writer.write(data)
+            await writer.drain()
+    except (ConnectionError, asyncio.CancelledError):
+        pass
+    finally:
+        writer.close()
+
+
+async def _handle_connection(client_reader: asyncio.StreamReader, client_writer: asyncio.StreamWriter, ports: list[int]) -> None:
+    try:
+        head = await client_reader.readuntil(b'\r\n\r\n')
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+        client_writer.close()
+        return
+
+    port = _pick_worker(_affinity_key(head, client_writer.get_extra_info('peername')), ports)
+    try:
+        upstream_reader, upstream_writer = await asyncio.open_connection('127.0.0.1', port)
+    except OSError as e:
+        logger.error(f"Worker on port {port} unavailable: {e}")
+        client_writer.close()
+        return
+
+    # Later requests on this connection are piped through unread, so they stay on this worker
+    upstream_writer.write(head)
+    try:
+        await asyncio.gather(_pipe(client_reader, upstream_writer), _pipe(upstream_reader, client_writer))
+    except asyncio.CancelledError:
+        upstream_writer.close()
+        client_writer.close()
+
+
+async def serve_proxy(host: str, port: int, ports: list[int]) -> None:
+    server = await asyncio.start_server(
+        lambda reader, writer: _handle_connection(reader, writer, ports), host=host, port=port, limit=HEADER_LIMIT)
+    logger.info(f"Routing {host}:{port} to workers on ports {ports}")
+    async with server:
+        await server.serve_forever()
+
+
+def _raise_interrupt(signum, frame) -> None:
+    raise KeyboardInterrupt
+
+
+def run_workers(host: str, port: int, workers: int, argv: list[str]) -> None:
+    """
+    Start `workers` copies of the app (`python argv...`) on internal ports and
+    route incoming connections to them with client-IP affinity.
+    Each worker gets its own port in WORKER_PORT.
+    """
+    ports = worker_ports(port, workers)
+    processes = [
+        subprocess.Popen([sys.executable, *argv], env={**os.environ, 'WORKER_PORT': str(worker_port)})
+        for worker_port in ports
+    ]
+    logger.info(f"Started {workers} workers")
+    signal.signal(signal.SIGTERM, _raise_interrupt)
+    try:
+        asyncio.run(serve_proxy(host=host, port=port, ports=ports))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            process.send_signal(signal.SIGTERM)
+        for process in processes:
+            process.wait()
@@ -0,0 +1,7 @@
+import os
+import sys
+from pathlib import Path
+
+# The app imports its modules relative to src/app, as it does when run from there
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src' / 'app'))
+os.environ.setdefault('OPENAI_API_KEY', 'test')
@@ -0,0 +1,112 @@
+import asyncio
+import contextlib
+from types import SimpleNamespace
+
+import service.admission_service as admission_service_module
+from service.admission_service import AdmissionService
+
+
+class StubPipeline:
+    """Records which queries ran, finished or were cancelled, and how many ran at once."""
+    def __init__(self, duration: float = 0.05) -> None:
+        self.duration = duration
+        self.started: list[str] = []
+        self.finished: list[str] = []
+        self.cancelled: list[str] = []
+        self.active = 0
+        self.max_active = 0
+
+    async def __call__(self, query: str) -> None:
+        self.started.append(query)
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.duration)
+        except asyncio.CancelledError:
+            self.cancelled.append(query)
+            raise
+        finally:
+            self.active -= 1
+        self.finished.append(query)
+
+
+def _patch_nicegui(monkeypatch, slots: int = 8) -> list[str]:
+    notifications = []
+    monkeypatch.setattr(admission_service_module, 'context', SimpleNamespace(slot=contextlib.nullcontext()))
+    monkeypatch.setattr(admission_service_module, 'ui', SimpleNamespace(notify=notifications.append))
+    monkeypatch.setattr(admission_service_module, 'pipeline_slots', asyncio.Semaphore(slots))
+    return notifications
+
+
+async def _no_spinner(show_spinner: bool) -> None:
+    pass
+
+
+async def _drain(admission: AdmissionService) -> None:
+    while admission._task is not None and not admission._task.done():
+        await admission._task
+
+
+def test_queue_policy_runs_messages_in_order_and_drops_duplicates(monkeypatch):
+    _patch_nicegui(monkeypatch)
+    pipeline = StubPipeline()
+
+    async def scenario():
+        admission = AdmissionService(pipeline=pipeline, on_busy=_no_spinner, policy='queue')
+        for query in ['rain in Nelson', 'wind in Napier', 'rain in Nelson', 'wind in Napier', 'sun in Picton']:
+            await admission.submit(query)
+            await asyncio.sleep(0)
+        await _drain(admission)
+        return admission
+
+    admission = asyncio.run(scenario())
+    assert pipeline.started == ['rain in Nelson', 'wind in Napier', 'sun in Picton']
+    assert pipeline.finished == pipeline.started
+    assert pipeline.cancelled == []
+    assert pipeline.max_active == 1
+    assert admission.active_query is None
+
+
+def test_cancel_policy_replaces_active_message(monkeypatch):
+    _patch_nicegui(monkeypatch)
+    pipeline = StubPipeline()
+
+    async def scenario():
+        admission = AdmissionService(pipeline=pipeline, on_busy=_no_spinner, policy='cancel')
+        await admission.submit('rain in Nelson')
+        await asyncio.sleep(0.01)
+        await admission.submit('rain in Nelson')
+        await admission.submit('wind in Napier')
+        await _drain(admission)
+        return admission
+
+    admission = asyncio.run(scenario())
+    assert pipeline.started == ['rain in Nelson', 'wind in Napier']
+    assert pipeline.cancelled == ['rain in Nelson']
+    assert pipeline.finished == ['wind in Napier']
+    assert admission.active_query is None
+
+
+def test_pipeline_slots_cap_concurrent_sessions(monkeypatch):
+    notifications = _patch_nicegui(monkeypatch, slots=2)
+    pipeline = StubPipeline()
+    spinner_calls = []
+
+    async def on_busy(show_spinner: bool) -> None:
+        spinner_calls.append(show_spinner)
+
+    async def scenario():
+        sessions = [AdmissionService(pipeline=pipeline, on_busy=on_busy, policy=policy)
+                    for policy in ['queue', 'cancel', 'queue', 'cancel']]
+        for i, admission in enumerate(sessions):
+            await admission.submit(f'rain in town {i}')
+            await asyncio.sleep(0)
+        for admission in sessions:
+            await _drain(admission)
+
+    asyncio.run(scenario())
+    assert sorted(pipeline.finished) == [f'rain in town {i}' for i in range(4)]
+    assert pipeline.max_active == 2
+    assert len(notifications) == 2
+    assert spinner_calls.count(True) == 2
+    assert spinner_calls.count(False) == 4
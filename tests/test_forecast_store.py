@@ -0,0 +1,43 @@
+import asyncio
+
+from service.forecast_store import ForecastStore
+
+TIMES = ['2024-05-02T00:00:00Z', '2024-05-02T06:00:00Z']
+
+
+def _store(tmp_path) -> ForecastStore:
+    return ForecastStore(path=str(tmp_path / 'forecasts.sqlite3'), max_age=3600, flush_interval=0)
+
+
+async def _write(store: ForecastStore, variables: list[str]) -> None:
+    store.write(-36.85, 174.76, TIMES, {variable: {'units': 'K', 'data': [280.0, 281.0]} for variable in variables})
+    await store._flush_task
+
+
+def test_read_returns_stored_values(tmp_path):
+    async def run():
+        store = _store(tmp_path)
+        await _write(store, ['air.temperature.at-2m', 'precipitation.rate'])
+        return await store.read(-36.85, 174.76, TIMES, ['air.temperature.at-2m', 'precipitation.rate'])
+
+    variables_data, _ = asyncio.run(run())
+    assert variables_data['air.temperature.at-2m'] == {'units': 'K', 'data': [280.0, 281.0]}
+
+
+def test_read_with_repeated_variables(tmp_path):
+    # Multi-type queries used to request shared variables once per type, so the row count never matched
+    async def run():
+        store = _store(tmp_path)
+        await _write(store, ['air.temperature.at-2m'])
+        return await store.read(-36.85, 174.76, TIMES, ['air.temperature.at-2m', 'air.temperature.at-2m'])
+
+    assert asyncio.run(run()) is not None
+
+
+def test_read_missing_variable(tmp_path):
+    async def run():
+        store = _store(tmp_path)
+        await _write(store, ['air.temperature.at-2m'])
+        return await store.read(-36.85, 174.76, TIMES, ['air.temperature.at-2m', 'precipitation.rate'])
+
+    assert asyncio.run(run()) is None
@@ -0,0 +1,23 @@
+from utils.icons import IconSprite, build_sprite
+
+SPRITE = IconSprite(build_sprite({'clear-day': '<svg viewBox="0 0 64 64"><circle cx="32" cy="32" r="11"/></svg>'}).encode())
+
+
+def test_response_gzipped_when_accepted():
+    response = SPRITE.response(accept_encoding='gzip, br')
+    assert response.status_code == 200
+    assert response.headers['content-encoding'] == 'gzip'
+    assert response.body == SPRITE.compressed
+
+
+def test_not_modified_when_etag_matches():
+    etag = SPRITE.response(accept_encoding='gzip').headers['etag']
+    response = SPRITE.response(accept_encoding='gzip', if_none_match=f'"other", W/{etag}')
+    assert response.status_code == 304
+    assert response.body == b''
+    assert response.headers['etag'] == etag
+
+
+def test_etag_differs_by_encoding():
+    etag = SPRITE.response(accept_encoding='gzip').headers['etag']
+    assert SPRITE.response(if_none_match=etag).status_code == 200
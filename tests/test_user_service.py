@@ -0,0 +1,47 @@
+import asyncio
+import contextlib
+from types import SimpleNamespace
+
+import service.user_service as user_service_module
+from service.user_service import UserService
+
+
+def _acquire(monkeypatch, responses) -> tuple[UserService, list]:
+    """Run a location lookup against a browser that answers with `responses` in turn."""
+    calls = []
+
+    async def run_javascript(code, timeout):
+        response = responses[len(calls)]
+        calls.append(code)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    async def connected(timeout):
+        pass
+
+    async def reverse_geocode(latitude, longitude):
+        return f'{latitude},{longitude}'
+
+    monkeypatch.setenv('USER_LOCATION_RETRY_DELAY', '0')
+    monkeypatch.setattr(user_service_module, 'ui', SimpleNamespace(run_javascript=run_javascript))
+    monkeypatch.setattr(user_service_module, 'context', SimpleNamespace(client=SimpleNamespace(connected=connected)))
+    user_service = UserService()
+    asyncio.run(user_service._acquire_location(reverse_geocode=reverse_geocode, slot=contextlib.nullcontext()))
+    return user_service, calls
+
+
+def test_location_not_requested_again_after_permission_denied(monkeypatch):
+    user_service, calls = _acquire(monkeypatch, [{'error': 'User denied Geolocation', 'denied': True}])
+    assert len(calls) == 1
+    assert user_service.cached_location() is None
+
+
+def test_failed_location_requests_are_retried(monkeypatch):
+    user_service, calls = _acquire(monkeypatch, [
+        ConnectionError('client disconnected'),
+        None,
+        {'latitude': -36.85, 'longitude': 174.76},
+    ])
+    assert len(calls) == 3
+    assert user_service.cached_location() == '-36.85,174.76'
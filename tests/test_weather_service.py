@@ -0,0 +1,213 @@
+import asyncio
+import time
+from array import array
+from datetime import date, time as dt_time
+from types import SimpleNamespace
+
+import service.weather_service as weather_service_module
+from models import MetservicePeriodSummary, MetservicePointTimeRequest, QueryClassification
+from service.weather_service import WeatherService
+from utils.columnar import day_rollups
+from utils.constants import QueryPeriodsEnum, QueryTypesEnum, WeatherVarMap, query_variable_map
+
+
+def test_request_variables_are_unique():
+    # Temperature is also a general weather variable, and must only be requested once
+    async def run():
+        weather_service = WeatherService()
+
+        async def lat_lon(location: str) -> tuple[float, float]:
+            return -36.85, 174.76
+        weather_service._location_to_lat_lon = lat_lon
+        classification = QueryClassification(query_type=[QueryTypesEnum.GENERAL_WEATHER, QueryTypesEnum.TEMPERATURE],
+                                              locations=['Auckland'], query_from_date=date(2024, 5, 2),
+                                              query_to_date=date(2024, 5, 2), query_period=[QueryPeriodsEnum.WHOLE_DAY])
+        return await weather_service._create_API_request(classification, [date(2024, 5, 2)], set(classification.query_type))
+
+    variables = asyncio.run(run()).variables
+    assert len(variables) == len(set(variables))
+    assert WeatherVarMap.temp.value in variables
+
+
+class _ResponseCache:
+    def __init__(self, response_json: dict) -> None:
+        self.response_json = response_json
+
+    async def get(self, key: str) -> dict:
+        return self.response_json
+
+    async def set(self, key: str, value, ttl=None) -> None:
+        pass
+
+
+def test_responses_matched_to_requests_by_point_order(monkeypatch):
+    # The API snaps points to its grid, so response coordinates need not match the requested ones
+    response_json = {
+        'dimensions': {
+            'point': {'data': [{'lat': -36.8, 'lon': 174.8}, {'lat': -41.3, 'lon': 174.8}]},
+            'time': {'data': ['2024-05-02T00:00:00Z']},
+        },
+        'variables': {WeatherVarMap.temp.value: {'units': 'degreeC', 'data': [18.0, 12.0]}},
+    }
+    monkeypatch.setattr(weather_service_module, 'cache', _ResponseCache(response_json))
+    monkeypatch.setattr(weather_service_module, 'forecast_store', None)
+    requests = [MetservicePointTimeRequest(latitude=latitude, longitude=longitude, variables=[WeatherVarMap.temp.value],
+                                           from_datetime='2024-05-02T00:00:00Z', interval='1h', repeat=0)
+                for latitude, longitude in [(-36.8485, 174.7633), (-41.2866, 174.7756), (-36.8485, 174.7633)]]
+
+    auckland, wellington, auckland_again = asyncio.run(WeatherService()._metservice_api_call(requests))
+    temperatures = [response[0].hour_summaries[0].variables[0].value for response in (auckland, wellington, auckland_again)]
+    assert temperatures == [18.0, 12.0, 18.0]
+    assert auckland[0] is not auckland_again[0]
+
+
+def _stored_day(location: str, latitude: float, longitude: float) -> MetservicePeriodSummary:
+    return MetservicePeriodSummary(
+        weather_data_types=[QueryTypesEnum.SEA_BOAT_SURF_FISHING], period_types=[QueryPeriodsEnum.WHOLE_DAY],
+        date=date(2024, 5, 2), latitude=latitude, longitude=longitude, location=location, fetched_at=time.time(),
+        hour_summaries=[{'hour': dt_time(hour), 'variables': [
+            {'name': variable.value, 'value': 1.0, 'units': 'm'} for variable in query_variable_map[QueryTypesEnum.SEA_BOAT_SURF_FISHING]]}
+            for hour in range(24)])
+
+
+def _sea_query(location: str) -> QueryClassification:
+    return QueryClassification(query_type=[QueryTypesEnum.SEA_BOAT_SURF_FISHING], locations=[location],
+                               query_from_date=date(2024, 5, 2), query_to_date=date(2024, 5, 2),
+                               query_period=[QueryPeriodsEnum.WHOLE_DAY])
+
+
+def _weather_service_near_beach(distance_degrees: float) -> WeatherService:
+    weather_service = WeatherService()
+    weather_service.data_store.append(_stored_day('Beach', -36.85, 174.76))
+    weather_service.location_index.add(-36.85, 174.76, 'Beach')
+
+    async def lat_lon(location: str) -> tuple[float, float]:
+        return (-36.85, 174.76) if location == 'Beach' else (-36.85 - distance_degrees, 174.76)
+    weather_service._location_to_lat_lon = lat_lon
+    return weather_service
+
+
+def test_marine_variables_not_reused_from_beyond_marine_tolerance():
+    # About 3km away: inside the 5km tolerance for air and rain, outside the 1km one for the sea
+    weather_service = _weather_service_near_beach(0.027)
+    dates, query_types, hours = asyncio.run(weather_service._check_data_store(_sea_query('Harbour')))
+
+    assert dates == [date(2024, 5, 2)]
+    assert query_types == {QueryTypesEnum.SEA_BOAT_SURF_FISHING}
+    assert hours == list(range(24))
+    copied = next(data for data in weather_service.data_store if data.location == 'Harbour')
+    names = {variable.name for variable in copied.hour_summaries[0].variables}
+    assert WeatherVarMap.wave_height.value not in names
+    assert WeatherVarMap.temp.value in names
+    assert QueryTypesEnum.SEA_BOAT_SURF_FISHING not in copied.weather_data_types
+
+
+def test_marine_variables_reused_from_within_marine_tolerance():
+    weather_service = _weather_service_near_beach(0.005)
+    assert asyncio.run(weather_service._check_data_store(_sea_query('Harbour')))[0] == []
+
+
+def test_geocoding_is_rate_limited_across_sessions(monkeypatch):
+    monkeypatch.setattr(weather_service_module, 'cache', _ResponseCache(None))
+    monkeypatch.setattr(weather_service_module, 'gazetteer', None)
+    calls = []
+
+    class Geolocator:
+        async def geocode(self, location: str, **kwargs):
+            calls.append(time.monotonic())
+            return SimpleNamespace(latitude=-36.85, longitude=174.76)
+
+    sessions = [WeatherService(), WeatherService()]
+    for weather_service in sessions:
+        weather_service.geolocator = Geolocator()
+
+    async def run():
+        await asyncio.gather(*(weather_service._location_to_lat_lon(location)
+                               for weather_service in sessions for location in ('Somewhere', 'Elsewhere')))
+
+    asyncio.run(run())
+    calls.sort()
+    assert len(calls) == 4
+    assert all(later - earlier >= 0.95 for earlier, later in zip(calls, calls[1:]))
+
+
+def _parsed_day(hours: list[int], temp: float, rain: float, period: QueryPeriodsEnum, fetched_at: float,
+                extra: dict[str, float] | None = None) -> MetservicePeriodSummary:
+    """A day as _clean_metservice_points returns it, with its rollups computed from its own cells."""
+    values = {WeatherVarMap.temp.value: temp, WeatherVarMap.rain.value: rain, **(extra or {})}
+    columns = {name: array('d', [value] * len(hours)) for name, value in values.items()}
+    return MetservicePeriodSummary(
+        weather_data_types=[QueryTypesEnum.GENERAL_WEATHER], period_types=[period], date=date(2024, 5, 2),
+        latitude=-36.85, longitude=174.76, fetched_at=fetched_at,
+        hour_summaries=[{'hour': dt_time(hour), 'variables': [
+            {'name': name, 'value': value, 'units': 'mm/h' if name == WeatherVarMap.rain.value else 'C'}
+            for name, value in values.items()]} for hour in hours],
+        rollups=day_rollups([dt_time(hour) for hour in hours], columns))
+
+
+def _general_query(period: QueryPeriodsEnum) -> QueryClassification:
+    return QueryClassification(query_type=[QueryTypesEnum.GENERAL_WEATHER], locations=['Auckland'],
+                               query_from_date=date(2024, 5, 2), query_to_date=date(2024, 5, 2), query_period=[period])
+
+
+def _cells(data: MetservicePeriodSummary, name: str) -> dict[int, float]:
+    return {hour_summary.hour.hour: variable.value for hour_summary in data.hour_summaries
+            for variable in hour_summary.variables if variable.name == name}
+
+
+def test_refresh_overwrites_cells_and_recomputes_rollups():
+    temp, rain, humidity = WeatherVarMap.temp.value, WeatherVarMap.rain.value, WeatherVarMap.humidity.value
+
+    async def run():
+        weather_service = WeatherService()
+        await weather_service._store_weather_data(
+            [_parsed_day(list(range(24)), temp=10.0, rain=0.0, period=QueryPeriodsEnum.WHOLE_DAY, fetched_at=100.0)],
+            _general_query(QueryPeriodsEnum.WHOLE_DAY))
+        # Only the afternoon comes back, with a variable the entry never held
+        refreshed = _parsed_day(list(range(12, 18)), temp=20.0, rain=0.5, period=QueryPeriodsEnum.AFTERNOON,
+                                fetched_at=200.0, extra={humidity: 80.0})
+        await weather_service._update_stored_data([refreshed], location='Auckland')
+        return weather_service.data_store
+
+    [stored] = asyncio.run(run())
+    assert _cells(stored, temp) == {hour: 20.0 if 12 <= hour < 18 else 10.0 for hour in range(24)}
+    assert _cells(stored, rain) == {hour: 0.5 if 12 <= hour < 18 else 0.0 for hour in range(24)}
+    assert _cells(stored, humidity) == {}
+    assert stored.fetched_at == 200.0
+    assert stored.period_types == [QueryPeriodsEnum.WHOLE_DAY]
+
+    whole_day = stored.rollups[QueryPeriodsEnum.WHOLE_DAY]
+    assert whole_day[temp] == {'min': 10.0, 'max': 20.0, 'mean': 12.5}
+    assert whole_day[rain] == {'total': 3.0, 'max': 0.5}
+    assert humidity not in whole_day
+    assert stored.rollups[QueryPeriodsEnum.AFTERNOON][temp] == {'min': 20.0, 'max': 20.0, 'mean': 20.0}
+    assert stored.rollups[QueryPeriodsEnum.MORNING][rain] == {'total': 0.0, 'max': 0.0}
+
+
+def test_merge_adds_hours_and_recomputes_rollups():
+    temp, rain = WeatherVarMap.temp.value, WeatherVarMap.rain.value
+
+    async def run():
+        weather_service = WeatherService()
+        await weather_service._store_weather_data(
+            [_parsed_day([0, 6, 12, 18], temp=10.0, rain=1.0, period=QueryPeriodsEnum.MULTIPLE_DAYS, fetched_at=100.0)],
+            _general_query(QueryPeriodsEnum.MULTIPLE_DAYS))
+        await weather_service._store_weather_data(
+            [_parsed_day(list(range(12, 18)), temp=16.0, rain=0.5, period=QueryPeriodsEnum.AFTERNOON, fetched_at=200.0)],
+            _general_query(QueryPeriodsEnum.AFTERNOON))
+        return weather_service.data_store
+
+    [stored] = asyncio.run(run())
+    assert _cells(stored, temp) == {0: 10.0, 6: 10.0, 12: 16.0, 13: 16.0, 14: 16.0, 15: 16.0, 16: 16.0, 17: 16.0, 18: 10.0}
+    assert [hour_summary.hour.hour for hour_summary in stored.hour_summaries] == [0, 6, 12, 13, 14, 15, 16, 17, 18]
+    assert stored.period_types == [QueryPeriodsEnum.MULTIPLE_DAYS, QueryPeriodsEnum.AFTERNOON]
+    # Some of the entry's values are from the first fetch
+    assert stored.fetched_at == 100.0
+
+    whole_day = stored.rollups[QueryPeriodsEnum.WHOLE_DAY]
+    assert whole_day[temp] == {'min': 10.0, 'max': 16.0, 'mean': 14.0}
+    # Each value stands for the hours until the next: 6h at 0:00 and 6:00, then 1h each from midday
+    assert whole_day[rain] == {'total': 16.0, 'max': 1.0}
+    assert stored.rollups[QueryPeriodsEnum.NIGHT][rain] == {'total': 6.0, 'max': 1.0}
+    assert stored.rollups[QueryPeriodsEnum.AFTERNOON][temp] == {'min': 16.0, 'max': 16.0, 'mean': 16.0}
+    assert stored.rollups[QueryPeriodsEnum.AFTERNOON][rain] == {'total': 3.0, 'max': 0.5}